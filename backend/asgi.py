@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASGI部署入口
+调用大模型的接口（RAG生成、大纲生成、文本操作、标题/内容生成）以异步方式处理：等待大模型响应期间不占用线程，
+数据库、向量检索等阻塞步骤放入独立线程池；其余接口仍由Flask应用（WSGI）在线程池中处理，响应与Flask部署一致。
+请求体超过Flask的MAX_CONTENT_LENGTH时在进入应用前返回413；WSGI适配层（a2wsgi）按需从连接读取请求体，
+上传文件由Flask分块读入SpooledUpload，不在内存中整体缓冲。
+
+用法：
+    uvicorn asgi:app --host 0.0.0.0 --port 5003 --workers 4
+"""
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from starlette.routing import Mount, Route
+
+from config_rag import ASGI_CONFIG, TRACING_CONFIG
+from main import app as flask_app, CORS_ORIGINS, generate_title_route, generate_content_route
+from services.llm_client import LLMRoute, close_async_client
+from utils.tracing import tracer, trace_headers
+
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('asgi')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# 异步接口的阻塞步骤（数据库、向量检索）使用的线程池
+blocking_executor = ThreadPoolExecutor(max_workers=ASGI_CONFIG['blocking_threads'],
+                                       thread_name_prefix='asgi-blocking')
+
+class BodySizeLimitMiddleware:
+    """
+    请求体大小限制
+
+    Content-Length超过上限时直接返回413，不读取请求体；未声明长度（分块传输）的请求在累计超过上限时
+    按客户端断开处理，应用不会读到超出部分
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: Optional[int]):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http' or not self.max_body_size:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_body_size
+        content_length = None
+        for name, value in scope['headers']:
+            if name == b'content-length':
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    content_length = None
+                break
+        if content_length is not None and content_length > limit:
+            response = JSONResponse({'success': False, 'error': f'请求体过大: 上限 {limit / 1024 / 1024:.0f}MB'},
+                                    status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    logger.warning(f"请求体超过上限 {limit} 字节，停止读取: {scope.get('path')}")
+                    return {'type': 'http.disconnect'}
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def llm_endpoint(route: LLMRoute, path: str, default_data=None):
+    """
+    创建异步接口
+
+    Args:
+        route: 接口处理流程
+        path: 接口路径（用于请求追踪）
+        default_data: 请求体不是JSON时使用的数据（与对应Flask视图保持一致）
+    """
+    async def endpoint(request: Request) -> JSONResponse:
+        trace = None
+        if tracer.enabled:
+            trace = tracer.start_request(request.method, path,
+                                         request.headers.get(TRACING_CONFIG['request_id_header']))
+        status = 500
+        try:
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            body, status = await route.arun(data if data is not None else default_data, blocking_executor)
+        finally:
+            if trace is not None:
+                tracer.finish_request(trace, status)
+        response = JSONResponse(body, status_code=status)
+        if trace is not None:
+            response.headers.update(trace_headers(trace))
+        return response
+
+    endpoint.__name__ = route.name
+    return endpoint
+
+def build_routes():
+    """异步接口路由（对应模块不可用时由Flask应用处理）"""
+    routes = [
+        Route('/api/generate-title', llm_endpoint(generate_title_route, '/api/generate-title', {}),
+              methods=['POST']),
+        Route('/api/generate-content', llm_endpoint(generate_content_route, '/api/generate-content', {}),
+              methods=['POST'])
+    ]
+
+    try:
+        from routes.ai_operations import text_operation_route
+        routes.append(Route('/api/ai/text-operation',
+                            llm_endpoint(text_operation_route, '/api/ai/text-operation'), methods=['POST']))
+    except ImportError as e:
+        logger.warning(f"AI操作模块不可用，文本操作接口使用同步处理: {e}")
+
+    try:
+        from routes.rag_generation import generate_with_rag_route, generate_outline_route
+        routes.append(Route('/api/rag/generate-with-rag',
+                            llm_endpoint(generate_with_rag_route, '/api/rag/generate-with-rag'), methods=['POST']))
+        routes.append(Route('/api/rag/generate-outline',
+                            llm_endpoint(generate_outline_route, '/api/rag/generate-outline'), methods=['POST']))
+    except ImportError as e:
+        logger.warning(f"RAG生成模块不可用，生成接口使用同步处理: {e}")
+
+    # 其余接口交给Flask应用（a2wsgi在独立线程池中运行WSGI应用，请求体按需流式读取）
+    routes.append(Mount('/', app=WSGIMiddleware(flask_app, workers=ASGI_CONFIG['wsgi_threads'])))
+    return routes
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    logger.info(f"ASGI应用启动: 阻塞线程池 {ASGI_CONFIG['blocking_threads']}, "
+                f"WSGI线程 {ASGI_CONFIG['wsgi_threads']}, 大模型连接上限 {ASGI_CONFIG['llm_max_connections']}")
+    yield
+    await close_async_client()
+    blocking_executor.shutdown(wait=False)
+
+# CORS中间件覆盖Flask-CORS为同一来源设置的响应头，两种部署方式行为一致
+app = Starlette(
+    routes=build_routes(),
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=['*'], allow_headers=['*']),
+        Middleware(BodySizeLimitMiddleware, max_body_size=flask_app.config.get('MAX_CONTENT_LENGTH'))
+    ],
+    lifespan=lifespan
+)
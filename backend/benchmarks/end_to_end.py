@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试
+使用合成公文语料离线测量知识库和生成链路各阶段的性能，结果以JSON输出，可与基线结果对比跟踪回归：
+
+1. parse      各格式（PDF、DOCX、XLSX、TXT）解析吞吐（parser_registry）
+2. chunk      文本分块速度（VectorService.chunk_text）
+3. embedding  嵌入吞吐和单条查询编码延迟（需要本地嵌入模型，默认离线加载）
+4. chroma     ChromaDB在10k/100k/1M等规模下的插入吞吐和查询延迟（使用随机向量，隔离嵌入开销）
+5. render     各公文类型的docx生成耗时（DocumentProcessor.generate_document）
+6. rag        端到端RAG：检索 → 去重组装上下文 → 调用模拟大模型 → 生成docx，按阶段统计延迟
+
+缺少依赖的阶段记为skipped，不影响其他阶段。
+
+用法：
+    python benchmarks/end_to_end.py --output results.json
+    python benchmarks/end_to_end.py --stages chroma --scales 10000,100000,1000000
+    python benchmarks/end_to_end.py --baseline results.json --output current.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_docs import FORMATS, SyntheticCorpus, generate_documents
+from mock_llm import start_mock_llm
+
+STAGES = ('parse', 'chunk', 'embedding', 'chroma', 'render', 'rag')
+
+# 对比基线时参与比较的指标后缀，值为True表示越大越好
+COMPARED_METRICS = {'_per_s': True, '_mb_s': True, '_ms': False, '_seconds': False}
+
+def percentile(values: List[float], p: float) -> float:
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """延迟分位数（毫秒）"""
+    return {
+        'count': len(seconds),
+        'p50_ms': round(percentile(seconds, 50) * 1000, 2),
+        'p95_ms': round(percentile(seconds, 95) * 1000, 2),
+        'p99_ms': round(percentile(seconds, 99) * 1000, 2),
+        'max_ms': round(max(seconds) * 1000, 2) if seconds else 0.0
+    }
+
+def dir_size_mb(path: str) -> float:
+    """目录占用磁盘大小（MB）"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return round(total / 1024 / 1024, 1)
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码的print输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+class BenchmarkContext:
+    """各阶段共享的语料、模型和临时目录"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.work_dir = tempfile.mkdtemp(prefix='e2e_bench_')
+        self.corpus = SyntheticCorpus(args.seed)
+        self.documents = generate_documents(FORMATS, args.docs, args.doc_chars, args.seed)
+        self.texts = [SyntheticCorpus.text(self.corpus.document(i, args.doc_chars)) for i in range(args.docs)]
+        self._chunks = None
+        self._model = None
+        self._model_error = None
+
+    @property
+    def chunks(self) -> List[Dict[str, Any]]:
+        """语料分块结果（与上传链路相同的分块方式）"""
+        if self._chunks is None:
+            from services.vector_service import VectorService
+
+            # chunk_text只使用配置，不依赖实例状态，避免初始化向量库
+            self._chunks = []
+            for file_id, text in enumerate(self.texts):
+                for index, chunk in enumerate(VectorService.chunk_text(None, text)):
+                    chunk.update({'file_id': str(file_id), 'chunk_index': index})
+                    self._chunks.append(chunk)
+        return self._chunks
+
+    def embedding_function(self):
+        """加载嵌入模型（默认禁止联网下载），失败时抛出RuntimeError"""
+        if self._model is None and self._model_error is None:
+            try:
+                from config_rag import KNOWLEDGE_BASE_CONFIG
+                from services.vector_service import SentenceTransformerEmbedding, SentenceTransformer
+
+                if not self.args.allow_download:
+                    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+                    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+                model_name = self.args.embedding_model or KNOWLEDGE_BASE_CONFIG['embedding_model']
+                if not os.path.exists(model_name) and not self.args.embedding_model:
+                    model_name = 'paraphrase-multilingual-MiniLM-L12-v2'
+                started = time.perf_counter()
+                with quiet():
+                    model = SentenceTransformer(model_name)
+                self._model = {
+                    'function': SentenceTransformerEmbedding(model),
+                    'name': model_name,
+                    'dimension': model.get_sentence_embedding_dimension(),
+                    'load_seconds': round(time.perf_counter() - started, 2)
+                }
+            except Exception as e:
+                self._model_error = f"嵌入模型不可用: {e}"
+        if self._model_error:
+            raise RuntimeError(self._model_error)
+        return self._model
+
+    def close(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+# ----------------------------------------------------------------------
+# 各阶段
+# ----------------------------------------------------------------------
+
+def bench_parse(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """各格式解析吞吐"""
+    from services.parser_registry import parser_registry
+
+    results = {}
+    for fmt, files in ctx.documents.items():
+        if isinstance(files, dict):
+            results[fmt] = {'skipped': files['error']}
+            continue
+        try:
+            with quiet():
+                parser_registry.parse(files[0]['data'], files[0]['file_name'])
+            durations, chars, pages = [], 0, 0
+            for item in files:
+                started = time.perf_counter()
+                with quiet():
+                    parsed = parser_registry.parse(item['data'], item['file_name'])
+                durations.append(time.perf_counter() - started)
+                chars += len(parsed['content'])
+                pages += parsed.get('pages', 0)
+        except ImportError as e:
+            results[fmt] = {'skipped': f"缺少依赖: {e}"}
+            continue
+
+        total = sum(durations)
+        size_mb = sum(len(item['data']) for item in files) / 1024 / 1024
+        results[fmt] = dict(latency_summary(durations), **{
+            'docs': len(files),
+            'size_mb': round(size_mb, 2),
+            'pages': pages,
+            'docs_per_s': round(len(files) / total, 1),
+            'throughput_mb_s': round(size_mb / total, 2),
+            'chars_per_s': round(chars / total)
+        })
+    return results
+
+def bench_chunk(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """文本分块速度"""
+    from services.vector_service import VectorService
+
+    repeats = max(1, ctx.args.repeats)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        chunk_count = sum(len(VectorService.chunk_text(None, text)) for text in ctx.texts)
+    elapsed = (time.perf_counter() - started) / repeats
+
+    chars = sum(len(text) for text in ctx.texts)
+    return {
+        'docs': len(ctx.texts),
+        'chars': chars,
+        'chunks': chunk_count,
+        'avg_chunk_chars': round(sum(chunk['size'] for chunk in ctx.chunks) / max(len(ctx.chunks), 1)),
+        'elapsed_seconds': round(elapsed, 4),
+        'chars_per_s': round(chars / elapsed),
+        'chunks_per_s': round(chunk_count / elapsed)
+    }
+
+def bench_embedding(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """嵌入吞吐（按文件批量编码，与入库一致）和单条查询编码延迟"""
+    model = ctx.embedding_function()
+    embed = model['function']
+
+    files: Dict[str, List[str]] = {}
+    for chunk in ctx.chunks[:ctx.args.embedding_chunks]:
+        files.setdefault(chunk['file_id'], []).append(chunk['content'])
+
+    embed(['预热'])
+    started = time.perf_counter()
+    chunk_count = chars = 0
+    for contents in files.values():
+        embed(contents)
+        chunk_count += len(contents)
+        chars += sum(len(content) for content in contents)
+    elapsed = time.perf_counter() - started
+
+    query_durations = []
+    for i in range(ctx.args.queries):
+        query = f"{ctx.corpus.document(i).get('title')} 公文写作"
+        query_started = time.perf_counter()
+        embed([query])
+        query_durations.append(time.perf_counter() - query_started)
+
+    return {
+        'model': model['name'],
+        'dimension': model['dimension'],
+        'load_seconds': model['load_seconds'],
+        'chunks': chunk_count,
+        'elapsed_seconds': round(elapsed, 3),
+        'chunks_per_s': round(chunk_count / elapsed, 1),
+        'chars_per_s': round(chars / elapsed),
+        'query': latency_summary(query_durations)
+    }
+
+def bench_chroma(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """ChromaDB按规模递增插入并在每个规模测量查询延迟"""
+    import numpy as np
+    import chromadb
+    from chromadb.config import Settings
+
+    args = ctx.args
+    dimension = args.dimension
+    rng = np.random.default_rng(args.seed)
+    path = os.path.join(ctx.work_dir, 'chroma')
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    collection = client.create_collection(name='bench_chunks', metadata={"description": "基准测试"})
+    batch_size = args.chroma_batch
+    if hasattr(client, 'get_max_batch_size'):
+        batch_size = min(batch_size, client.get_max_batch_size())
+
+    pool = ctx.corpus.chunk_pool(min(args.chunk_pool, max(args.scales)))
+    chunks_per_file = 50
+
+    def vectors(n):
+        data = rng.standard_normal((n, dimension), dtype=np.float32)
+        return (data / np.linalg.norm(data, axis=1, keepdims=True)).tolist()
+
+    def query_latency(n_queries, where=None, include_embeddings=False, file_count=1):
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        durations = []
+        for query_vector in vectors(n_queries):
+            kwargs = {}
+            if where:
+                file_ids = [str(f) for f in rng.integers(0, file_count, size=5)]
+                kwargs['where'] = {'file_id': {'$in': file_ids}}
+            started = time.perf_counter()
+            collection.query(query_embeddings=[query_vector], n_results=10, include=include, **kwargs)
+            durations.append(time.perf_counter() - started)
+        return latency_summary(durations)
+
+    results = {'dimension': dimension, 'batch_size': batch_size, 'scales': {}}
+    inserted = 0
+    previous = 0
+    for scale in sorted(args.scales):
+        started = time.perf_counter()
+        while inserted < scale:
+            n = min(batch_size, scale - inserted)
+            ids = range(inserted, inserted + n)
+            collection.add(
+                ids=[f"bench_{i}" for i in ids],
+                embeddings=vectors(n),
+                documents=[pool[i % len(pool)] for i in ids],
+                metadatas=[{
+                    'file_id': str(i // chunks_per_file),
+                    'chunk_index': i % chunks_per_file,
+                    'chunk_size': len(pool[i % len(pool)]),
+                    'start': 0,
+                    'end': len(pool[i % len(pool)]),
+                    'content_hash': f"{i:032x}"
+                } for i in ids]
+            )
+            inserted += n
+        insert_seconds = time.perf_counter() - started
+        file_count = scale // chunks_per_file + 1
+        results['scales'][str(scale)] = {
+            'chunks': scale,
+            'insert_seconds': round(insert_seconds, 2),
+            'insert_chunks_per_s': round((scale - previous) / insert_seconds, 1),
+            'disk_mb': dir_size_mb(path),
+            'query': query_latency(args.queries),
+            'query_filtered': query_latency(args.queries, where=True, file_count=file_count),
+            'query_filtered_embeddings': query_latency(args.queries, where=True, include_embeddings=True,
+                                                       file_count=file_count)
+        }
+        previous = scale
+    return results
+
+def bench_render(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """各公文类型的docx生成耗时"""
+    from models.document_models import DOCUMENT_TYPES
+    from services.document_processor import DocumentProcessor
+
+    with quiet():
+        processor = DocumentProcessor()
+    processor.output_dir = os.path.join(ctx.work_dir, 'output')
+    os.makedirs(processor.output_dir, exist_ok=True)
+
+    doc = ctx.corpus.document(0, ctx.args.render_chars)
+    content = '\n'.join(paragraph for _, paragraphs in doc['sections'] for paragraph in paragraphs)
+    metadata = {'title': doc['title'], 'sender': doc['sender'], 'recipient': doc['recipient'],
+                'date': doc['date'], 'format_type': 'plain'}
+
+    results = {}
+    for template_type in DOCUMENT_TYPES:
+        durations, size = [], 0
+        for _ in range(ctx.args.repeats):
+            started = time.perf_counter()
+            with quiet():
+                output_path = processor.generate_document(content, template_type, dict(metadata))
+            durations.append(time.perf_counter() - started)
+            size = os.path.getsize(output_path)
+            os.remove(output_path)
+        results[template_type] = dict(latency_summary(durations), output_kb=round(size / 1024, 1))
+    return results
+
+class HashEmbedding:
+    """字符二元组哈希嵌入（嵌入模型不可用时用于保持检索语义）"""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        import numpy as np
+        import zlib
+
+        vectors = np.zeros((len(input), self.dimension), dtype=np.float32)
+        for row, text in enumerate(input):
+            for i in range(len(text) - 1):
+                vectors[row, zlib.crc32(text[i:i + 2].encode('utf-8')) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-9)).tolist()
+
+def bench_rag(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """端到端RAG生成（模拟大模型），按阶段统计延迟"""
+    import requests
+    import chromadb
+    from chromadb.config import Settings
+    from services.context_builder import ContextBuilder
+    from services.document_processor import DocumentProcessor
+
+    args = ctx.args
+    try:
+        model = ctx.embedding_function()
+        embed, embedding_name = model['function'], model['name']
+    except RuntimeError:
+        embed, embedding_name = HashEmbedding(args.dimension), 'hash'
+
+    # 与上传链路相同：分块 → 嵌入 → 写入集合
+    client = chromadb.PersistentClient(path=os.path.join(ctx.work_dir, 'rag_chroma'),
+                                       settings=Settings(anonymized_telemetry=False, allow_reset=True))
+    collection = client.create_collection(name='rag_chunks')
+    chunks = ctx.chunks
+    for i in range(0, len(chunks), 256):
+        batch = chunks[i:i + 256]
+        collection.add(
+            ids=[f"{chunk['file_id']}_{chunk['chunk_index']}" for chunk in batch],
+            embeddings=embed([chunk['content'] for chunk in batch]),
+            documents=[chunk['content'] for chunk in batch],
+            metadatas=[{'file_id': chunk['file_id'], 'chunk_index': chunk['chunk_index'],
+                        'start': chunk['start'], 'end': chunk['end']} for chunk in batch]
+        )
+
+    context_builder = ContextBuilder()
+    with quiet():
+        processor = DocumentProcessor()
+    processor.output_dir = os.path.join(ctx.work_dir, 'rag_output')
+    os.makedirs(processor.output_dir, exist_ok=True)
+
+    llm = start_mock_llm(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                         completion_chars=args.llm_completion_chars, seed=args.seed)
+    session = requests.Session()
+    stages = {'retrieve': [], 'context': [], 'llm': [], 'render': [], 'total': []}
+    file_ids = sorted({chunk['file_id'] for chunk in chunks})
+    try:
+        for i in range(args.rag_requests):
+            doc = ctx.corpus.document(i % args.docs)
+            topic, reference_ids = doc['title'], file_ids[i % len(file_ids):][:3]
+            started = time.perf_counter()
+
+            t = time.perf_counter()
+            results = collection.query(
+                query_embeddings=embed([f"{topic} 通知"]),
+                n_results=10,
+                where={'file_id': {'$in': reference_ids}} if len(reference_ids) > 1 else {'file_id': reference_ids[0]},
+                include=["documents", "metadatas", "distances", "embeddings"]
+            )
+            similar_chunks = [{
+                'content': content,
+                'metadata': results['metadatas'][0][j],
+                'distance': results['distances'][0][j],
+                'id': results['ids'][0][j],
+                'embedding': results['embeddings'][0][j]
+            } for j, content in enumerate(results['documents'][0])]
+            stages['retrieve'].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            diversified = context_builder.diversify(similar_chunks)
+            rag_context, _ = context_builder.build_context(
+                diversified['chunks'][:context_builder.config['max_chunks']],
+                baseline_chunks=similar_chunks[:context_builder.config['max_chunks']],
+                chunk_stats=diversified['chunk_stats']
+            )
+            stages['context'].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            response = session.post(llm.url, json={
+                "model": "deepseek-chat",
+                "messages": [
+                    {"role": "system", "content": f"你是一个专业的公文写作助手。\n\n参考文档内容：\n{rag_context}"},
+                    {"role": "user", "content": topic}
+                ],
+                "max_tokens": 3000,
+                "temperature": 0.7
+            }, timeout=120)
+            response.raise_for_status()
+            content = response.json()['choices'][0]['message']['content']
+            stages['llm'].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            with quiet():
+                output_path = processor.generate_document(content, 'tongzhi', {'title': topic, 'format_type': 'plain'})
+            os.remove(output_path)
+            stages['render'].append(time.perf_counter() - t)
+
+            stages['total'].append(time.perf_counter() - started)
+    finally:
+        llm.shutdown()
+        llm.server_close()
+
+    overhead = [total - llm_time for total, llm_time in zip(stages['total'], stages['llm'])]
+    return {
+        'embedding': embedding_name,
+        'indexed_chunks': len(chunks),
+        'llm_latency_ms': args.llm_latency_ms,
+        'requests': args.rag_requests,
+        'stages': {name: latency_summary(values) for name, values in stages.items()},
+        'overhead_excluding_llm': latency_summary(overhead)
+    }
+
+STAGE_FUNCTIONS: Dict[str, Callable[[BenchmarkContext], Dict[str, Any]]] = {
+    'parse': bench_parse,
+    'chunk': bench_chunk,
+    'embedding': bench_embedding,
+    'chroma': bench_chroma,
+    'render': bench_render,
+    'rag': bench_rag
+}
+
+# ----------------------------------------------------------------------
+# 结果与基线对比
+# ----------------------------------------------------------------------
+
+def git_revision() -> Optional[str]:
+    """当前代码版本"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=BACKEND_DIR, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def flatten(data: Any, prefix: str = '') -> Dict[str, float]:
+    """展开嵌套结果为 点号路径 -> 数值"""
+    items = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            items.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        items[prefix] = data
+    return items
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    与基线结果对比
+
+    Args:
+        baseline: 基线结果（本脚本输出的JSON）
+        current: 本次结果
+        threshold: 视为回归的变化比例
+
+    Returns:
+        变化超过阈值的指标列表
+    """
+    old, new = flatten(baseline.get('results', {})), flatten(current.get('results', {}))
+    changes = []
+    for key in sorted(old.keys() & new.keys()):
+        higher_is_better = next((better for suffix, better in COMPARED_METRICS.items() if key.endswith(suffix)), None)
+        if higher_is_better is None or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        if abs(change) < threshold:
+            continue
+        changes.append({
+            'metric': key,
+            'baseline': old[key],
+            'current': new[key],
+            'change_pct': round(change * 100, 1),
+            'regression': change < 0 if higher_is_better else change > 0
+        })
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端基准测试')
+    parser.add_argument('--stages', default=','.join(STAGES), help='运行的阶段，逗号分隔')
+    parser.add_argument('--docs', type=int, default=20, help='每种格式的合成文档数')
+    parser.add_argument('--doc-chars', type=int, default=8000, help='每篇文档正文字数')
+    parser.add_argument('--repeats', type=int, default=5, help='分块和docx生成的重复次数')
+    parser.add_argument('--queries', type=int, default=100, help='每项查询延迟测试的查询数')
+    parser.add_argument('--embedding-model', help='嵌入模型路径或名称（默认使用知识库配置）')
+    parser.add_argument('--allow-download', action='store_true', help='允许联网下载嵌入模型')
+    parser.add_argument('--embedding-chunks', type=int, default=2000, help='嵌入吞吐测试的最大文档块数')
+    parser.add_argument('--scales', default='10000,100000',
+                        help='ChromaDB测试规模，逗号分隔（如 10000,100000,1000000）')
+    parser.add_argument('--dimension', type=int, default=384, help='ChromaDB测试的向量维度')
+    parser.add_argument('--chroma-batch', type=int, default=5000, help='ChromaDB每批插入数量')
+    parser.add_argument('--chunk-pool', type=int, default=20000, help='ChromaDB测试使用的不重复文档块数')
+    parser.add_argument('--render-chars', type=int, default=3000, help='docx生成测试的正文字数')
+    parser.add_argument('--rag-requests', type=int, default=20, help='端到端RAG请求数')
+    parser.add_argument('--llm-latency-ms', type=float, default=800, help='模拟大模型延迟（毫秒）')
+    parser.add_argument('--llm-jitter-ms', type=float, default=100, help='模拟大模型延迟抖动（毫秒）')
+    parser.add_argument('--llm-completion-chars', type=int, default=1500, help='模拟大模型生成字数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--output', help='结果JSON文件（默认输出到标准输出）')
+    parser.add_argument('--baseline', help='基线结果JSON文件，输出超过阈值的变化')
+    parser.add_argument('--threshold', type=float, default=0.1, help='基线对比的变化阈值（比例）')
+    args = parser.parse_args()
+    args.scales = [int(scale) for scale in args.scales.split(',') if scale]
+
+    stages = [stage for stage in args.stages.split(',') if stage]
+    unknown = [stage for stage in stages if stage not in STAGE_FUNCTIONS]
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(unknown)}")
+
+    os.chdir(BACKEND_DIR)
+    ctx = BenchmarkContext(args)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args)
+        },
+        'results': {}
+    }
+    try:
+        for stage in stages:
+            print(f"运行阶段: {stage}", file=sys.stderr)
+            started = time.perf_counter()
+            try:
+                result = STAGE_FUNCTIONS[stage](ctx)
+            except ImportError as e:
+                result = {'skipped': f"缺少依赖: {e}"}
+            except RuntimeError as e:
+                result = {'skipped': str(e)}
+            result['stage_seconds'] = round(time.perf_counter() - started, 2)
+            report['results'][stage] = result
+    finally:
+        ctx.close()
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['comparison'] = compare(json.load(f), report, args.threshold)
+        for change in report['comparison']:
+            flag = '回归' if change['regression'] else '改善'
+            print(f"[{flag}] {change['metric']}: {change['baseline']} -> {change['current']} "
+                  f"({change['change_pct']:+}%)", file=sys.stderr)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"结果已写入: {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP接口并发压测
+对本地实例的 /api/rag/generate-with-rag、/api/ai/text-operation、/api/knowledge/upload 逐级提高并发
+（闭环：每个虚拟用户收到响应后再发下一个请求），统计各级并发下的吞吐、延迟分位数和错误率，
+并给出满足错误率和p95目标的最大并发数。
+
+大模型调用由进程内的模拟服务（mock_llm.py）承接，可注入延迟和错误；指定 --servers 时由本脚本按不同
+部署方式启动后端并把 DEEPSEEK_API_URL 指向模拟服务，便于对比各部署方式：
+
+    flask             Flask多线程开发服务器
+    gunicorn-sync     gunicorn同步worker（每个worker同时处理一个请求）
+    gunicorn-gthread  gunicorn线程worker
+    gunicorn-gevent   gunicorn gevent协程worker
+    uvicorn-wsgi      uvicorn以WSGI接口运行（ASGI服务器 + 线程池）
+    asgi              uvicorn运行asgi.py（大模型接口异步处理，其余接口走WSGI线程池）
+
+RAG和上传场景依赖实例已配置的数据库、MinIO和向量库；未配置时这些请求会计入错误。
+
+用法：
+    python benchmarks/load_test.py --servers flask,gunicorn-gevent --scenario text_operation
+    python benchmarks/load_test.py --target http://127.0.0.1:5003 --scenario mixed --concurrency 1,10,50,200
+    python benchmarks/load_test.py --servers gunicorn-sync --workers 4 --llm-latency-ms 3000 --output load.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_docs import SyntheticCorpus
+from mock_llm import start_mock_llm
+
+# 部署方式的启动命令（{host} {port} {workers} {threads} 在启动时替换）
+WORKER_MODELS: Dict[str, List[str]] = {
+    'flask': [sys.executable, '-c',
+              "from main import app; app.run(host='{host}', port={port}, threaded=True, debug=False, use_reloader=False)"],
+    'gunicorn-sync': [sys.executable, '-m', 'gunicorn', '-k', 'sync', '-w', '{workers}', '-b', '{host}:{port}',
+                      '--timeout', '300', 'main:app'],
+    'gunicorn-gthread': [sys.executable, '-m', 'gunicorn', '-k', 'gthread', '-w', '{workers}', '--threads', '{threads}',
+                         '-b', '{host}:{port}', '--timeout', '300', 'main:app'],
+    'gunicorn-gevent': [sys.executable, '-m', 'gunicorn', '-k', 'gevent', '-w', '{workers}',
+                        '--worker-connections', '1000', '-b', '{host}:{port}', '--timeout', '300', 'main:app'],
+    'uvicorn-wsgi': [sys.executable, '-m', 'uvicorn', 'main:app', '--interface', 'wsgi', '--workers', '{workers}',
+                     '--host', '{host}', '--port', '{port}', '--log-level', 'warning'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', '{workers}',
+             '--host', '{host}', '--port', '{port}', '--log-level', 'warning']
+}
+
+def free_port() -> int:
+    """获取空闲端口"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def percentile(values: List[float], p: float) -> float:
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+# ----------------------------------------------------------------------
+# 场景
+# ----------------------------------------------------------------------
+
+def json_request(method: str, path: str, payload: Dict[str, Any]) -> Tuple[str, str, Dict[str, str], bytes]:
+    return method, path, {'Content-Type': 'application/json'}, json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+def multipart_request(path: str, field: str, file_name: str, data: bytes,
+                      content_type: str) -> Tuple[str, str, Dict[str, str], bytes]:
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{file_name}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n").encode('utf-8') + data + f"\r\n--{boundary}--\r\n".encode('ascii')
+    return 'POST', path, {'Content-Type': f'multipart/form-data; boundary={boundary}'}, body
+
+class ScenarioSet:
+    """内置场景，每个场景根据请求序号构造 (method, path, headers, body)"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.corpus = SyntheticCorpus(args.seed)
+        self.docs = [self.corpus.document(i, 3000) for i in range(20)]
+        self.file_ids = [file_id for file_id in (args.file_ids or '').split(',') if file_id]
+        self.scenarios: Dict[str, Callable[[int], Tuple[str, str, Dict[str, str], bytes]]] = {
+            'rag': self.rag,
+            'text_operation': self.text_operation,
+            'upload': self.upload
+        }
+        # 混合场景的权重（生成为主，上传较少）
+        self.weights = {'rag': 3, 'text_operation': 6, 'upload': 1}
+        if args.scenario_file:
+            self._load_file(args.scenario_file)
+
+    def _load_file(self, path: str):
+        """
+        加载自定义JSON场景：
+        {"名称": {"method": "POST", "path": "/api/...", "json": {...}, "weight": 1}}
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            definitions = json.load(f)
+        for name, definition in definitions.items():
+            self.scenarios[name] = lambda i, d=definition: json_request(
+                d.get('method', 'POST'), d['path'], d.get('json', {}))
+            self.weights[name] = definition.get('weight', 1)
+
+    def rag(self, i: int):
+        doc = self.docs[i % len(self.docs)]
+        return json_request('POST', '/api/rag/generate-with-rag', {
+            'document_type': '通知',
+            'topic': doc['title'],
+            'title': doc['title'],
+            'reference_file_ids': self.file_ids,
+            'user_id': 'load_test'
+        })
+
+    def text_operation(self, i: int):
+        doc = self.docs[i % len(self.docs)]
+        paragraphs = [paragraph for _, section in doc['sections'] for paragraph in section]
+        return json_request('POST', '/api/ai/text-operation', {
+            'action': ('continue', 'expand', 'summarize', 'rewrite', 'polish')[i % 5],
+            'selectedText': paragraphs[i % len(paragraphs)],
+            'fullContent': '\n'.join(paragraphs)
+        })
+
+    def upload(self, i: int):
+        # 每次上传内容不同，避免命中按内容哈希的去重
+        text = SyntheticCorpus.text(self.docs[i % len(self.docs)]) + f"\n压测编号：{uuid.uuid4().hex}\n"
+        return multipart_request('/api/knowledge/upload', 'file', f"load_test_{i}.txt",
+                                 text.encode('utf-8'), 'text/plain')
+
+    def picker(self, name: str) -> Callable[[random.Random], str]:
+        """返回按场景名（mixed为加权混合）选择场景的函数"""
+        if name != 'mixed':
+            if name not in self.scenarios:
+                raise ValueError(f"未知场景: {name}")
+            return lambda rng: name
+        names = list(self.weights)
+        weights = [self.weights[n] for n in names]
+        return lambda rng: rng.choices(names, weights)[0]
+
+# ----------------------------------------------------------------------
+# 异步HTTP客户端
+# ----------------------------------------------------------------------
+
+class HttpConnection:
+    """单个长连接（服务端要求关闭时自动重连）"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        """发送请求，返回 (状态码, 响应体)"""
+        reused = self.writer is not None
+        try:
+            return await self._request(method, path, headers, body)
+        except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError):
+            self.close()
+            if not reused:
+                raise
+            # 复用的连接已被服务端关闭，新建连接重试一次
+            return await self._request(method, path, headers, body)
+
+    async def _request(self, method, path, headers, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=1 << 20)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body)}"]
+        lines.extend(f"{key}: {value}" for key, value in headers.items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        version, status = status_line.split(' ', 2)[:2]
+        response_headers = {}
+        for line in header_lines:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                response_headers[key.strip().lower()] = value.strip()
+
+        connection = response_headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        if 'chunked' in response_headers.get('transfer-encoding', '').lower():
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b'\r\n')
+                    break
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            data = b''.join(parts)
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await self.reader.read()
+            keep_alive = False
+
+        if not keep_alive:
+            self.close()
+        return int(status), data
+
+def classify(status: int, data: bytes) -> str:
+    """结果分类：ok、http_4xx、http_5xx、app_error（HTTP 200但success为false）"""
+    if status >= 500:
+        return 'http_5xx'
+    if status >= 400:
+        return 'http_4xx'
+    try:
+        if json.loads(data).get('success') is False:
+            return 'app_error'
+    except (ValueError, AttributeError):
+        pass
+    return 'ok'
+
+async def run_step(target: str, scenarios: ScenarioSet, pick: Callable[[random.Random], str], concurrency: int,
+                   duration: float, timeout: float, think_time: float, seed: int) -> List[Tuple[str, float, str]]:
+    """
+    以指定并发运行一轮闭环压测
+
+    Returns:
+        [(场景名, 耗时秒, 结果分类)]
+    """
+    parsed = urlparse(target)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    results = []
+    sequence = iter(range(1 << 62))
+
+    async def user(user_id: int):
+        rng = random.Random(seed * 100003 + user_id)
+        conn = HttpConnection(parsed.hostname, parsed.port or 80)
+        # 错开启动，避免所有用户在同一时刻建立连接
+        await asyncio.sleep(rng.random() * min(1.0, duration / 10))
+        while loop.time() < deadline:
+            name = pick(rng)
+            method, path, headers, body = scenarios.scenarios[name](next(sequence))
+            started = time.perf_counter()
+            try:
+                status, data = await asyncio.wait_for(conn.request(method, path, headers, body), timeout)
+                outcome = classify(status, data)
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                conn.close()
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                outcome = 'connection_error'
+                conn.close()
+            results.append((name, time.perf_counter() - started, outcome))
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+        conn.close()
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return results
+
+def summarize(results: List[Tuple[str, float, str]], elapsed: float) -> Dict[str, Any]:
+    """汇总一组请求结果"""
+    latencies = [latency for _, latency, outcome in results if outcome == 'ok']
+    errors: Dict[str, int] = {}
+    for _, _, outcome in results:
+        if outcome != 'ok':
+            errors[outcome] = errors.get(outcome, 0) + 1
+    total = len(results)
+    return {
+        'requests': total,
+        'ok': len(latencies),
+        'error_rate': round((total - len(latencies)) / total, 4) if total else 0.0,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else 0.0
+    }
+
+# ----------------------------------------------------------------------
+# 后端进程
+# ----------------------------------------------------------------------
+
+class BackendProcess:
+    """按部署方式启动的后端进程"""
+
+    def __init__(self, name: str, command: List[str], args: argparse.Namespace, llm_url: str):
+        self.name = name
+        self.port = free_port()
+        self.target = f"http://127.0.0.1:{self.port}"
+        values = {'host': '127.0.0.1', 'port': self.port, 'workers': args.workers, 'threads': args.threads}
+        self.command = [part.format(**values) for part in command]
+        self.env = dict(os.environ, DEEPSEEK_API_URL=llm_url, DEEPSEEK_API_KEY='mock-key', PYTHONUNBUFFERED='1')
+        self.startup_timeout = args.startup_timeout
+        self.log = tempfile.NamedTemporaryFile(prefix=f"load_test_{name}_", suffix='.log', delete=False)
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, cwd=BACKEND_DIR, env=self.env,
+                                        stdout=self.log, stderr=subprocess.STDOUT)
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.5)
+        self.stop()
+        with open(self.log.name, 'r', encoding='utf-8', errors='replace') as f:
+            tail = f.read()[-2000:]
+        raise RuntimeError(f"{self.name} 启动失败，日志: {self.log.name}\n{tail}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.log.close()
+
+def verify_llm_routing(target: str, llm, timeout: float) -> Optional[str]:
+    """
+    发送一个文本操作探测请求，确认后端的大模型调用落到模拟服务上（避免压测流量打到真实API）
+
+    Returns:
+        错误信息，确认通过时返回None
+    """
+    with llm.lock:
+        before = llm.stats['requests']
+    method, path, headers, body = json_request('POST', '/api/ai/text-operation', {
+        'action': 'polish',
+        'selectedText': '压测前探测请求',
+        'fullContent': '压测前探测请求'
+    })
+    request = urllib.request.Request(target + path, data=body, headers=headers, method=method)
+    try:
+        urllib.request.urlopen(request, timeout=timeout).close()
+    except OSError as e:
+        # 模拟服务注入的错误也会使请求失败，以模拟服务是否收到请求为准
+        print(f"  探测请求失败: {e}", file=sys.stderr)
+    with llm.lock:
+        after = llm.stats['requests']
+    if after <= before:
+        return (f"探测请求未到达模拟大模型服务（{llm.url}），后端可能在调用真实API，已中止压测；"
+                f"请确认后端读取DEEPSEEK_API_URL环境变量")
+    return None
+
+# ----------------------------------------------------------------------
+# 主流程
+# ----------------------------------------------------------------------
+
+def run_levels(target: str, args: argparse.Namespace, llm) -> Dict[str, Any]:
+    """对一个目标逐级提高并发"""
+    scenarios = ScenarioSet(args)
+    pick = scenarios.picker(args.scenario)
+    steps = []
+    if args.warmup:
+        asyncio.run(run_step(target, scenarios, pick, min(args.levels), args.warmup, args.timeout, 0, args.seed))
+
+    for concurrency in args.levels:
+        if llm:
+            llm.reset_stats()
+        started = time.perf_counter()
+        results = asyncio.run(run_step(target, scenarios, pick, concurrency, args.duration,
+                                       args.timeout, args.think_time, args.seed))
+        elapsed = time.perf_counter() - started
+
+        step = dict(summarize(results, elapsed), concurrency=concurrency, elapsed_seconds=round(elapsed, 2))
+        names = sorted({name for name, _, _ in results})
+        if len(names) > 1:
+            step['scenarios'] = {name: summarize([r for r in results if r[0] == name], elapsed) for name in names}
+        if llm:
+            llm_stats = llm.reset_stats()
+            step['llm_requests'] = llm_stats['requests']
+            step['llm_max_in_flight'] = llm_stats['max_in_flight']
+        steps.append(step)
+        print(f"  并发 {concurrency:>5}: {step['throughput_rps']:>8} req/s  p50 {step['p50_ms']:>8}ms  "
+              f"p99 {step['p99_ms']:>8}ms  错误率 {step['error_rate']:.2%}", file=sys.stderr)
+
+    sustained = [step['concurrency'] for step in steps
+                 if step['error_rate'] <= args.max_error_rate
+                 and (not args.slo_p95_ms or step['p95_ms'] <= args.slo_p95_ms)]
+    return {
+        'target': target,
+        'scenario': args.scenario,
+        'steps': steps,
+        'max_sustained_concurrency': max(sustained) if sustained else 0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP接口并发压测')
+    parser.add_argument('--target', help='已运行的实例地址（与--servers二选一）')
+    parser.add_argument('--servers', help=f"启动并压测的部署方式，逗号分隔: {', '.join(WORKER_MODELS)}")
+    parser.add_argument('--server-cmd', help='自定义启动命令（可使用{host} {port} {workers} {threads}），名称为custom')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn/uvicorn的worker进程数')
+    parser.add_argument('--threads', type=int, default=8, help='gthread worker的线程数')
+    parser.add_argument('--startup-timeout', type=float, default=120, help='后端启动超时（秒）')
+    parser.add_argument('--scenario', default='text_operation', help='场景: rag、text_operation、upload、mixed或自定义场景名')
+    parser.add_argument('--scenario-file', help='自定义场景JSON文件')
+    parser.add_argument('--file-ids', help='RAG场景引用的知识库文件ID，逗号分隔')
+    parser.add_argument('--concurrency', default='1,5,10,25,50,100', help='并发级别，逗号分隔')
+    parser.add_argument('--duration', type=float, default=30, help='每级并发的持续时间（秒）')
+    parser.add_argument('--warmup', type=float, default=5, help='预热时间（秒）')
+    parser.add_argument('--think-time', type=float, default=0, help='用户两次请求间的平均间隔（秒，指数分布）')
+    parser.add_argument('--timeout', type=float, default=180, help='单个请求超时（秒）')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='判定可承受并发的最大错误率')
+    parser.add_argument('--slo-p95-ms', type=float, default=0, help='判定可承受并发的p95上限（毫秒），0表示不限制')
+    parser.add_argument('--llm-latency-ms', type=float, default=2000, help='模拟大模型延迟（毫秒）')
+    parser.add_argument('--llm-jitter-ms', type=float, default=500, help='模拟大模型延迟抖动（毫秒）')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='模拟大模型错误比例')
+    parser.add_argument('--llm-port', type=int, default=0, help='模拟大模型端口（压测--target时需与实例配置一致）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.concurrency.split(',') if level]
+
+    servers = {}
+    for name in (args.servers or '').split(','):
+        if not name:
+            continue
+        if name not in WORKER_MODELS:
+            parser.error(f"未知部署方式: {name}")
+        servers[name] = WORKER_MODELS[name]
+    if args.server_cmd:
+        servers['custom'] = args.server_cmd.split()
+    if not servers and not args.target:
+        parser.error('需要指定 --target 或 --servers/--server-cmd')
+
+    llm = start_mock_llm(port=args.llm_port, latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                         error_rate=args.llm_error_rate, seed=args.seed)
+    print(f"模拟大模型服务: {llm.url}", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args)
+        },
+        'mock_llm': dict(llm.options),
+        'runs': []
+    }
+    try:
+        if args.target:
+            print(f"压测 {args.target}（实例需将DEEPSEEK_API_URL指向模拟服务）", file=sys.stderr)
+            error = verify_llm_routing(args.target, llm, args.timeout)
+            if error:
+                print(error, file=sys.stderr)
+                report['runs'].append({'server': 'external', 'error': error})
+            else:
+                report['runs'].append(dict(run_levels(args.target, args, llm), server='external'))
+        for name, command in servers.items():
+            backend = BackendProcess(name, command, args, llm.url)
+            print(f"启动 {name}: {' '.join(backend.command)}", file=sys.stderr)
+            try:
+                backend.start()
+            except RuntimeError as e:
+                print(str(e), file=sys.stderr)
+                report['runs'].append({'server': name, 'error': str(e)})
+                continue
+            try:
+                error = verify_llm_routing(backend.target, llm, args.timeout)
+                if error:
+                    print(error, file=sys.stderr)
+                    report['runs'].append({'server': name, 'error': error})
+                    continue
+                report['runs'].append(dict(run_levels(backend.target, args, llm), server=name))
+            finally:
+                backend.stop()
+    finally:
+        llm.shutdown()
+        llm.server_close()
+
+    # 各部署方式对比
+    print(f"\n{'部署方式':<20}{'并发':>6}{'吞吐(req/s)':>14}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+          f"{'错误率':>8}{'上游并发':>8}", file=sys.stderr)
+    for run in report['runs']:
+        if 'error' in run:
+            print(f"{run['server']:<20}未压测: {run['error'].splitlines()[0]}", file=sys.stderr)
+            continue
+        for step in run['steps']:
+            print(f"{run['server']:<20}{step['concurrency']:>6}{step['throughput_rps']:>14}{step['p50_ms']:>10}"
+                  f"{step['p95_ms']:>10}{step['p99_ms']:>10}{step['error_rate']:>8.2%}"
+                  f"{step.get('llm_max_in_flight', '-'):>8}", file=sys.stderr)
+        print(f"{run['server']:<20}可承受并发: {run['max_sustained_concurrency']}", file=sys.stderr)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"结果已写入: {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟大模型服务（OpenAI兼容接口）
+提供 POST /v1/chat/completions（支持stream=true的SSE输出），按配置注入延迟、逐token输出耗时和错误，
+用于在不访问DeepSeek的情况下测量端到端生成链路和并发下的表现。
+
+后端通过环境变量 DEEPSEEK_API_URL 指向本服务即可使用，例如：
+    DEEPSEEK_API_URL=http://127.0.0.1:18080/v1/chat/completions
+
+用法：
+    python benchmarks/mock_llm.py --port 18080 --latency-ms 800 --jitter-ms 200 --tokens-per-second 50
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_OPTIONS = {
+    'latency_ms': 800,  # 首个token前的固定延迟
+    'jitter_ms': 0,  # 延迟随机抖动（±）
+    'tokens_per_second': 0,  # 逐token输出速度，0表示生成内容一次返回
+    'completion_chars': 800,  # 生成内容字数（不超过请求的max_tokens）
+    'error_rate': 0.0,  # 返回500的比例
+    'seed': None
+}
+
+SENTENCE = '各地各部门要切实提高政治站位，压紧压实工作责任，确保各项任务落到实处。'
+
+class MockLLMServer(ThreadingHTTPServer):
+    """模拟大模型服务（每个请求一个线程，延迟期间不占用其他请求）"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], options: Optional[Dict[str, Any]] = None):
+        super().__init__(address, MockLLMHandler)
+        self.options = dict(DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.random = random.Random(self.options['seed'])
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'in_flight': 0, 'max_in_flight': 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def delay(self) -> float:
+        """本次请求首个token前的延迟（秒）"""
+        with self.lock:
+            jitter = self.random.uniform(-1, 1) * self.options['jitter_ms']
+            return max(0.0, self.options['latency_ms'] + jitter) / 1000
+
+    def reset_stats(self) -> Dict[str, int]:
+        """返回并清零请求统计（in_flight保留当前值）"""
+        with self.lock:
+            stats = dict(self.stats)
+            self.stats.update(requests=0, errors=0, max_in_flight=self.stats['in_flight'])
+            return stats
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.options['error_rate']
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """chat/completions请求处理"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/health':
+            with self.server.lock:
+                stats = dict(self.server.stats)
+            self._send_json(200, {'status': 'ok', 'options': self.server.options, 'stats': stats})
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'invalid json'}})
+            return
+        if not self.path.rstrip('/').endswith('chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        server = self.server
+        with server.lock:
+            server.stats['requests'] += 1
+            server.stats['in_flight'] += 1
+            server.stats['max_in_flight'] = max(server.stats['max_in_flight'], server.stats['in_flight'])
+        try:
+            time.sleep(server.delay())
+            if server.should_fail():
+                with server.lock:
+                    server.stats['errors'] += 1
+                self._send_json(500, {'error': {'message': 'injected failure', 'type': 'server_error'}})
+                return
+
+            chars = min(server.options['completion_chars'], int(payload.get('max_tokens') or 4096))
+            content = (SENTENCE * (chars // len(SENTENCE) + 1))[:chars]
+            prompt_chars = sum(len(str(message.get('content', ''))) for message in payload.get('messages', []))
+            usage = {'prompt_tokens': prompt_chars, 'completion_tokens': len(content),
+                     'total_tokens': prompt_chars + len(content)}
+            if payload.get('stream'):
+                self._stream(payload, content)
+            else:
+                tokens_per_second = server.options['tokens_per_second']
+                if tokens_per_second:
+                    time.sleep(len(content) / tokens_per_second)
+                self._send_json(200, {
+                    'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': payload.get('model', 'mock'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                 'finish_reason': 'stop'}],
+                    'usage': usage
+                })
+        finally:
+            with server.lock:
+                server.stats['in_flight'] -= 1
+
+    def _stream(self, payload: Dict[str, Any], content: str):
+        """SSE逐段输出（每段约8个字符）"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        tokens_per_second = self.server.options['tokens_per_second']
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        def send(data: str):
+            event = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(event), event))
+            self.wfile.flush()
+
+        for i in range(0, len(content), 8):
+            piece = content[i:i + 8]
+            send(json.dumps({
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'model': payload.get('model', 'mock'),
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]
+            }, ensure_ascii=False))
+            if tokens_per_second:
+                time.sleep(len(piece) / tokens_per_second)
+        send('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+
+def start_mock_llm(host: str = '127.0.0.1', port: int = 0, **options) -> MockLLMServer:
+    """
+    在后台线程中启动模拟大模型服务
+
+    Args:
+        host: 监听地址
+        port: 监听端口，0表示自动分配
+        **options: 覆盖DEFAULT_OPTIONS中的配置
+
+    Returns:
+        服务实例（url属性为chat/completions地址，使用shutdown()停止）
+    """
+    server = MockLLMServer((host, port), options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟大模型服务（OpenAI兼容接口）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=18080, help='监听端口')
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_OPTIONS['latency_ms'], help='首个token前的延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=DEFAULT_OPTIONS['jitter_ms'], help='延迟随机抖动（毫秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=DEFAULT_OPTIONS['tokens_per_second'],
+                        help='逐token输出速度，0表示一次返回')
+    parser.add_argument('--completion-chars', type=int, default=DEFAULT_OPTIONS['completion_chars'], help='生成内容字数')
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_OPTIONS['error_rate'], help='返回500的比例')
+    args = parser.parse_args()
+
+    server = MockLLMServer((args.host, args.port), {
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'tokens_per_second': args.tokens_per_second,
+        'completion_chars': args.completion_chars,
+        'error_rate': args.error_rate
+    })
+    print(f"模拟大模型服务已启动: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成公文语料生成器
+按固定随机种子生成结构接近真实党政机关公文的中文文档（标题、主送机关、分级标题正文、工作任务表），
+并写出为PDF、DOCX、XLSX、TXT四种格式，供基准测试离线使用。
+
+PDF由内置的最小写出器生成：与常见中文PDF相同采用Identity-H编码加ToUnicode映射（字形编号取Unicode码位，
+不嵌入字体，仅用于文本提取测试），不依赖额外的PDF库。
+
+用法：
+    python benchmarks/synthetic_docs.py --output-dir /tmp/corpus --count 10 --chars 8000
+"""
+import os
+import io
+import sys
+import json
+import random
+import argparse
+from typing import Dict, List, Any, Callable
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FORMATS = ('pdf', 'docx', 'xlsx', 'txt')
+
+ORGANIZATIONS = ['省人民政府办公厅', '市发展和改革委员会', '县财政局', '省教育厅', '市生态环境局', '区卫生健康委员会',
+                 '省交通运输厅', '市住房和城乡建设局', '县农业农村局', '省委宣传部', '市应急管理局', '区市场监督管理局']
+SUBJECTS = ['优化营商环境', '安全生产专项整治', '乡村振兴重点工作', '数字政府建设', '生态环境保护督察整改',
+            '基层治理能力提升', '重大项目建设', '防汛抗旱工作', '义务教育优质均衡发展', '城市更新行动',
+            '政务服务“一网通办”', '粮食安全责任制考核']
+DOC_TYPES = ['通知', '报告', '请示', '意见', '通报', '决定', '函', '纪要']
+ACTIONS = ['深入贯彻落实', '统筹推进', '切实加强', '进一步完善', '扎实开展', '全面落实', '持续深化', '认真组织实施']
+OBJECTS = ['工作责任制', '长效工作机制', '监督检查制度', '风险隐患排查', '资金保障措施', '信息报送制度',
+           '考核评价体系', '部门协调联动', '宣传引导工作', '应急处置预案']
+GOALS = ['确保各项任务按期完成', '形成一批可复制可推广的经验做法', '不断提升群众获得感和满意度',
+         '为经济社会高质量发展提供有力保障', '推动工作取得实效', '切实防范化解重大风险']
+NUMERALS = ['一', '二', '三', '四', '五', '六', '七', '八', '九', '十']
+PROGRESS = ['已完成', '按计划推进', '进度滞后', '已完成阶段性任务', '正在组织验收']
+
+class SyntheticCorpus:
+    """合成公文语料（相同种子生成相同内容）"""
+
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+
+    def document(self, index: int, target_chars: int = 8000) -> Dict[str, Any]:
+        """
+        生成一篇公文
+
+        Args:
+            index: 文档序号（与种子共同决定内容）
+            target_chars: 正文目标字数
+
+        Returns:
+            {'title', 'sender', 'recipient', 'date', 'sections': [(标题, [段落])], 'table': [行]}
+        """
+        rng = random.Random(self.seed * 1000003 + index)
+        sender = rng.choice(ORGANIZATIONS)
+        subject = rng.choice(SUBJECTS)
+        doc_type = rng.choice(DOC_TYPES)
+        year = rng.randint(2021, 2025)
+
+        sections, chars = [], 0
+        while chars < target_chars:
+            number = NUMERALS[len(sections) % len(NUMERALS)]
+            heading = f"{number}、{rng.choice(ACTIONS)}{rng.choice(OBJECTS)}"
+            paragraphs = []
+            for _ in range(rng.randint(2, 4)):
+                paragraph = self._paragraph(rng, subject, year)
+                paragraphs.append(paragraph)
+                chars += len(paragraph)
+            sections.append((heading, paragraphs))
+
+        table = [['序号', '责任单位', '工作事项', '完成时限', '进展情况']]
+        for row in range(max(5, target_chars // 400)):
+            table.append([
+                str(row + 1),
+                rng.choice(ORGANIZATIONS),
+                f"{rng.choice(ACTIONS)}{rng.choice(OBJECTS)}",
+                f"{year}年{rng.randint(1, 12)}月底前",
+                rng.choice(PROGRESS)
+            ])
+
+        return {
+            'title': f"{sender}关于{subject}的{doc_type}",
+            'sender': sender,
+            'recipient': '各市、县（区）人民政府，省直有关单位：',
+            'date': f"{year}年{rng.randint(1, 12)}月{rng.randint(1, 28)}日",
+            'sections': sections,
+            'table': table
+        }
+
+    @staticmethod
+    def _paragraph(rng: random.Random, subject: str, year: int) -> str:
+        """生成一个正文段落"""
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            sentences.append(
+                f"各地各部门要{rng.choice(ACTIONS)}{subject}有关部署要求，{rng.choice(ACTIONS)}{rng.choice(OBJECTS)}，"
+                f"{year}年累计投入资金{rng.randint(100, 9999)}万元，覆盖{rng.randint(10, 500)}个乡镇（街道），"
+                f"{rng.choice(GOALS)}。"
+            )
+        return ''.join(sentences)
+
+    @staticmethod
+    def text(doc: Dict[str, Any]) -> str:
+        """公文全文（纯文本）"""
+        lines = [doc['title'], '', doc['recipient']]
+        for heading, paragraphs in doc['sections']:
+            lines.append(heading)
+            lines.extend(paragraphs)
+        lines.append('')
+        lines.extend('\t'.join(row) for row in doc['table'])
+        lines.extend(['', doc['sender'], doc['date']])
+        return '\n'.join(lines)
+
+    def chunk_pool(self, size: int, chars: int = 400) -> List[str]:
+        """生成指定数量的不重复文档块文本（用于大规模向量库测试）"""
+        rng = random.Random(self.seed)
+        pool = []
+        for i in range(size):
+            text = ''
+            while len(text) < chars:
+                text += self._paragraph(rng, rng.choice(SUBJECTS), 2021 + i % 5)
+            pool.append(text[:chars])
+        return pool
+
+# ----------------------------------------------------------------------
+# 各格式写出
+# ----------------------------------------------------------------------
+
+def write_txt(doc: Dict[str, Any]) -> bytes:
+    """写出UTF-8文本"""
+    return SyntheticCorpus.text(doc).encode('utf-8')
+
+def write_docx(doc: Dict[str, Any]) -> bytes:
+    """写出Word文档（正文段落加一个工作任务表）"""
+    from docx import Document
+
+    document = Document()
+    document.add_heading(doc['title'], level=1)
+    document.add_paragraph(doc['recipient'])
+    for heading, paragraphs in doc['sections']:
+        document.add_heading(heading, level=2)
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+
+    rows = doc['table']
+    table = document.add_table(rows=len(rows), cols=len(rows[0]))
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row):
+            table.cell(r, c).text = value
+
+    document.add_paragraph(doc['sender'])
+    document.add_paragraph(doc['date'])
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+def write_xlsx(doc: Dict[str, Any]) -> bytes:
+    """写出Excel工作簿（工作任务表，另附正文段落表）"""
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = '工作任务'
+    for row in doc['table']:
+        sheet.append(row)
+
+    text_sheet = workbook.create_sheet('正文')
+    text_sheet.append(['章节', '内容'])
+    for heading, paragraphs in doc['sections']:
+        for paragraph in paragraphs:
+            text_sheet.append([heading, paragraph])
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+def _pdf_text(value: str) -> str:
+    """PDF十六进制字符串（UCS-2大端，丢弃基本平面以外的字符）"""
+    return '<' + ''.join(f"{ord(ch):04X}" for ch in value if ord(ch) < 0xD800 or 0xE000 <= ord(ch) <= 0xFFFF) + '>'
+
+def _to_unicode_cmap(chars) -> bytes:
+    """字形编号（即UCS-2码位）到Unicode的映射（与子集字体相同，只包含用到的字符）"""
+    entries = [f"<{ord(ch):04X}> <{ord(ch):04X}>" for ch in sorted(chars)]
+    blocks = []
+    for i in range(0, len(entries), 100):
+        batch = entries[i:i + 100]
+        blocks.append(f"{len(batch)} beginbfchar\n" + '\n'.join(batch) + "\nendbfchar")
+    return (
+        "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+        "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+        "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+        + '\n'.join(blocks) +
+        "\nendcmap\nCMapName currentdict /CMap defineresource pop\nend\nend\n"
+    ).encode('ascii')
+
+def write_pdf(doc: Dict[str, Any], chars_per_line: int = 36, lines_per_page: int = 44) -> bytes:
+    """写出PDF（A4，每页固定行数）"""
+    lines = []
+    for raw_line in SyntheticCorpus.text(doc).split('\n'):
+        raw_line = raw_line.replace('\t', '  ')
+        lines.extend([raw_line[i:i + chars_per_line] for i in range(0, len(raw_line), chars_per_line)] or [''])
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    def stream(data: bytes) -> bytes:
+        return b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data)
+
+    catalog = add(b'')
+    pages_id = add(b'')
+    descriptor = add(b"<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] "
+                     b"/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>")
+    cid_font = add(b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+                   b"/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> "
+                   b"/FontDescriptor %d 0 R /DW 1000 >>" % descriptor)
+    used = {ch for line in lines for ch in line if ord(ch) < 0xD800 or 0xE000 <= ord(ch) <= 0xFFFF}
+    to_unicode = add(stream(_to_unicode_cmap(used)))
+    font = add(b"<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /Identity-H "
+               b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>" % (cid_font, to_unicode))
+
+    page_ids = []
+    for page_lines in pages:
+        content = ['BT', '/F1 12 Tf', '16 TL', '72 770 Td']
+        content.extend(f"{_pdf_text(line)} Tj T*" for line in page_lines)
+        content.append('ET')
+        content_id = add(stream('\n'.join(content).encode('ascii')))
+        page_ids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                            % (pages_id, font, content_id)))
+
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b' '.join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids))
+    title = '<FEFF' + _pdf_text(doc['title'])[1:]
+    info = add(b"<< /Title %s /Creator (official_document benchmark) >>" % title.encode('ascii'))
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        output.write(b"%010d 00000 n \n" % offset)
+    output.write(b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                 % (len(objects) + 1, catalog, info, xref))
+    return output.getvalue()
+
+WRITERS: Dict[str, Callable[[Dict[str, Any]], bytes]] = {
+    'pdf': write_pdf,
+    'docx': write_docx,
+    'xlsx': write_xlsx,
+    'txt': write_txt
+}
+
+def generate_documents(formats=FORMATS, count: int = 10, target_chars: int = 8000,
+                       seed: int = 42) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    在内存中生成各格式的合成文档
+
+    Returns:
+        {格式: [{'file_name', 'data', 'chars'}]}，缺少写出依赖的格式返回{'error': 原因}
+    """
+    corpus = SyntheticCorpus(seed)
+    docs = [corpus.document(i, target_chars) for i in range(count)]
+    result = {}
+    for fmt in formats:
+        try:
+            result[fmt] = [{
+                'file_name': f"bench_{i:04d}.{fmt}",
+                'data': WRITERS[fmt](doc),
+                'chars': len(SyntheticCorpus.text(doc))
+            } for i, doc in enumerate(docs)]
+        except ImportError as e:
+            result[fmt] = {'error': f"缺少依赖: {e}"}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成公文语料')
+    parser.add_argument('--output-dir', required=True, help='输出目录')
+    parser.add_argument('--count', type=int, default=10, help='每种格式的文档数')
+    parser.add_argument('--chars', type=int, default=8000, help='每篇正文目标字数')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='格式列表，逗号分隔')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary = {}
+    for fmt, files in generate_documents(args.formats.split(','), args.count, args.chars, args.seed).items():
+        if isinstance(files, dict):
+            summary[fmt] = files
+            continue
+        for item in files:
+            with open(os.path.join(args.output_dir, item['file_name']), 'wb') as f:
+                f.write(item['data'])
+        summary[fmt] = {'files': len(files), 'bytes': sum(len(item['data']) for item in files)}
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传路径内存基准测试
+对比旧的整体读取路径与流式缓冲路径在并发上传时的峰值RSS
+
+每种模式在独立子进程中运行：模拟werkzeug已落盘的请求流，执行读取、哈希、格式检测和分片上传，
+对象存储使用按分片读取的空实现，只衡量应用侧内存。
+
+用法：
+    python benchmarks/upload_memory.py --size-mb 50 --concurrency 4
+"""
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+class NullObjectStore:
+    """按分片读取数据后丢弃的对象存储"""
+
+    def put_object(self, bucket_name, object_name, data, length, content_type=None, part_size=5 * 1024 * 1024):
+        remaining = length
+        while remaining > 0:
+            chunk = data.read(min(part_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+def peak_rss_mb() -> float:
+    """当前进程峰值RSS（MB，包含mmap映射的文件页）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def anon_rss_mb() -> float:
+    """当前进程匿名内存RSS（MB，不含可回收的文件页），非Linux返回0"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+class AnonRssSampler(threading.Thread):
+    """后台采样匿名内存峰值"""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = anon_rss_mb()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, anon_rss_mb())
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> float:
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, anon_rss_mb())
+        return self.peak
+
+def make_request_file(size_mb: int) -> str:
+    """生成模拟的上传请求体文件（文本内容）"""
+    fd, path = tempfile.mkstemp(suffix='.txt')
+    line = ('公文写作知识库基准测试数据，' * 8 + '\n').encode('utf-8')
+    with os.fdopen(fd, 'wb') as f:
+        remaining = size_mb * 1024 * 1024
+        while remaining > 0:
+            f.write(line[:remaining])
+            remaining -= len(line)
+    return path
+
+def legacy_upload(request_path: str, store: NullObjectStore):
+    """旧路径：整体读取后分别用于哈希、上传和解析"""
+    from services.parser_registry import parser_registry
+
+    with open(request_path, 'rb') as request_stream:
+        file_data = request_stream.read()
+    parser_registry.detect_format(file_data, 'bench.txt')
+    hashlib.md5(file_data).hexdigest()
+    store.put_object('bench', 'bench.txt', io.BytesIO(file_data), len(file_data))
+    # 处理线程闭包持有的数据副本
+    return bytes(file_data)
+
+def streaming_upload(request_path: str, store: NullObjectStore):
+    """新路径：流式缓冲 + 增量哈希 + 视图上传"""
+    from services.parser_registry import parser_registry
+    from services.upload_spool import SpooledUpload
+
+    with open(request_path, 'rb') as request_stream:
+        upload = SpooledUpload.from_stream(request_stream)
+    parser_registry.detect_format(upload.view(), 'bench.txt')
+    upload.content_hash
+    store.put_object('bench', 'bench.txt', upload.open_stream(), upload.size)
+    return upload
+
+def run_mode(mode: str, size_mb: int, concurrency: int) -> dict:
+    """在当前进程中运行一种模式"""
+    request_files = [make_request_file(size_mb) for _ in range(concurrency)]
+    store = NullObjectStore()
+    handler = legacy_upload if mode == 'legacy' else streaming_upload
+
+    baseline = peak_rss_mb()
+    anon_baseline = anon_rss_mb()
+    sampler = AnonRssSampler()
+    sampler.start()
+
+    results = []
+    start_time = time.time()
+    threads = [threading.Thread(target=lambda p=path: results.append(handler(p, store))) for path in request_files]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start_time
+    peak = peak_rss_mb()
+    anon_peak = sampler.stop()
+
+    for item in results:
+        if hasattr(item, 'close'):
+            item.close()
+    for path in request_files:
+        os.remove(path)
+
+    return {
+        'mode': mode,
+        'size_mb': size_mb,
+        'concurrency': concurrency,
+        'baseline_rss_mb': round(baseline, 1),
+        'peak_rss_mb': round(peak, 1),
+        'peak_rss_per_upload_mb': round((peak - baseline) / concurrency, 1),
+        'peak_anon_rss_mb': round(anon_peak, 1),
+        'peak_anon_rss_per_upload_mb': round((anon_peak - anon_baseline) / concurrency, 1),
+        'elapsed_s': round(elapsed, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='上传路径峰值内存基准测试')
+    parser.add_argument('--size-mb', type=int, default=50, help='单个上传文件大小（MB）')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发上传数')
+    parser.add_argument('--mode', choices=['legacy', 'streaming'], help='只运行指定模式（内部使用）')
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.size_mb, args.concurrency)))
+        return
+
+    # 每种模式使用独立子进程，避免峰值RSS相互影响
+    report = []
+    for mode in ('legacy', 'streaming'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode,
+             '--size-mb', str(args.size_mb), '--concurrency', str(args.concurrency)],
+            capture_output=True, text=True, check=True, cwd=BACKEND_DIR
+        ).stdout
+        report.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -5,10 +5,10 @@ import os
 
 # MinIO配置
 MINIO_CONFIG = {
-    'endpoint': 'localhost:9000',
-    'access_key': 'minioadmin',
-    'secret_key': 'minioadmin',
-    'secure': False,
+    'endpoint': os.getenv('MINIO_ENDPOINT', 'localhost:9000'),
+    'access_key': os.getenv('MINIO_ACCESS_KEY', 'minioadmin'),
+    'secret_key': os.getenv('MINIO_SECRET_KEY', 'minioadmin'),
+    'secure': os.getenv('MINIO_SECURE', 'false').lower() == 'true',
     'bucket_name': 'knowledge-base',
     'region': 'us-east-1'
 }
@@ -47,3 +47,137 @@ MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
 # 支持的文件类型
 SUPPORTED_FILE_TYPES = ['.pdf', '.docx', '.doc', '.txt', '.md', '.xlsx', '.xls', '.csv']
+
+# 重排序（Cross-Encoder）配置
+RERANK_CONFIG = {
+    'enabled': os.getenv('RERANK_ENABLED', 'false').lower() == 'true',
+    'model_path': os.getenv('RERANK_MODEL_PATH', '/opt/official_ai_writer/official_document/models/cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'),
+    'model_name': os.getenv('RERANK_MODEL_NAME', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'),
+    'batch_size': int(os.getenv('RERANK_BATCH_SIZE', 16)),
+    'latency_budget_ms': int(os.getenv('RERANK_LATENCY_BUDGET_MS', 300)),  # 超出预算时回退到向量检索顺序
+    'top_n': int(os.getenv('RERANK_TOP_N', 3)),  # 重排序后保留的文档块数量
+    'cache_size': int(os.getenv('RERANK_CACHE_SIZE', 4096))
+}
+
+# RAG上下文组装配置（MMR多样化与去重）
+CONTEXT_CONFIG = {
+    'max_chunks': 5,  # 上下文中最多使用的文档块数量
+    'mmr_lambda': 0.7,  # 相关性与多样性的权衡系数，越大越偏向相关性
+    'duplicate_threshold': 0.95,  # 余弦相似度超过该值视为近似重复
+    'overlap_threshold': 0.5  # 同一文件中字符区间重叠比例超过该值视为重复
+}
+
+# 向量重建（嵌入模型升级迁移）配置
+REEMBED_CONFIG = {
+    'batch_size': 256,  # 每批读取并向量化的文档块数量
+    'max_chunks_per_sec': 0,  # 限流：每秒最多处理的文档块数，0表示不限制
+    'target_chunks_per_sec': 200,  # 吞吐目标，低于该值时在进度中给出提示
+    'state_file': 'reembed_job.json',  # 断点续传状态文件（位于向量数据库目录下）
+    'drop_previous_after': int(os.getenv('REEMBED_DROP_PREVIOUS_AFTER', 3600))  # 切换后多久删除旧集合（秒），负数表示保留
+}
+
+# 知识库统计聚合配置
+STATS_CONFIG = {
+    'reconcile_interval': 300,  # 后台与MinIO、ChromaDB、检索日志对账的间隔（秒）
+    'retry_backoff': 5  # 对账失败后首次重试等待秒数，之后指数增长（不超过对账间隔）
+}
+
+# 检索日志异步写入配置
+RETRIEVAL_LOG_CONFIG = {
+    'table': 'retrieval_logs',
+    'buffer_size': 10000,  # 内存环形缓冲区容量，写满后覆盖最旧记录并计数
+    'batch_size': 200,  # 累积到该数量时立即批量写入
+    'flush_interval': 2.0  # 最长写入间隔（秒）
+}
+
+# 表格文件（Excel/CSV）流式解析配置
+TABULAR_CONFIG = {
+    'rows_per_chunk': 50,  # 每个行组文档块最多包含的数据行数
+    'max_chunk_chars': 1000,  # 每个行组文档块的最大字符数（与chunk_size保持一致）
+    'ingest_batch_size': int(os.getenv('TABULAR_INGEST_BATCH_SIZE', 256))  # 入库时每批向量化并写入的行组数
+}
+
+# 文档解析调度配置
+PARSER_CONFIG = {
+    'heavy_concurrency': int(os.getenv('PARSER_HEAVY_CONCURRENCY', 2)),  # 高CPU开销解析后端（PDF、旧版Office）的最大并发数
+    'light_concurrency': int(os.getenv('PARSER_LIGHT_CONCURRENCY', 8))  # 低开销解析后端的最大并发数
+}
+
+# 上传流式处理配置
+UPLOAD_CONFIG = {
+    'spool_threshold': int(os.getenv('UPLOAD_SPOOL_THRESHOLD', 8 * 1024 * 1024)),  # 超过该大小后转存到临时文件
+    'spool_dir': os.getenv('UPLOAD_SPOOL_DIR') or None,  # 临时文件目录，默认使用系统临时目录
+    'read_chunk_size': 1024 * 1024  # 从请求流每次读取的字节数
+}
+
+# MinIO传输配置（分片上传、并行分段下载）
+MINIO_TRANSFER_CONFIG = {
+    'part_size': int(os.getenv('MINIO_PART_SIZE', 8 * 1024 * 1024)),  # 分片/分段大小（不小于5MB）
+    'multipart_threshold': int(os.getenv('MINIO_MULTIPART_THRESHOLD', 16 * 1024 * 1024)),  # 超过该大小使用分片上传和并行下载
+    'max_workers': int(os.getenv('MINIO_TRANSFER_WORKERS', 4)),  # 单个对象的并发分片数
+    'max_retries': int(os.getenv('MINIO_TRANSFER_RETRIES', 3)),  # 重试次数：下载按分段重试，上传仅对可回退的数据流整体重试（不支持单个分片重试）
+    'retry_backoff': 0.5  # 首次重试等待秒数，之后指数增长
+}
+
+# MinIO对象本地磁盘缓存配置
+OBJECT_CACHE_CONFIG = {
+    'enabled': os.getenv('OBJECT_CACHE_ENABLED', 'true').lower() == 'true',
+    'cache_dir': os.getenv('OBJECT_CACHE_DIR', './object_cache'),
+    'max_bytes': int(os.getenv('OBJECT_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024)),  # 容量上限，超出后按LRU淘汰
+    'revalidate': os.getenv('OBJECT_CACHE_REVALIDATE', 'false').lower() == 'true'  # 命中时是否向MinIO校验ETag（对象名唯一且不会被覆盖，默认不校验）
+}
+
+# 知识库文件批量删除配置
+BULK_DELETE_CONFIG = {
+    'batch_size': 500,  # 每条SQL/每次向量删除包含的文件数量
+    'journal_file': 'bulk_delete_journal.json'  # 删除日志（位于向量数据库目录下），用于中断后继续
+}
+
+# 请求追踪和延迟统计配置
+TRACING_CONFIG = {
+    'enabled': os.getenv('TRACING_ENABLED', 'true').lower() == 'true',
+    'request_id_header': 'X-Request-ID',
+    'slow_request_threshold': float(os.getenv('SLOW_REQUEST_THRESHOLD', '5')),  # 超过该耗时（秒）的请求输出分段耗时日志
+    'quantile_window': 1024,  # 每个序列保留最近多少次观测用于计算分位数
+    'buckets': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+}
+
+# 性能剖析配置（默认关闭）
+PROFILING_CONFIG = {
+    'enabled': os.getenv('PROFILING_ENABLED', 'false').lower() == 'true',
+    'trigger_header': 'X-Profile',  # 请求携带该头（值为admin_token）时对该请求进行cProfile剖析
+    'sample_rate': float(os.getenv('PROFILING_SAMPLE_RATE', '0')),  # 按比例随机剖析请求
+    'admin_token': os.getenv('PROFILING_ADMIN_TOKEN', ''),  # 剖析管理接口和按请求头触发剖析所需的令牌，为空时不注册管理接口
+    'output_dir': os.getenv('PROFILING_OUTPUT_DIR', './profiles'),
+    'max_profiles': 50,  # 保留的剖析结果数量
+    'max_sample_seconds': 60,  # 采样剖析的最长时间（秒）
+    'sample_interval': 0.005  # 采样间隔（秒）
+}
+
+# ASGI部署模式配置（uvicorn asgi:app）
+ASGI_CONFIG = {
+    'llm_max_connections': int(os.getenv('ASGI_LLM_MAX_CONNECTIONS', 1000)),  # 到大模型服务的最大并发连接数
+    'llm_max_keepalive': int(os.getenv('ASGI_LLM_MAX_KEEPALIVE', 100)),  # 保持的空闲长连接数
+    'blocking_threads': int(os.getenv('ASGI_BLOCKING_THREADS', 8)),  # 执行数据库、向量检索等阻塞操作的线程数
+    'wsgi_threads': int(os.getenv('ASGI_WSGI_THREADS', 16))  # 运行其余Flask接口的线程数
+}
+
+# 生成任务（异步提交、轮询/订阅结果）配置
+GENERATION_JOB_CONFIG = {
+    'workers': int(os.getenv('GENERATION_JOB_WORKERS', 4)),  # 执行检索和生成的后台线程数
+    'max_queued': int(os.getenv('GENERATION_JOB_MAX_QUEUED', 200)),  # 排队任务上限，超出后拒绝提交
+    'result_ttl': 3600,  # 已结束任务在内存中保留的时间（秒），之后从生成记录读取
+    'heartbeat_interval': 15,  # 事件流心跳间隔（秒），避免代理断开空闲连接
+    'poll_interval': 2,  # 任务不在当前进程时，事件流轮询生成记录的间隔（秒）
+    'record_heartbeat_interval': 30,  # 排队中和执行中的任务刷新生成记录heartbeat_at的间隔（秒）
+    'orphan_timeout': int(os.getenv('GENERATION_JOB_ORPHAN_TIMEOUT', 180)),  # processing记录超过该时长（秒）没有心跳视为执行进程已退出，不小于心跳间隔的3倍
+    'max_stream_seconds': int(os.getenv('GENERATION_JOB_MAX_STREAM_SECONDS', 600))  # 单个事件流的最长持续时间（秒），到期后客户端需重新订阅
+}
+
+# 生成记录查询配置
+GENERATION_RECORD_CONFIG = {
+    'table': os.getenv('GENERATION_RECORD_TABLE', 'generation_records'),
+    'large_columns': ['content', 'generated_content', 'rag_context'],  # 列表接口不读取的大字段
+    'cache_size': int(os.getenv('GENERATION_RECORD_CACHE_SIZE', 512)),  # 已结束记录的详情LRU缓存条数
+    'max_page_size': 200  # 列表接口每页最多返回的记录数
+}
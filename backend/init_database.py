@@ -1,6 +1,8 @@
 import mysql.connector
 import json
 
+from config_rag import GENERATION_RECORD_CONFIG
+
 # 数据库配置
 DB_CONFIG = {
     'host': '47.118.250.53',
@@ -18,6 +20,42 @@ def get_db_connection():
         print(f"数据库连接错误: {err}")
         return None
 
+def create_generation_record_index(cursor):
+    """创建生成记录列表接口（按user_id筛选、按id倒序游标分页）使用的索引，表不存在或索引已存在时跳过"""
+    table = GENERATION_RECORD_CONFIG['table']
+    index_name = f"idx_{table}_user_id_id"
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'user_id'
+    """, (table,))
+    if not cursor.fetchone()[0]:
+        print(f"生成记录表 {table} 不存在或没有user_id列，跳过创建索引")
+        return
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index_name))
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute(f"CREATE INDEX {index_name} ON {table} (user_id, id)")
+    print(f"已创建生成记录索引: {index_name}")
+
+def add_generation_record_heartbeat(cursor):
+    """为生成记录表添加心跳列（排队和执行中的任务定期刷新，用于识别执行进程已退出的记录），表不存在或列已存在时跳过"""
+    table = GENERATION_RECORD_CONFIG['table']
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    columns = {row[0] for row in cursor.fetchall()}
+    if not columns:
+        print(f"生成记录表 {table} 不存在，跳过添加心跳列")
+        return
+    if 'heartbeat_at' in columns:
+        return
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN heartbeat_at TIMESTAMP NULL DEFAULT NULL")
+    print(f"已为生成记录表 {table} 添加心跳列: heartbeat_at")
+
 def init_database():
     """初始化数据库表"""
     conn = get_db_connection()
@@ -129,6 +167,10 @@ def init_database():
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
             """, field)
         
+        # 生成记录列表索引和心跳列
+        create_generation_record_index(cursor)
+        add_generation_record_heartbeat(cursor)
+        
         conn.commit()
         print("数据库初始化成功")
         return True
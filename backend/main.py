@@ -67,12 +67,10 @@ from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import mysql.connector
 import os
+import time
 import json
-from werkzeug.utils import secure_filename
-import requests
 from datetime import datetime
 import tempfile
-import docx
 from docx import Document
 from docx.shared import Inches
 from docx.oxml.shared import OxmlElement, qn
@@ -111,6 +109,22 @@ except ImportError:
         logger.warning("无法导入AI操作模块")
         ai_operations_bp = None
 
+# 导入文档解析注册表
+try:
+    from services.parser_registry import parser_registry
+except ImportError:
+    from backend.services.parser_registry import parser_registry
+
+# 导入请求追踪
+try:
+    from utils.tracing import tracer, register_tracing, get_request_id, TracedConnection
+    from utils.profiling import profiled, register_profiling
+    from services.llm_client import LLMRoute
+except ImportError:
+    from backend.utils.tracing import tracer, register_tracing, get_request_id, TracedConnection
+    from backend.utils.profiling import profiled, register_profiling
+    from backend.services.llm_client import LLMRoute
+
 # 导入配置（使用新的安全配置模块）
 try:
     from config.security import security_config
@@ -150,8 +164,8 @@ except Exception as e:
     app.config['SECRET_KEY'] = 'default-secret-key'
     app.debug = True
 
-# 配置CORS，允许特定域名访问
-CORS(app, origins=[
+# 配置CORS，允许特定域名访问（ASGI部署时复用同一列表）
+CORS_ORIGINS = [
     'http://localhost:8081',
     'http://127.0.0.1:8081',
     'http://115.190.152.96:8081',
@@ -159,7 +173,8 @@ CORS(app, origins=[
     'http://localhost:8005',
     'http://121.36.205.70:8005',
     'http://chenxiaoshivivid.com.cn:8005'
-])
+]
+CORS(app, origins=CORS_ORIGINS)
 
 # 注册全局错误处理器
 try:
@@ -189,15 +204,23 @@ if ai_operations_bp:
 else:
     logger.warning("AI操作蓝图未注册")
 
+# 请求追踪（请求ID、分段耗时、/metrics）
+register_tracing(app)
+
+# 性能剖析（按需cProfile、采样剖析接口）
+register_profiling(app)
+
 # 简化请求日志中间件
 @app.before_request
 def log_request_info():
-    logger.info(f'请求: {request.method} {request.path}')
+    logger.info(f'请求: {request.method} {request.path} [{get_request_id()}]')
 
 # 简化响应日志中间件
 @app.after_request
 def log_response_info(response):
-    logger.info(f'响应: {response.status_code}')
+    trace = tracer.current()
+    elapsed = f' 耗时 {(time.perf_counter() - trace.start) * 1000:.1f}ms' if trace else ''
+    logger.info(f'响应: {response.status_code}{elapsed} [{get_request_id()}]')
     return response
 
 # 错误处理中间件
@@ -241,10 +264,12 @@ def get_db_connection():
         # 尝试使用安全配置
         try:
             from config.security import security_config
-            return mysql.connector.connect(**security_config.DB_CONFIG)
+            with tracer.span('db', 'connect'):
+                return TracedConnection(mysql.connector.connect(**security_config.DB_CONFIG))
         except ImportError:
             # 如果无法导入安全配置，使用默认配置
-            return mysql.connector.connect(**DB_CONFIG)
+            with tracer.span('db', 'connect'):
+                return TracedConnection(mysql.connector.connect(**DB_CONFIG))
     except mysql.connector.Error as err:
         logger.error(f"数据库连接错误: {err}")
         return None
@@ -373,135 +398,152 @@ def get_templates():
     
     return jsonify({'data': templates})
 
-@app.route('/api/generate-title', methods=['POST'])
-def generate_title():
-    """从内容生成标题"""
-    data = request.json
+def prepare_generate_title(state, data):
+    """构建标题生成请求"""
     content = data.get('content', '')
     
     if not content:
-        return jsonify({'success': False, 'message': '内容不能为空'})
+        return {'success': False, 'message': '内容不能为空'}, 200
     
-    try:
-        response = requests.post(
-            DEEPSEEK_API_URL,
-            headers={
-                "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system", 
-                        "content": "你是一个专业的公文写作助手，请根据提供的公文内容生成一个简洁、准确的标题。标题应该符合公文格式规范。"
-                    },
-                    {
-                        "role": "user", 
-                        "content": f"请根据以下公文内容生成标题：\n\n{content}"
-                    }
-                ]
-            },
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            title = result['choices'][0]['message']['content'].strip()
-            logger.info(f"生成标题成功: {title}")
-            return jsonify({'success': True, 'title': title})
-        else:
-            logger.error(f"API调用失败: {response.status_code}")
-            return jsonify({'success': False, 'message': 'API调用失败'})
-            
-    except Exception as e:
-        logger.error(f"生成标题错误: {e}")
-        return jsonify({'success': False, 'message': '生成标题失败，请稍后再试'})
+    state['request'] = {
+        'url': DEEPSEEK_API_URL,
+        'headers': {
+            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        'json': {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system", 
+                    "content": "你是一个专业的公文写作助手，请根据提供的公文内容生成一个简洁、准确的标题。标题应该符合公文格式规范。"
+                },
+                {
+                    "role": "user", 
+                    "content": f"请根据以下公文内容生成标题：\n\n{content}"
+                }
+            ]
+        },
+        'timeout': 30
+    }
+    return None
+
+def finish_generate_title(state, response):
+    """解析标题生成结果"""
+    if response.status_code == 200:
+        result = response.json()
+        title = result['choices'][0]['message']['content'].strip()
+        logger.info(f"生成标题成功: {title}")
+        return {'success': True, 'title': title}, 200
+    
+    logger.error(f"API调用失败: {response.status_code}")
+    return {'success': False, 'message': 'API调用失败'}, 200
 
-@app.route('/api/generate-content', methods=['POST'])
-def generate_content():
-    """从主题生成内容（支持参考文件）"""
-    data = request.json
+def generate_title_error(state, error):
+    logger.error(f"生成标题错误: {error}")
+    return {'success': False, 'message': '生成标题失败，请稍后再试'}, 200
+
+def prepare_generate_content(state, data):
+    """构建内容生成请求（读取参考文件内容）"""
     topic = data.get('topic', '')
     document_type = data.get('document_type', '')
     reference_files = data.get('reference_files', [])
     use_reference_files = data.get('use_reference_files', True)
     
     if not topic:
-        return jsonify({'success': False, 'message': '主题不能为空'})
+        return {'success': False, 'message': '主题不能为空'}, 200
     
-    try:
-        # 构建系统提示词
-        system_prompt = f"你是一个专业的公文写作助手，请根据提供的主题生成一篇符合{document_type}格式规范的公文内容。内容应该结构清晰、语言规范、符合公文写作要求。请直接返回正文内容，不要包含标题。"
-        
-        # 构建用户提示词
-        user_prompt = f"请根据以下主题生成{document_type}内容：\n\n{topic}"
-        
-        # 如果有参考文件且用户选择使用参考文件
-        if reference_files and use_reference_files:
-            try:
-                # 从知识库获取参考文件内容
-                reference_content = ""
-                for file_id in reference_files:
-                    # 查询文件信息
-                    conn = get_db_connection()
-                    if conn:
-                        cursor = conn.cursor(dictionary=True)
-                        cursor.execute("SELECT * FROM knowledge_files WHERE id = %s", (file_id,))
-                        file_info = cursor.fetchone()
-                        cursor.close()
-                        conn.close()
-                        
-                        if file_info and file_info.get('metadata'):
-                            metadata = json.loads(file_info['metadata'])
-                            if 'content' in metadata:
-                                reference_content += f"\n\n参考文件内容：\n{metadata['content'][:1000]}..."  # 限制长度
-                
-                if reference_content:
-                    user_prompt += f"\n\n参考文件内容：{reference_content}"
-                    system_prompt += "请结合参考文件的内容，确保生成的内容与参考文件保持一致性和相关性。"
-                
-            except Exception as e:
-                logger.warning(f"获取参考文件内容失败: {e}")
-                # 即使参考文件获取失败，也继续生成内容
-        
-        # 调用AI接口
-        response = requests.post(
-            DEEPSEEK_API_URL,
-            headers={
-                "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system", 
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user", 
-                        "content": user_prompt
-                    }
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.7
-            },
-            timeout=60
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content'].strip()
-            logger.info(f"生成内容成功，长度: {len(content)}")
-            return jsonify({'success': True, 'content': content})
-        else:
-            logger.error(f"API调用失败: {response.status_code}")
-            return jsonify({'success': False, 'message': 'API调用失败'})
+    # 构建系统提示词
+    system_prompt = f"你是一个专业的公文写作助手，请根据提供的主题生成一篇符合{document_type}格式规范的公文内容。内容应该结构清晰、语言规范、符合公文写作要求。请直接返回正文内容，不要包含标题。"
+    
+    # 构建用户提示词
+    user_prompt = f"请根据以下主题生成{document_type}内容：\n\n{topic}"
+    
+    # 如果有参考文件且用户选择使用参考文件
+    if reference_files and use_reference_files:
+        try:
+            # 从知识库获取参考文件内容
+            reference_content = ""
+            for file_id in reference_files:
+                # 查询文件信息
+                conn = get_db_connection()
+                if conn:
+                    cursor = conn.cursor(dictionary=True)
+                    cursor.execute("SELECT * FROM knowledge_files WHERE id = %s", (file_id,))
+                    file_info = cursor.fetchone()
+                    cursor.close()
+                    conn.close()
+                    
+                    if file_info and file_info.get('metadata'):
+                        metadata = json.loads(file_info['metadata'])
+                        if 'content' in metadata:
+                            reference_content += f"\n\n参考文件内容：\n{metadata['content'][:1000]}..."  # 限制长度
             
-    except Exception as e:
-        logger.error(f"生成内容错误: {e}")
-        return jsonify({'success': False, 'message': '生成内容失败，请稍后再试'})
+            if reference_content:
+                user_prompt += f"\n\n参考文件内容：{reference_content}"
+                system_prompt += "请结合参考文件的内容，确保生成的内容与参考文件保持一致性和相关性。"
+            
+        except Exception as e:
+            logger.warning(f"获取参考文件内容失败: {e}")
+            # 即使参考文件获取失败，也继续生成内容
+    
+    state['request'] = {
+        'url': DEEPSEEK_API_URL,
+        'headers': {
+            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        'json': {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system", 
+                    "content": system_prompt
+                },
+                {
+                    "role": "user", 
+                    "content": user_prompt
+                }
+            ],
+            "max_tokens": 2000,
+            "temperature": 0.7
+        },
+        'timeout': 60
+    }
+    return None
+
+def finish_generate_content(state, response):
+    """解析内容生成结果"""
+    if response.status_code == 200:
+        result = response.json()
+        content = result['choices'][0]['message']['content'].strip()
+        logger.info(f"生成内容成功，长度: {len(content)}")
+        return {'success': True, 'content': content}, 200
+    
+    logger.error(f"API调用失败: {response.status_code}")
+    return {'success': False, 'message': 'API调用失败'}, 200
+
+def generate_content_error(state, error):
+    logger.error(f"生成内容错误: {error}")
+    return {'success': False, 'message': '生成内容失败，请稍后再试'}, 200
+
+# 同步（Flask）和异步（ASGI）共用的处理流程
+generate_title_route = LLMRoute('generate_title', prepare_generate_title, finish_generate_title,
+                                generate_title_error)
+generate_content_route = LLMRoute('generate_content', prepare_generate_content, finish_generate_content,
+                                  generate_content_error, blocking=True)
+
+@app.route('/api/generate-title', methods=['POST'])
+def generate_title():
+    """从内容生成标题"""
+    body, status = generate_title_route.run(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+@app.route('/api/generate-content', methods=['POST'])
+def generate_content():
+    """从主题生成内容（支持参考文件）"""
+    body, status = generate_content_route.run(request.get_json(silent=True) or {})
+    return jsonify(body), status
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
@@ -529,46 +571,30 @@ def upload_file():
             if not allowed_file(file.filename):
                 raise create_file_upload_error("不支持的文件类型", file.filename)
         
-        # 保存并验证文件
+        # 在内存中读取并解析，不落地临时文件
+        file_data = file.read()
+        
+        # 验证文件内容（大小和MIME类型）
         try:
-            is_saved, message, file_path = FileUploadValidator.save_and_validate_file(file, UPLOAD_FOLDER)
-            if not is_saved:
-                raise create_file_upload_error(message, file.filename)
+            content_valid = InputValidator.validate_file_data(file_data, file.filename)
         except Exception:
-            # 如果新保存器不可用，使用原有逻辑
-            filename = secure_filename(file.filename)
-            if not os.path.exists(UPLOAD_FOLDER):
-                os.makedirs(UPLOAD_FOLDER)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
+            # 如果新验证器不可用，只检查大小
+            content_valid = len(file_data) <= app.config['MAX_CONTENT_LENGTH']
+        if not content_valid:
+            raise create_file_upload_error("文件内容验证失败", file.filename)
+        
+        file_format = parser_registry.detect_format(file_data, file.filename)
+        if file_format not in parser_registry.supported_formats:
+            raise create_file_upload_error("不支持的文件类型", file.filename)
         
         # 解析文件内容
-        content = ""
         try:
-            if file_path.endswith('.md'):
-                logger.info("解析Markdown文件")
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            elif file_path.endswith('.docx'):
-                logger.info("解析Word文件")
-                doc = docx.Document(file_path)
-                content = '\n'.join([para.text for para in doc.paragraphs])
-            elif file_path.endswith('.txt'):
-                logger.info("解析文本文件")
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            
+            logger.info(f"解析{file_format}文件")
+            content = parser_registry.parse(file_data, file.filename)['content']
             logger.info(f"文件解析成功，内容长度: {len(content)}")
         except Exception as parse_error:
             logger.error(f"文件解析错误: {parse_error}")
             raise create_file_upload_error(f"文件解析失败: {str(parse_error)}", file.filename)
-        finally:
-            # 删除临时文件
-            try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            except Exception as e:
-                logger.error(f"删除临时文件失败: {e}")
         
         return jsonify({'success': True, 'content': content})
         
@@ -580,6 +606,7 @@ def upload_file():
             return jsonify({'success': False, 'message': f'文件上传失败: {str(e)}'})
 
 @app.route('/api/generate', methods=['POST'])
+@profiled()
 def generate_document():
     """生成公文"""
     logger.info("接收到生成公文请求")
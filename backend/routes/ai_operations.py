@@ -1,5 +1,4 @@
 from flask import Blueprint, request, jsonify
-import requests
 import time
 from datetime import datetime
 import os
@@ -12,12 +11,113 @@ except ImportError:
     import logging
     logger = logging.getLogger(__name__)
 
+from services.llm_client import LLMRoute
+
 # 创建蓝图
 ai_operations_bp = Blueprint('ai_operations', __name__)
 
 # 配置
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_API_URL = os.getenv('DEEPSEEK_API_URL', "https://api.deepseek.com/v1/chat/completions")
+
+def prepare_text_operation(state, data):
+    """校验参数并构建大模型请求"""
+    state['start_time'] = time.time()
+    
+    if not data:
+        return {
+            'success': False,
+            'error': '缺少请求数据'
+        }, 400
+    
+    action = data.get('action', '')
+    selected_text = data.get('selectedText', '')
+    full_content = data.get('fullContent', '')
+    extra_requirements = data.get('extraRequirements', '')
+    
+    if not selected_text:
+        return {
+            'success': False,
+            'error': '选中的文本内容不能为空'
+        }, 400
+    
+    if not action:
+        return {
+            'success': False,
+            'error': '操作类型不能为空'
+        }, 400
+    
+    # 验证操作类型
+    valid_actions = ['continue', 'expand', 'summarize', 'rewrite', 'polish']
+    if action not in valid_actions:
+        return {
+            'success': False,
+            'error': f'不支持的操作类型: {action}'
+        }, 400
+    
+    # 构建操作提示词
+    prompt = build_operation_prompt(action, selected_text, full_content, extra_requirements)
+    
+    logger.info(f"开始执行AI操作: {action}")
+    state['action'] = action
+    state['request'] = {
+        'url': DEEPSEEK_API_URL,
+        'headers': {
+            'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
+            'Content-Type': 'application/json'
+        },
+        'json': {
+            'model': 'deepseek-chat',
+            'messages': [
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            'temperature': 0.7,
+            'max_tokens': 2000
+        },
+        'timeout': 60
+    }
+    return None
+
+def finish_text_operation(state, response):
+    """处理大模型响应"""
+    if response.status_code == 200:
+        result = response.json()
+        generated_text = result['choices'][0]['message']['content'].strip()
+        
+        operation_time = time.time() - state['start_time']
+        
+        logger.info(f"AI操作成功，耗时: {operation_time:.2f}秒")
+        
+        return {
+            'success': True,
+            'result': generated_text,
+            'operation_time': operation_time,
+            'action': state['action']
+        }, 200
+    
+    error_msg = f"AI API调用失败: {response.status_code} - {response.text}"
+    logger.error(error_msg)
+    
+    return {
+        'success': False,
+        'error': error_msg
+    }, 500
+
+def text_operation_error(state, error):
+    """AI操作异常处理"""
+    error_msg = f"AI操作失败: {str(error)}"
+    logger.error(error_msg)
+    
+    return {
+        'success': False,
+        'error': error_msg
+    }, 500
+
+# 同步（Flask）和异步（ASGI）共用的处理流程
+text_operation_route = LLMRoute('text_operation', prepare_text_operation, finish_text_operation, text_operation_error)
 
 @ai_operations_bp.route('/text-operation', methods=['POST'])
 def text_operation():
@@ -38,99 +138,8 @@ def text_operation():
     Returns:
         JSON响应
     """
-    try:
-        start_time = time.time()
-        
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': '缺少请求数据'
-            }), 400
-        
-        action = data.get('action', '')
-        selected_text = data.get('selectedText', '')
-        full_content = data.get('fullContent', '')
-        extra_requirements = data.get('extraRequirements', '')
-        
-        if not selected_text:
-            return jsonify({
-                'success': False,
-                'error': '选中的文本内容不能为空'
-            }), 400
-        
-        if not action:
-            return jsonify({
-                'success': False,
-                'error': '操作类型不能为空'
-            }), 400
-        
-        # 验证操作类型
-        valid_actions = ['continue', 'expand', 'summarize', 'rewrite', 'polish']
-        if action not in valid_actions:
-            return jsonify({
-                'success': False,
-                'error': f'不支持的操作类型: {action}'
-            }), 400
-        
-        # 构建操作提示词
-        prompt = build_operation_prompt(action, selected_text, full_content, extra_requirements)
-        
-        # 调用AI API
-        logger.info(f"开始执行AI操作: {action}")
-        
-        headers = {
-            'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'model': 'deepseek-chat',
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'temperature': 0.7,
-            'max_tokens': 2000
-        }
-        
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=60)
-        
-        if response.status_code == 200:
-            result = response.json()
-            generated_text = result['choices'][0]['message']['content'].strip()
-            
-            end_time = time.time()
-            operation_time = end_time - start_time
-            
-            logger.info(f"AI操作成功，耗时: {operation_time:.2f}秒")
-            
-            return jsonify({
-                'success': True,
-                'result': generated_text,
-                'operation_time': operation_time,
-                'action': action
-            }), 200
-        else:
-            error_msg = f"AI API调用失败: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            
-            return jsonify({
-                'success': False,
-                'error': error_msg
-            }), 500
-            
-    except Exception as e:
-        error_msg = f"AI操作失败: {str(e)}"
-        logger.error(error_msg)
-        
-        return jsonify({
-            'success': False,
-            'error': error_msg
-        }), 500
+    body, status = text_operation_route.run(request.get_json(silent=True))
+    return jsonify(body), status
 
 def build_operation_prompt(action, selected_text, full_content, extra_requirements):
     """
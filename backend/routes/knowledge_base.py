@@ -6,6 +6,7 @@ from werkzeug.utils import secure_filename
 import os
 
 from services.knowledge_base_service import KnowledgeBaseService
+from services.upload_spool import SpooledUpload, FileTooLargeError
 from config_rag import SUPPORTED_FILE_TYPES, MAX_FILE_SIZE
 
 # 导入统一的日志管理器
@@ -71,12 +72,18 @@ def upload_file():
                 'error': f'文件大小超过限制: {file_size / 1024 / 1024:.2f}MB > {MAX_FILE_SIZE / 1024 / 1024}MB'
             }), 400
         
-        # 读取文件数据
-        file_data = file.read()
+        # 流式读取上传内容：增量计算哈希，超过阈值后转存到临时文件
+        try:
+            upload = SpooledUpload.from_stream(file.stream)
+        except FileTooLargeError:
+            return jsonify({
+                'success': False,
+                'error': f'文件大小超过限制: > {MAX_FILE_SIZE / 1024 / 1024}MB'
+            }), 400
         content_type = file.content_type or 'application/octet-stream'
         
-        # 上传并处理文件
-        result = knowledge_service.upload_and_process_file(file_data, filename, content_type)
+        # 上传并处理文件（缓冲区由服务在处理结束后释放）
+        result = knowledge_service.upload_and_process_file(upload, filename, content_type)
         
         if result['success']:
             return jsonify(result), 200
@@ -218,6 +225,75 @@ def delete_knowledge_file(file_id):
             'error': f'删除知识库文件失败: {str(e)}'
         }), 500
 
+@knowledge_base_bp.route('/files/bulk-delete', methods=['POST'])
+def bulk_delete_files():
+    """
+    批量删除知识库文件
+    
+    POST /api/knowledge/files/bulk-delete
+    Content-Type: application/json
+    
+    Body:
+    {
+        "file_ids": [1, 2, 3]
+    }
+    
+    Returns:
+        JSON响应
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        file_ids = data.get('file_ids')
+        
+        if not isinstance(file_ids, list) or not file_ids:
+            return jsonify({
+                'success': False,
+                'error': 'file_ids必须是非空列表'
+            }), 400
+        
+        try:
+            file_ids = [int(file_id) for file_id in file_ids]
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'file_ids只能包含整数'
+            }), 400
+        
+        result = knowledge_service.bulk_delete_files(file_ids)
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 500
+            
+    except Exception as e:
+        logger.error(f"批量删除知识库文件失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'批量删除知识库文件失败: {str(e)}'
+        }), 500
+
+@knowledge_base_bp.route('/files/bulk-delete', methods=['GET'])
+def get_bulk_delete_status():
+    """
+    获取未完成的批量删除状态
+    
+    GET /api/knowledge/files/bulk-delete
+    
+    Returns:
+        JSON响应
+    """
+    try:
+        result = knowledge_service.get_bulk_delete_status()
+        return jsonify(result), 200
+        
+    except Exception as e:
+        logger.error(f"获取批量删除状态失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'获取批量删除状态失败: {str(e)}'
+        }), 500
+
 @knowledge_base_bp.route('/files/<int:file_id>/regenerate', methods=['POST'])
 def regenerate_vectors(file_id):
     """
@@ -248,13 +324,14 @@ def get_knowledge_base_stats():
     """
     获取知识库统计信息
     
-    GET /api/knowledge/stats
+    GET /api/knowledge/stats?refresh=false
     
     Returns:
         JSON响应
     """
     try:
-        result = knowledge_service.get_knowledge_base_stats()
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
+        result = knowledge_service.get_knowledge_base_stats(refresh)
         
         if result['success']:
             return jsonify(result), 200
@@ -268,6 +345,38 @@ def get_knowledge_base_stats():
             'error': f'获取知识库统计信息失败: {str(e)}'
         }), 500
 
+@knowledge_base_bp.route('/stats/verify', methods=['POST'])
+def verify_vector_stats():
+    """
+    扫描向量集合校验统计侧表
+    
+    POST /api/knowledge/stats/verify
+    Content-Type: application/json
+    
+    Body:
+    {
+        "repair": false
+    }
+    
+    Returns:
+        JSON响应
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        result = knowledge_service.verify_vector_stats(bool(data.get('repair', False)))
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 500
+            
+    except Exception as e:
+        logger.error(f"校验向量统计失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'校验向量统计失败: {str(e)}'
+        }), 500
+
 @knowledge_base_bp.route('/batch-search', methods=['POST'])
 def batch_search():
     """
@@ -279,7 +388,8 @@ def batch_search():
     Body:
     {
         "queries": ["查询1", "查询2", "查询3"],
-        "top_k": 5
+        "top_k": 5,
+        "file_ids": ["file_id1", "file_id2"]
     }
     
     Returns:
@@ -310,9 +420,10 @@ def batch_search():
                 }), 400
         
         top_k = data.get('top_k', 5)
+        file_ids = data.get('file_ids') or None
         
         # 批量搜索
-        result = knowledge_service.batch_search(queries, top_k)
+        result = knowledge_service.batch_search(queries, top_k, file_ids)
         
         if result['success']:
             return jsonify(result), 200
@@ -326,6 +437,89 @@ def batch_search():
             'error': f'批量搜索失败: {str(e)}'
         }), 500
 
+@knowledge_base_bp.route('/reembed', methods=['POST'])
+def start_reembedding():
+    """
+    启动（或恢复）嵌入模型迁移任务
+    
+    POST /api/knowledge/reembed
+    Content-Type: application/json
+    
+    Body:
+    {
+        "target_model": "新嵌入模型名称或本地路径",
+        "batch_size": 256,
+        "max_chunks_per_sec": 0
+    }
+    
+    Returns:
+        JSON响应
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get('target_model'):
+            return jsonify({
+                'success': False,
+                'error': '缺少目标模型参数'
+            }), 400
+        
+        result = knowledge_service.start_reembedding(
+            data['target_model'],
+            data.get('batch_size'),
+            data.get('max_chunks_per_sec')
+        )
+        
+        if result['success']:
+            return jsonify(result), 200
+        else:
+            return jsonify(result), 409
+            
+    except Exception as e:
+        logger.error(f"启动向量重建任务失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'启动向量重建任务失败: {str(e)}'
+        }), 500
+
+@knowledge_base_bp.route('/reembed', methods=['GET'])
+def get_reembedding_status():
+    """
+    获取嵌入模型迁移任务进度
+    
+    GET /api/knowledge/reembed
+    
+    Returns:
+        JSON响应
+    """
+    try:
+        return jsonify(knowledge_service.get_reembedding_status()), 200
+    except Exception as e:
+        logger.error(f"获取向量重建进度失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'获取向量重建进度失败: {str(e)}'
+        }), 500
+
+@knowledge_base_bp.route('/reembed/stop', methods=['POST'])
+def stop_reembedding():
+    """
+    停止嵌入模型迁移任务（可稍后恢复）
+    
+    POST /api/knowledge/reembed/stop
+    
+    Returns:
+        JSON响应
+    """
+    try:
+        return jsonify(knowledge_service.stop_reembedding()), 200
+    except Exception as e:
+        logger.error(f"停止向量重建任务失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'停止向量重建任务失败: {str(e)}'
+        }), 500
+
 @knowledge_base_bp.route('/health', methods=['GET'])
 def health_check():
     """
@@ -2,9 +2,10 @@
 RAG增强的公文生成API
 集成知识库检索和AI生成
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 import json
 import time
+import threading
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import sys
@@ -36,8 +37,11 @@ except ImportError:
 
 # 导入服务
 try:
-    from services.vector_service import VectorService
+    from services.vector_service import get_vector_service
     from models.knowledge_management import KnowledgeManagementModel
+    from services.rerank_service import RerankService
+    from services.context_builder import ContextBuilder
+    from config_rag import RERANK_CONFIG
     # 使用新的安全配置模块
     try:
         from config.security import security_config
@@ -47,11 +51,13 @@ try:
         # 如果安全配置不可用，使用默认值
         DEEPSEEK_API_URL = 'https://api.deepseek.com/v1/chat/completions'
         DEEPSEEK_API_KEY = None
-    import requests
 except ImportError as e:
     print(f"RAG模块导入失败: {e}")
-    VectorService = None
+    get_vector_service = None
     KnowledgeManagementModel = None
+    RerankService = None
+    ContextBuilder = None
+    RERANK_CONFIG = {'enabled': False}
     DEEPSEEK_API_URL = None
     DEEPSEEK_API_KEY = None
 
@@ -63,14 +69,20 @@ except ImportError:
     import logging
     logger = logging.getLogger(__name__)
 
+from utils.tracing import TracedProxy
+from services.llm_client import LLMRoute
+from services.generation_jobs import GenerationJobQueue, ORPHANED_ERROR
+from services.generation_records import GenerationRecordStore
+
 # 创建蓝图
 rag_generation_bp = Blueprint('rag_generation', __name__)
 
 # 初始化服务
 try:
-    if VectorService and KnowledgeManagementModel:
-        vector_service = VectorService()
-        db_model = KnowledgeManagementModel()
+    if get_vector_service and KnowledgeManagementModel:
+        # 与知识库管理共用同一实例，嵌入模型迁移切换集合后立即生效
+        vector_service = get_vector_service()
+        db_model = TracedProxy(KnowledgeManagementModel(), 'db')
     else:
         vector_service = None
         db_model = None
@@ -79,97 +91,159 @@ except Exception as e:
     vector_service = None
     db_model = None
 
-@rag_generation_bp.route('/generate-with-rag', methods=['POST'])
-def generate_with_rag():
-    """
-    RAG增强的公文生成
+# 重排序服务（可选）
+try:
+    rerank_service = RerankService() if RerankService else None
+except Exception as e:
+    print(f"重排序服务初始化失败: {e}")
+    rerank_service = None
+
+# RAG上下文组装（MMR去重）
+context_builder = ContextBuilder() if ContextBuilder else None
+
+# 生成记录查询（主键读取、游标分页）
+record_store = GenerationRecordStore(db_model) if db_model else None
+
+def load_generation_record(record_id):
+    """按ID读取生成记录，不存在时返回None"""
+    if not record_store:
+        return None
+    return record_store.get(record_id)
+
+def fail_generation_record(record_id, error_message):
+    """将心跳超时的生成记录标记为失败，返回标记的记录数"""
+    if not record_store:
+        return 0
+    return record_store.fail_stale(generation_jobs.config['orphan_timeout'], error_message, record_id)
+
+def touch_generation_records(record_ids):
+    """刷新排队和执行中的生成记录心跳"""
+    if record_store:
+        record_store.touch(record_ids)
+
+# 生成任务队列（异步模式）
+generation_jobs = GenerationJobQueue(load_generation_record, record_failer=fail_generation_record,
+                                     record_heartbeat=touch_generation_records)
+
+def _fail_orphaned_records():
+    """启动时将上次进程退出前未完成的生成记录标记为失败（只处理心跳超时的记录，其他worker排队和执行中的任务持续刷新心跳，不受影响）"""
+    try:
+        record_store.fail_stale(generation_jobs.config['orphan_timeout'], ORPHANED_ERROR)
+    except Exception as e:
+        logger.warning(f"清理中断的生成记录失败: {e}")
+
+if record_store:
+    threading.Thread(target=_fail_orphaned_records, daemon=True).start()
+
+def begin_generate_with_rag(state, data):
+    """校验参数并创建生成记录"""
+    # 检查服务是否可用
+    if not vector_service or not db_model:
+        return {
+            'success': False,
+            'error': 'RAG服务不可用，请检查系统配置'
+        }, 503
     
-    POST /api/rag/generate-with-rag
-    Content-Type: application/json
+    state['start_time'] = time.time()
     
-    Body:
-    {
-        "document_type": "报告",
-        "topic": "主题内容",
-        "title": "标题",
-        "reference_file_ids": ["file_id1", "file_id2"],
-        "user_id": "user123"
+    if not data:
+        return {
+            'success': False,
+            'error': '缺少请求数据'
+        }, 400
+    
+    document_type = data.get('document_type', '')
+    topic = data.get('topic', '')
+    title = data.get('title', '')
+    reference_file_ids = data.get('reference_file_ids', [])
+    user_id = data.get('user_id', 'anonymous')
+    
+    if not topic:
+        return {
+            'success': False,
+            'error': '主题内容不能为空'
+        }, 400
+    
+    # 创建生成记录
+    generation_record = {
+        'user_id': user_id,
+        'document_type': document_type,
+        'title': title,
+        'topic': topic,
+        'reference_files': reference_file_ids,
+        'generation_method': 'rag_enhanced',
+        'status': 'processing'
     }
     
-    Returns:
-        JSON响应
-    """
-    try:
-        # 检查服务是否可用
-        if not vector_service or not db_model:
-            return jsonify({
-                'success': False,
-                'error': 'RAG服务不可用，请检查系统配置'
-            }), 503
-        
-        start_time = time.time()
-        
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': '缺少请求数据'
-            }), 400
+    state['record_id'] = db_model.insert_generation_record(generation_record)
+    state['reference_file_ids'] = reference_file_ids
+    return None
+
+def prepare_generate_with_rag(state, data):
+    """检索知识库并构建大模型请求（未执行提交阶段时先校验参数并创建生成记录）"""
+    if 'record_id' not in state:
+        early = begin_generate_with_rag(state, data)
+        if early is not None:
+            return early
+    
+    document_type = data.get('document_type', '')
+    topic = data.get('topic', '')
+    reference_file_ids = state['reference_file_ids']
+    use_rerank = data.get('use_rerank', RERANK_CONFIG['enabled'])
+    if isinstance(use_rerank, str):
+        use_rerank = use_rerank.strip().lower() in ('true', '1', 'yes', 'on')
+    rerank_budget_ms = data.get('rerank_budget_ms')
+    
+    # 1. 从知识库检索相关内容
+    rag_context = ""
+    rerank_info = None
+    context_stats = None
+    if reference_file_ids:
+        logger.info(f"开始从知识库检索相关内容，文件IDs: {reference_file_ids}")
         
-        document_type = data.get('document_type', '')
-        topic = data.get('topic', '')
-        title = data.get('title', '')
-        reference_file_ids = data.get('reference_file_ids', [])
-        user_id = data.get('user_id', 'anonymous')
+        # 构建检索查询
+        search_query = f"{topic} {document_type}"
         
-        if not topic:
-            return jsonify({
-                'success': False,
-                'error': '主题内容不能为空'
-            }), 400
+        # 搜索向量数据库
+        similar_chunks = vector_service.search_similar_chunks(
+            search_query, 
+            top_k=10, 
+            file_ids=reference_file_ids,
+            include_embeddings=True
+        )
         
-        # 创建生成记录
-        generation_record = {
-            'user_id': user_id,
-            'document_type': document_type,
-            'title': title,
-            'topic': topic,
-            'reference_files': reference_file_ids,
-            'generation_method': 'rag_enhanced',
-            'status': 'processing'
-        }
-        
-        record_id = db_model.insert_generation_record(generation_record)
-        
-        try:
-            # 1. 从知识库检索相关内容
-            rag_context = ""
-            if reference_file_ids:
-                logger.info(f"开始从知识库检索相关内容，文件IDs: {reference_file_ids}")
-                
-                # 构建检索查询
-                search_query = f"{topic} {document_type}"
-                
-                # 搜索向量数据库
-                similar_chunks = vector_service.search_similar_chunks(
-                    search_query, 
-                    top_k=10, 
-                    file_ids=reference_file_ids
+        if similar_chunks:
+            # 去除重叠区间和近似重复的文档块，按MMR排序
+            diversified = context_builder.diversify(similar_chunks)
+            candidate_chunks = diversified['chunks']
+            selected_chunks = candidate_chunks[:context_builder.config['max_chunks']]
+            
+            # 可选的重排序阶段：保留更少但更相关的文档块
+            if use_rerank and rerank_service:
+                rerank_result = rerank_service.rerank(
+                    search_query,
+                    candidate_chunks,
+                    latency_budget_ms=rerank_budget_ms
                 )
-                
-                if similar_chunks:
-                    # 构建RAG上下文
-                    rag_context = "参考文档内容：\n\n"
-                    for i, chunk in enumerate(similar_chunks[:5]):  # 只使用前5个最相关的块
-                        rag_context += f"【参考{i+1}】\n{chunk['content']}\n\n"
-                    
-                    logger.info(f"检索到 {len(similar_chunks)} 个相关文档块")
-                else:
-                    logger.warning("未检索到相关文档内容")
+                selected_chunks = rerank_result['chunks']
+                rerank_info = {k: v for k, v in rerank_result.items() if k != 'chunks'}
+            
+            # 构建RAG上下文
+            rag_context, context_stats = context_builder.build_context(
+                selected_chunks,
+                baseline_chunks=similar_chunks[:context_builder.config['max_chunks']],
+                chunk_stats=diversified['chunk_stats']
+            )
+            logger.info(f"RAG上下文: {context_stats['chunk_count']} 个文档块, 约 {context_stats['context_tokens']} tokens, 节省约 {context_stats['saved_tokens']} tokens")
             
-            # 2. 构建AI提示
-            system_prompt = f"""你是一个专业的公文写作助手，请根据提供的主题和参考文档内容，生成一篇符合{document_type}格式规范的公文内容。
+            logger.info(f"检索到 {len(similar_chunks)} 个相关文档块")
+        else:
+            logger.warning("未检索到相关文档内容")
+    
+    state.update(rag_context=rag_context, rerank_info=rerank_info, context_stats=context_stats)
+    
+    # 2. 构建AI提示
+    system_prompt = f"""你是一个专业的公文写作助手，请根据提供的主题和参考文档内容，生成一篇符合{document_type}格式规范的公文内容。
 
 要求：
 1. 只生成纯正文内容，不要包含公文格式元素（如标题、主送机关、发文机关、发文日期等）
@@ -184,191 +258,186 @@ def generate_with_rag():
 
 请根据以下主题生成{document_type}内容："""
 
-            user_prompt = f"{topic}"
-            
-            # 3. 调用AI生成内容
-            logger.info("开始调用AI生成内容")
-            
-            response = requests.post(
-                DEEPSEEK_API_URL,
-                headers={
-                    "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "deepseek-chat",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": system_prompt
-                        },
-                        {
-                            "role": "user",
-                            "content": user_prompt
-                        }
-                    ],
-                    "max_tokens": 3000,
-                    "temperature": 0.7
+    user_prompt = f"{topic}"
+    
+    # 3. 调用AI生成内容
+    logger.info("开始调用AI生成内容")
+    
+    state['request'] = {
+        'url': DEEPSEEK_API_URL,
+        'headers': {
+            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        'json': {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": system_prompt
                 },
-                timeout=120
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                generated_content = result['choices'][0]['message']['content'].strip()
-                
-                generation_time = int(time.time() - start_time)
-                
-                # 4. 更新生成记录
-                db_model.update_generation_record(record_id, {
-                    'content': generated_content,
-                    'rag_context': rag_context,
-                    'status': 'completed',
-                    'generation_time': generation_time
-                })
-                
-                # 5. 更新知识库使用统计
-                for file_id in reference_file_ids:
-                    db_model.update_usage_stats(file_id)
-                
-                logger.info(f"RAG增强生成成功，记录ID: {record_id}, 耗时: {generation_time}秒")
-                
-                return jsonify({
-                    'success': True,
-                    'record_id': record_id,
-                    'content': generated_content,
-                    'rag_context': rag_context,
-                    'generation_time': generation_time,
-                    'message': 'RAG增强生成成功'
-                }), 200
-            else:
-                error_msg = f"AI生成失败: {response.status_code}"
-                logger.error(error_msg)
-                
-                # 更新失败记录
-                db_model.update_generation_record(record_id, {
-                    'status': 'failed',
-                    'error_message': error_msg
-                })
-                
-                return jsonify({
-                    'success': False,
-                    'error': error_msg
-                }), 500
-                
-        except Exception as e:
-            error_msg = f"RAG生成过程失败: {str(e)}"
-            logger.error(error_msg)
-            
-            # 更新失败记录
-            if record_id:
-                db_model.update_generation_record(record_id, {
-                    'status': 'failed',
-                    'error_message': error_msg
-                })
-            
-            return jsonify({
-                'success': False,
-                'error': error_msg
-            }), 500
-            
-    except Exception as e:
-        logger.error(f"RAG生成API错误: {e}")
-        return jsonify({
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ],
+            "max_tokens": 3000,
+            "temperature": 0.7
+        },
+        'timeout': 120
+    }
+    return None
+
+def finish_generate_with_rag(state, response):
+    """处理大模型响应并更新生成记录"""
+    record_id = state['record_id']
+    if response.status_code == 200:
+        result = response.json()
+        generated_content = result['choices'][0]['message']['content'].strip()
+        
+        generation_time = int(time.time() - state['start_time'])
+        
+        # 4. 更新生成记录
+        db_model.update_generation_record(record_id, {
+            'content': generated_content,
+            'rag_context': state['rag_context'],
+            'status': 'completed',
+            'generation_time': generation_time
+        })
+        
+        # 5. 更新知识库使用统计
+        for file_id in state['reference_file_ids']:
+            db_model.update_usage_stats(file_id)
+        
+        logger.info(f"RAG增强生成成功，记录ID: {record_id}, 耗时: {generation_time}秒")
+        
+        return {
+            'success': True,
+            'record_id': record_id,
+            'content': generated_content,
+            'rag_context': state['rag_context'],
+            'rerank': state['rerank_info'],
+            'context_stats': state['context_stats'],
+            'generation_time': generation_time,
+            'message': 'RAG增强生成成功'
+        }, 200
+    
+    error_msg = f"AI生成失败: {response.status_code}"
+    logger.error(error_msg)
+    
+    # 更新失败记录
+    db_model.update_generation_record(record_id, {
+        'status': 'failed',
+        'error_message': error_msg
+    })
+    
+    return {
+        'success': False,
+        'error': error_msg
+    }, 500
+
+def generate_with_rag_error(state, error):
+    """RAG生成异常处理（已创建生成记录时标记为失败）"""
+    if 'record_id' not in state:
+        logger.error(f"RAG生成API错误: {error}")
+        return {
             'success': False,
-            'error': f'RAG生成API错误: {str(e)}'
-        }), 500
+            'error': f'RAG生成API错误: {str(error)}'
+        }, 500
+    
+    error_msg = f"RAG生成过程失败: {str(error)}"
+    logger.error(error_msg)
+    
+    # 更新失败记录
+    if state['record_id']:
+        db_model.update_generation_record(state['record_id'], {
+            'status': 'failed',
+            'error_message': error_msg
+        })
+    
+    return {
+        'success': False,
+        'error': error_msg
+    }, 500
 
-@rag_generation_bp.route('/generate-outline', methods=['POST'])
-def generate_outline():
-    """
-    RAG增强的大纲生成
+def begin_generate_outline(state, data):
+    """校验参数并创建大纲生成记录"""
+    state['start_time'] = time.time()
     
-    POST /api/rag/generate-outline
-    Content-Type: application/json
+    if not data:
+        return {
+            'success': False,
+            'error': '缺少请求数据'
+        }, 400
     
-    Body:
-    {
-        "document_type": "报告",
-        "topic": "主题内容",
-        "title": "标题",
-        "reference_file_ids": ["file_id1", "file_id2"],
-        "user_id": "user123",
-        "generation_type": "outline"
+    document_type = data.get('document_type', '')
+    topic = data.get('topic', '')
+    title = data.get('title', '')
+    reference_file_ids = data.get('reference_file_ids', [])
+    user_id = data.get('user_id', 'anonymous')
+    
+    if not topic:
+        return {
+            'success': False,
+            'error': '主题内容不能为空'
+        }, 400
+    
+    # 创建生成记录
+    generation_record = {
+        'user_id': user_id,
+        'document_type': document_type,
+        'title': title,
+        'topic': topic,
+        'reference_files': reference_file_ids,
+        'generation_method': 'rag_outline',
+        'status': 'processing'
     }
     
-    Returns:
-        JSON响应
-    """
-    try:
-        start_time = time.time()
-        
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': '缺少请求数据'
-            }), 400
+    state['record_id'] = db_model.insert_generation_record(generation_record)
+    return None
+
+def prepare_generate_outline(state, data):
+    """检索知识库并构建大纲生成请求（未执行提交阶段时先校验参数并创建生成记录）"""
+    if 'record_id' not in state:
+        early = begin_generate_outline(state, data)
+        if early is not None:
+            return early
+    
+    document_type = data.get('document_type', '')
+    topic = data.get('topic', '')
+    reference_file_ids = data.get('reference_file_ids', [])
+    
+    # 1. 从知识库检索相关内容
+    rag_context = ""
+    if reference_file_ids:
+        logger.info(f"开始从知识库检索相关内容，文件IDs: {reference_file_ids}")
         
-        document_type = data.get('document_type', '')
-        topic = data.get('topic', '')
-        title = data.get('title', '')
-        reference_file_ids = data.get('reference_file_ids', [])
-        user_id = data.get('user_id', 'anonymous')
-        generation_type = data.get('generation_type', 'outline')
+        # 构建检索查询
+        search_query = f"{topic} {document_type} 大纲"
         
-        if not topic:
-            return jsonify({
-                'success': False,
-                'error': '主题内容不能为空'
-            }), 400
+        # 搜索向量数据库
+        similar_chunks = vector_service.search_similar_chunks(
+            search_query, 
+            top_k=10, 
+            file_ids=reference_file_ids
+        )
         
-        # 创建生成记录
-        generation_record = {
-            'user_id': user_id,
-            'document_type': document_type,
-            'title': title,
-            'topic': topic,
-            'reference_files': reference_file_ids,
-            'generation_method': 'rag_outline',
-            'status': 'processing'
-        }
-        
-        record_id = db_model.insert_generation_record(generation_record)
-        
-        try:
-            # 1. 从知识库检索相关内容
-            rag_context = ""
-            if reference_file_ids:
-                logger.info(f"开始从知识库检索相关内容，文件IDs: {reference_file_ids}")
-                
-                # 构建检索查询
-                search_query = f"{topic} {document_type} 大纲"
-                
-                # 搜索向量数据库
-                similar_chunks = vector_service.search_similar_chunks(
-                    search_query, 
-                    top_k=10, 
-                    file_ids=reference_file_ids
-                )
-                
-                if similar_chunks:
-                    # 构建RAG上下文
-                    context_parts = []
-                    for chunk in similar_chunks:
-                        context_parts.append(f"相关内容：{chunk['content']}")
-                    
-                    rag_context = "\n\n".join(context_parts)
-                    logger.info(f"检索到 {len(similar_chunks)} 个相关内容片段")
-                else:
-                    logger.info("未检索到相关内容")
-            else:
-                logger.info("未提供参考文件，跳过知识库检索")
+        if similar_chunks:
+            # 构建RAG上下文
+            context_parts = []
+            for chunk in similar_chunks:
+                context_parts.append(f"相关内容：{chunk['content']}")
             
-            # 2. 构建AI提示词（专门用于大纲生成）
-            if rag_context:
-                prompt = f"""你是一个专业的公文写作助手，请根据以下信息生成一个详细的公文大纲：
+            rag_context = "\n\n".join(context_parts)
+            logger.info(f"检索到 {len(similar_chunks)} 个相关内容片段")
+        else:
+            logger.info("未检索到相关内容")
+    else:
+        logger.info("未提供参考文件，跳过知识库检索")
+    
+    # 2. 构建AI提示词（专门用于大纲生成）
+    if rag_context:
+        prompt = f"""你是一个专业的公文写作助手，请根据以下信息生成一个详细的公文大纲：
 
 主题：{topic}
 公文类型：{document_type}
@@ -385,8 +454,8 @@ def generate_outline():
 6. 不要包含```markdown```标记，直接输出内容
 
 请直接输出大纲内容，不要包含其他说明文字。"""
-            else:
-                prompt = f"""你是一个专业的公文写作助手，请根据以下信息生成一个详细的公文大纲：
+    else:
+        prompt = f"""你是一个专业的公文写作助手，请根据以下信息生成一个详细的公文大纲：
 
 主题：{topic}
 公文类型：{document_type}
@@ -400,98 +469,265 @@ def generate_outline():
 6. 不要包含```markdown```标记，直接输出内容
 
 请直接输出大纲内容，不要包含其他说明文字。"""
-            
-            # 3. 调用AI API生成大纲
-            logger.info("开始调用AI API生成大纲")
-            
-            headers = {
-                'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'model': 'deepseek-chat',
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'temperature': 0.7,
-                'max_tokens': 2000
-            }
-            
-            response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=60)
-            
-            if response.status_code == 200:
-                result = response.json()
-                generated_content = result['choices'][0]['message']['content'].strip()
-                
-                # 4. 更新生成记录
-                if record_id:
-                    db_model.update_generation_record(record_id, {
-                        'status': 'completed',
-                        'generated_content': generated_content,
-                        'completion_time': datetime.now().isoformat()
-                    })
-                
-                end_time = time.time()
-                generation_time = end_time - start_time
-                
-                logger.info(f"大纲生成成功，耗时: {generation_time:.2f}秒")
-                
-                return jsonify({
-                    'success': True,
-                    'content': generated_content,
-                    'doc_id': f"doc_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                    'generation_time': generation_time,
-                    'record_id': record_id
-                }), 200
-            else:
-                error_msg = f"AI API调用失败: {response.status_code} - {response.text}"
-                logger.error(error_msg)
-                
-                # 更新失败记录
-                if record_id:
-                    db_model.update_generation_record(record_id, {
-                        'status': 'failed',
-                        'error_message': error_msg
-                    })
-                
-                return jsonify({
-                    'success': False,
-                    'error': error_msg
-                }), 500
-                
-        except Exception as e:
-            error_msg = f"大纲生成过程中发生错误: {str(e)}"
-            logger.error(error_msg)
-            
-            # 更新失败记录
-            if record_id:
-                db_model.update_generation_record(record_id, {
-                    'status': 'failed',
-                    'error_message': error_msg
-                })
-            
+    
+    # 3. 调用AI API生成大纲
+    logger.info("开始调用AI API生成大纲")
+    
+    state['request'] = {
+        'url': DEEPSEEK_API_URL,
+        'headers': {
+            'Authorization': f'Bearer {DEEPSEEK_API_KEY}',
+            'Content-Type': 'application/json'
+        },
+        'json': {
+            'model': 'deepseek-chat',
+            'messages': [
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            'temperature': 0.7,
+            'max_tokens': 2000
+        },
+        'timeout': 60
+    }
+    return None
+
+def finish_generate_outline(state, response):
+    """处理大纲生成响应并更新生成记录"""
+    record_id = state['record_id']
+    if response.status_code == 200:
+        result = response.json()
+        generated_content = result['choices'][0]['message']['content'].strip()
+        
+        # 4. 更新生成记录
+        if record_id:
+            db_model.update_generation_record(record_id, {
+                'status': 'completed',
+                'generated_content': generated_content,
+                'completion_time': datetime.now().isoformat()
+            })
+        
+        generation_time = time.time() - state['start_time']
+        
+        logger.info(f"大纲生成成功，耗时: {generation_time:.2f}秒")
+        
+        return {
+            'success': True,
+            'content': generated_content,
+            'doc_id': f"doc_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            'generation_time': generation_time,
+            'record_id': record_id
+        }, 200
+    
+    error_msg = f"AI API调用失败: {response.status_code} - {response.text}"
+    logger.error(error_msg)
+    
+    # 更新失败记录
+    if record_id:
+        db_model.update_generation_record(record_id, {
+            'status': 'failed',
+            'error_message': error_msg
+        })
+    
+    return {
+        'success': False,
+        'error': error_msg
+    }, 500
+
+def generate_outline_error(state, error):
+    """大纲生成异常处理（已创建生成记录时标记为失败）"""
+    if 'record_id' not in state:
+        logger.error(f"大纲生成API错误: {error}")
+        return {
+            'success': False,
+            'error': f'大纲生成API错误: {str(error)}'
+        }, 500
+    
+    error_msg = f"大纲生成过程中发生错误: {str(error)}"
+    logger.error(error_msg)
+    
+    # 更新失败记录
+    if state['record_id']:
+        db_model.update_generation_record(state['record_id'], {
+            'status': 'failed',
+            'error_message': error_msg
+        })
+    
+    return {
+        'success': False,
+        'error': error_msg
+    }, 500
+
+# 同步（Flask）和异步（ASGI）共用的处理流程（包含数据库和向量检索，异步调用时在线程池中执行）
+generate_with_rag_route = LLMRoute('generate_with_rag', prepare_generate_with_rag, finish_generate_with_rag,
+                                   generate_with_rag_error, blocking=True, begin=begin_generate_with_rag)
+generate_outline_route = LLMRoute('generate_outline', prepare_generate_outline, finish_generate_outline,
+                                  generate_outline_error, blocking=True, begin=begin_generate_outline)
+
+@rag_generation_bp.route('/generate-with-rag', methods=['POST'])
+def generate_with_rag():
+    """
+    RAG增强的公文生成
+    
+    POST /api/rag/generate-with-rag
+    Content-Type: application/json
+    
+    Body:
+    {
+        "document_type": "报告",
+        "topic": "主题内容",
+        "title": "标题",
+        "reference_file_ids": ["file_id1", "file_id2"],
+        "user_id": "user123",
+        "use_rerank": true,
+        "rerank_budget_ms": 300
+    }
+    
+    Returns:
+        JSON响应
+    """
+    body, status = generate_with_rag_route.run(request.get_json(silent=True))
+    return jsonify(body), status
+
+@rag_generation_bp.route('/generate-outline', methods=['POST'])
+def generate_outline():
+    """
+    RAG增强的大纲生成
+    
+    POST /api/rag/generate-outline
+    Content-Type: application/json
+    
+    Body:
+    {
+        "document_type": "报告",
+        "topic": "主题内容",
+        "title": "标题",
+        "reference_file_ids": ["file_id1", "file_id2"],
+        "user_id": "user123",
+        "generation_type": "outline"
+    }
+    
+    Returns:
+        JSON响应
+    """
+    body, status = generate_outline_route.run(request.get_json(silent=True))
+    return jsonify(body), status
+
+# 支持异步任务模式的生成接口
+JOB_ROUTES = {
+    'generate_with_rag': generate_with_rag_route,
+    'generate_outline': generate_outline_route
+}
+
+@rag_generation_bp.route('/jobs', methods=['POST'])
+def submit_generation_job():
+    """
+    提交生成任务（异步模式），立即返回任务ID（即生成记录ID），完成后结果写入生成记录
+    
+    POST /api/rag/jobs
+    Content-Type: application/json
+    
+    Body:
+    {
+        "type": "generate_with_rag",  // 或 generate_outline
+        "document_type": "报告",
+        "topic": "主题内容",
+        "reference_file_ids": ["file_id1", "file_id2"],
+        ...  // 其余参数与对应的同步接口相同
+    }
+    
+    Returns:
+        JSON响应（202，包含job_id；通过 GET /api/rag/jobs/<job_id> 轮询或 GET /api/rag/jobs/<job_id>/events 订阅结果）
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        job_type = data.get('type', 'generate_with_rag')
+        
+        route = JOB_ROUTES.get(job_type)
+        if not route:
             return jsonify({
                 'success': False,
-                'error': error_msg
-            }), 500
-            
+                'error': f'不支持的任务类型: {job_type}'
+            }), 400
+        
+        body, status = generation_jobs.submit(route, data)
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"提交生成任务失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'提交生成任务失败: {str(e)}'
+        }), 500
+
+@rag_generation_bp.route('/jobs', methods=['GET'])
+def get_generation_job_stats():
+    """
+    获取生成任务队列统计
+    
+    GET /api/rag/jobs
+    
+    Returns:
+        JSON响应
+    """
+    return jsonify({
+        'success': True,
+        'stats': generation_jobs.get_stats()
+    }), 200
+
+@rag_generation_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    """
+    查询生成任务状态（completed/failed时包含result）
+    
+    GET /api/rag/jobs/<job_id>
+    
+    Returns:
+        JSON响应
+    """
+    try:
+        job = generation_jobs.get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': '任务不存在'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job': job
+        }), 200
+        
     except Exception as e:
-        logger.error(f"大纲生成API错误: {e}")
+        logger.error(f"查询生成任务失败: {e}")
         return jsonify({
             'success': False,
-            'error': f'大纲生成API错误: {str(e)}'
+            'error': f'查询生成任务失败: {str(e)}'
         }), 500
 
+@rag_generation_bp.route('/jobs/<int:job_id>/events', methods=['GET'])
+def stream_generation_job(job_id):
+    """
+    订阅生成任务状态（Server-Sent Events），任务结束后推送结果并关闭
+    
+    GET /api/rag/jobs/<job_id>/events
+    
+    Returns:
+        text/event-stream（event: status，data为任务状态JSON）
+    """
+    return Response(generation_jobs.events(job_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @rag_generation_bp.route('/records', methods=['GET'])
 def get_generation_records():
     """
-    获取公文生成记录
+    获取公文生成记录（按ID倒序游标分页，不含生成内容和RAG上下文，详情通过 /records/<record_id> 获取）
     
-    GET /api/rag/records?user_id=user123&limit=50
+    GET /api/rag/records?user_id=user123&limit=50&cursor=<上一页的next_cursor>
     
     Returns:
         JSON响应
@@ -499,13 +735,15 @@ def get_generation_records():
     try:
         user_id = request.args.get('user_id')
         limit = int(request.args.get('limit', 50))
+        cursor = request.args.get('cursor', type=int)
         
-        records = db_model.get_generation_records(user_id, limit)
+        records, next_cursor = record_store.list(user_id, cursor, limit)
         
         return jsonify({
             'success': True,
             'records': records,
-            'total': len(records)
+            'total': len(records),
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -526,13 +764,7 @@ def get_generation_record_detail(record_id):
         JSON响应
     """
     try:
-        records = db_model.get_generation_records()
-        record = None
-        
-        for r in records:
-            if r['id'] == record_id:
-                record = r
-                break
+        record = load_generation_record(record_id)
         
         if not record:
             return jsonify({
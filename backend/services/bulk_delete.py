@@ -0,0 +1,242 @@
+"""
+知识库文件批量删除
+MinIO批量删除对象、ChromaDB按file_id集合一次删除向量、数据库单事务删除记录；
+执行前写入日志文件，中断后可从未完成的阶段继续，每个阶段重复执行结果相同；
+日志的读取和执行由文件锁保护，多worker部署时同一时刻只有一个进程执行删除
+"""
+import os
+import json
+import uuid
+import time
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+
+from config_rag import BULK_DELETE_CONFIG
+from utils.file_lock import file_lock
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('bulk_delete')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+STAGES = ['objects', 'vectors', 'database']
+
+class BulkDeleter:
+    """知识库文件批量删除器"""
+
+    def __init__(self, minio_service, vector_service, db_model, stats_aggregator=None,
+                 config: Optional[Dict[str, Any]] = None):
+        """
+        初始化批量删除器
+
+        Args:
+            minio_service: MinioService实例
+            vector_service: VectorService实例
+            db_model: 知识库数据库模型（提供_get_connection）
+            stats_aggregator: 统计聚合器
+            config: 批量删除配置，默认使用BULK_DELETE_CONFIG
+        """
+        self.minio_service = minio_service
+        self.vector_service = vector_service
+        self.db_model = db_model
+        self.stats_aggregator = stats_aggregator
+        self.config = dict(BULK_DELETE_CONFIG)
+        if config:
+            self.config.update(config)
+
+        self.journal_file = os.path.join(vector_service.persist_directory, self.config['journal_file'])
+        self.lock_file = f"{self.journal_file}.lock"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self):
+        """进程内线程锁 + 进程间文件锁"""
+        with self._lock, file_lock(self.lock_file):
+            yield
+
+    def _load_journal(self) -> Optional[Dict[str, Any]]:
+        """读取未完成的删除日志"""
+        if not os.path.exists(self.journal_file):
+            return None
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"读取批量删除日志失败: {e}")
+            return None
+
+    def _save_journal(self, journal: Dict[str, Any]):
+        """原子写入删除日志"""
+        journal['updated_at'] = datetime.now().isoformat()
+        tmp_file = f"{self.journal_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(journal, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.journal_file)
+
+    def _batches(self, items: List[Any]):
+        """按批量大小切分"""
+        batch_size = self.config['batch_size']
+        for i in range(0, len(items), batch_size):
+            yield items[i:i + batch_size]
+
+    def _lookup_files(self, file_ids: List[int]) -> Dict[int, str]:
+        """批量查询文件在MinIO中的路径（已不存在的ID不返回）"""
+        found = {}
+        conn = self.db_model._get_connection()
+        try:
+            cursor = conn.cursor()
+            for batch in self._batches(file_ids):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"SELECT id, file_path FROM knowledge_files WHERE id IN ({placeholders})", batch)
+                for file_id, file_path in cursor.fetchall():
+                    found[int(file_id)] = file_path
+            cursor.close()
+        finally:
+            conn.close()
+        return found
+
+    def _delete_objects(self, journal: Dict[str, Any]):
+        """阶段1：批量删除MinIO对象"""
+        failed = self.minio_service.remove_files(journal['object_names'])
+        if failed:
+            raise RuntimeError(f"{len(failed)}个对象删除失败，例如: {failed[0]}")
+
+    def _delete_vectors(self, journal: Dict[str, Any]):
+        """阶段2：按file_id集合删除向量"""
+        counts = self.vector_service.stats_store.get_file_counts(self.vector_service.collection_name)
+        journal['vector_count'] = sum(counts.get(str(file_id), 0) for file_id in journal['file_ids'])
+        if not self.vector_service.delete_files_chunks([str(file_id) for file_id in journal['file_ids']]):
+            raise RuntimeError('删除向量失败')
+
+    def _delete_rows(self, journal: Dict[str, Any]):
+        """阶段3：单个事务内删除文档块和文件记录"""
+        conn = self.db_model._get_connection()
+        try:
+            cursor = conn.cursor()
+            deleted = 0
+            for batch in self._batches(journal['file_ids']):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"DELETE FROM document_chunks WHERE file_id IN ({placeholders})", batch)
+                cursor.execute(f"DELETE FROM knowledge_files WHERE id IN ({placeholders})", batch)
+                deleted += cursor.rowcount
+            conn.commit()
+            cursor.close()
+            journal['deleted_rows'] = deleted
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _run(self, journal: Dict[str, Any]) -> Dict[str, Any]:
+        """从日志记录的阶段继续执行"""
+        handlers = {
+            'objects': self._delete_objects,
+            'vectors': self._delete_vectors,
+            'database': self._delete_rows
+        }
+        started = time.time()
+        for stage in STAGES:
+            if stage in journal['completed_stages']:
+                continue
+            handlers[stage](journal)
+            journal['completed_stages'].append(stage)
+            self._save_journal(journal)
+
+        if self.stats_aggregator:
+            self.stats_aggregator.on_files_deleted(journal.get('deleted_rows', 0), journal.get('vector_count', 0))
+        os.remove(self.journal_file)
+
+        elapsed = round(time.time() - started, 3)
+        logger.info(f"批量删除完成: {journal['job_id']}, 文件 {len(journal['file_ids'])} 个, "
+                    f"向量 {journal.get('vector_count', 0)} 个, 耗时 {elapsed}秒")
+        return {
+            'job_id': journal['job_id'],
+            'deleted': journal['file_ids'],
+            'deleted_count': len(journal['file_ids']),
+            'vector_count': journal.get('vector_count', 0),
+            'elapsed_seconds': elapsed
+        }
+
+    def resume(self) -> Optional[Dict[str, Any]]:
+        """
+        继续上次中断的删除
+
+        Returns:
+            删除结果，没有未完成的删除时返回None
+        """
+        with self._exclusive():
+            return self._resume_locked()
+
+    def _resume_locked(self) -> Optional[Dict[str, Any]]:
+        """继续上次中断的删除（调用方持有锁）"""
+        journal = self._load_journal()
+        if not journal:
+            return None
+        logger.info(f"继续未完成的批量删除: {journal['job_id']}, 已完成阶段: {journal['completed_stages']}")
+        return self._run(journal)
+
+    def delete(self, file_ids: List[int]) -> Dict[str, Any]:
+        """
+        批量删除知识库文件（幂等：已不存在的文件ID计入missing，不视为错误）
+
+        Args:
+            file_ids: 文件ID列表
+
+        Returns:
+            {'success', 'deleted', 'missing', 'resumed', ...}
+        """
+        try:
+            with self._exclusive():
+                # 先完成上次中断的删除（可能由其他进程中断）
+                resumed = self._resume_locked()
+
+                requested = sorted({int(file_id) for file_id in file_ids})
+                found = self._lookup_files(requested)
+                missing = [file_id for file_id in requested if file_id not in found]
+
+                result = {'deleted': [], 'deleted_count': 0, 'vector_count': 0}
+                if found:
+                    journal = {
+                        'job_id': uuid.uuid4().hex[:8],
+                        'file_ids': sorted(found),
+                        'object_names': [found[file_id] for file_id in sorted(found)],
+                        'completed_stages': [],
+                        'created_at': datetime.now().isoformat()
+                    }
+                    self._save_journal(journal)
+                    result = self._run(journal)
+
+            result.update({
+                'success': True,
+                'missing': missing,
+                'resumed': resumed['job_id'] if resumed else None
+            })
+            return result
+
+        except Exception as e:
+            logger.error(f"批量删除失败（可重试继续）: {e}")
+            return {
+                'success': False,
+                'error': f"批量删除失败: {str(e)}",
+                'pending': self.get_status()
+            }
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取未完成的删除日志"""
+        journal = self._load_journal()
+        if not journal:
+            return {'status': 'idle'}
+        return {
+            'status': 'pending',
+            'job_id': journal['job_id'],
+            'file_count': len(journal['file_ids']),
+            'completed_stages': journal['completed_stages'],
+            'created_at': journal.get('created_at'),
+            'updated_at': journal.get('updated_at')
+        }
@@ -0,0 +1,189 @@
+"""
+RAG上下文组装服务
+对检索结果进行MMR多样化与去重，减少重复内容占用的提示词token
+"""
+import re
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from config_rag import CONTEXT_CONFIG
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('context_builder')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# 中日韩字符（约1个token/字），其他字符按约4个字符/token估算
+_CJK_PATTERN = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数量"""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+class ContextBuilder:
+    """RAG上下文组装器"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化上下文组装器
+
+        Args:
+            config: 上下文配置，默认使用CONTEXT_CONFIG
+        """
+        self.config = dict(CONTEXT_CONFIG)
+        if config:
+            self.config.update(config)
+
+    @staticmethod
+    def _overlap_ratio(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+        """计算同一文件中两个文档块字符区间的重叠比例"""
+        meta_a = a.get('metadata') or {}
+        meta_b = b.get('metadata') or {}
+        if not meta_a.get('file_id') or meta_a.get('file_id') != meta_b.get('file_id'):
+            return 0.0
+
+        start_a, end_a = meta_a.get('start', 0), meta_a.get('end', 0)
+        start_b, end_b = meta_b.get('start', 0), meta_b.get('end', 0)
+        overlap = min(end_a, end_b) - max(start_a, start_b)
+        shorter = min(end_a - start_a, end_b - start_b)
+        if overlap <= 0 or shorter <= 0:
+            return 0.0
+        return overlap / shorter
+
+    def diversify(self, chunks: List[Dict[str, Any]], max_chunks: Optional[int] = None) -> Dict[str, Any]:
+        """
+        对检索结果进行去重和MMR多样化排序
+
+        Args:
+            chunks: search_similar_chunks返回的文档块（按向量距离排序，可包含embedding）
+            max_chunks: 最多保留的文档块数量，默认保留全部非重复块
+
+        Returns:
+            {'chunks': 保留的文档块（MMR顺序）, 'chunk_stats': 每个候选块的统计}
+        """
+        if not chunks:
+            return {'chunks': [], 'chunk_stats': []}
+
+        max_chunks = max_chunks or len(chunks)
+        lambda_mult = self.config['mmr_lambda']
+        duplicate_threshold = self.config['duplicate_threshold']
+        overlap_threshold = self.config['overlap_threshold']
+        n = len(chunks)
+
+        # 相关性：距离越小越相关，归一化到[0, 1]
+        distances = np.array([chunk.get('distance', 0) or 0 for chunk in chunks], dtype=np.float32)
+        spread = float(distances.max() - distances.min())
+        relevance = 1.0 - (distances - distances.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+
+        # 文档块两两余弦相似度
+        similarity = None
+        if all(chunk.get('embedding') is not None for chunk in chunks):
+            embeddings = np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+            similarity = embeddings @ embeddings.T
+
+        stats = [{
+            'id': chunk.get('id', ''),
+            'file_id': (chunk.get('metadata') or {}).get('file_id', ''),
+            'chunk_index': (chunk.get('metadata') or {}).get('chunk_index', 0),
+            'chars': len(chunk.get('content', '')),
+            'tokens': estimate_tokens(chunk.get('content', '')),
+            'status': 'candidate',
+            'reason': None,
+            'max_similarity': 0.0
+        } for chunk in chunks]
+
+        selected: List[int] = []
+        remaining = np.ones(n, dtype=bool)
+        max_sim = np.zeros(n, dtype=np.float32)
+
+        while remaining.any() and len(selected) < max_chunks:
+            # MMR得分：相关性与已选块最大相似度的加权差
+            mmr = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+            mmr[~remaining] = -np.inf
+            best = int(np.argmax(mmr))
+            remaining[best] = False
+
+            duplicate_of = None
+            reason = None
+            if similarity is not None and selected and max_sim[best] >= duplicate_threshold:
+                duplicate_of = selected[int(np.argmax(similarity[best, selected]))]
+                reason = 'near_duplicate'
+            else:
+                for j in selected:
+                    if self._overlap_ratio(chunks[best], chunks[j]) >= overlap_threshold:
+                        duplicate_of = j
+                        reason = 'overlapping_span'
+                        break
+
+            stats[best]['max_similarity'] = round(float(max_sim[best]), 4)
+            if duplicate_of is not None:
+                stats[best]['status'] = 'dropped'
+                stats[best]['reason'] = reason
+                stats[best]['duplicate_of'] = stats[duplicate_of]['id']
+                continue
+
+            selected.append(best)
+            stats[best]['status'] = 'kept'
+            if similarity is not None:
+                max_sim = np.maximum(max_sim, similarity[best])
+
+        for stat in stats:
+            if stat['status'] == 'candidate':
+                stat['status'] = 'dropped'
+                stat['reason'] = 'over_limit'
+
+        kept_chunks = []
+        for i in selected:
+            chunk = {k: v for k, v in chunks[i].items() if k != 'embedding'}
+            kept_chunks.append(chunk)
+
+        dropped = n - len(selected)
+        if dropped:
+            logger.info(f"上下文去重: {n} -> {len(selected)} 个文档块")
+        return {'chunks': kept_chunks, 'chunk_stats': stats}
+
+    def build_context(self, chunks: List[Dict[str, Any]], baseline_chunks: Optional[List[Dict[str, Any]]] = None,
+                      chunk_stats: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        组装RAG上下文字符串
+
+        Args:
+            chunks: 最终使用的文档块
+            baseline_chunks: 未去重时会使用的文档块，用于计算节省的token
+            chunk_stats: diversify返回的每块统计
+
+        Returns:
+            (上下文字符串, 统计信息)
+        """
+        if not chunks:
+            return "", {'chunk_count': 0, 'context_tokens': 0, 'baseline_tokens': 0, 'saved_tokens': 0}
+
+        context = "参考文档内容：\n\n"
+        for i, chunk in enumerate(chunks):
+            context += f"【参考{i+1}】\n{chunk['content']}\n\n"
+
+        used_ids = {chunk.get('id') for chunk in chunks}
+        if chunk_stats:
+            for stat in chunk_stats:
+                stat['used'] = stat['id'] in used_ids
+
+        context_tokens = sum(estimate_tokens(chunk['content']) for chunk in chunks)
+        baseline_tokens = sum(estimate_tokens(chunk['content']) for chunk in (baseline_chunks or chunks))
+        stats = {
+            'chunk_count': len(chunks),
+            'context_chars': len(context),
+            'context_tokens': context_tokens,
+            'baseline_tokens': baseline_tokens,
+            'saved_tokens': max(0, baseline_tokens - context_tokens),
+            'chunks': chunk_stats or []
+        }
+        return context, stats
@@ -1,6 +1,5 @@
 import os
 import markdown
-import docx2txt
 from docx import Document
 from docx.shared import Inches, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -9,6 +8,9 @@ from datetime import datetime
 import uuid
 from typing import Dict, Any
 
+from services.parser_registry import parser_registry
+from utils.profiling import profiled
+
 class DocumentProcessor:
     """文档处理服务"""
     
@@ -18,19 +20,15 @@ class DocumentProcessor:
     
     def parse_uploaded_file(self, file_path: str) -> str:
         """解析上传的文件内容"""
-        file_ext = os.path.splitext(file_path)[1].lower()
+        with open(file_path, 'rb') as f:
+            file_data = f.read()
         
-        if file_ext == '.md':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        elif file_ext in ['.docx', '.doc']:
-            return docx2txt.process(file_path)
-        elif file_ext == '.txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        else:
-            raise ValueError(f"不支持的文件格式: {file_ext}")
+        file_name = os.path.basename(file_path)
+        if not parser_registry.supports(file_name):
+            raise ValueError(f"不支持的文件格式: {os.path.splitext(file_path)[1].lower()}")
+        return parser_registry.parse(file_data, file_name)['content']
     
+    @profiled()
     def generate_document(self, content: str, template_type: str, metadata: Dict[str, Any]) -> str:
         """生成公文文档"""
         try:
@@ -0,0 +1,272 @@
+"""
+文本编码检测服务
+对有界前缀做一次增量打分得到候选编码排序，解码时严格验证并依次回退，结果按内容哈希缓存，供文本、Markdown和CSV解析共用
+"""
+import os
+import codecs
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('encoding_detector')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+Data = Union[bytes, bytearray, memoryview]
+
+# BOM与对应编码（长的BOM优先匹配）
+_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# 候选编码：gb18030兼容gbk和gb2312；无BOM的UTF-16中文文本不含零字节，同样参与打分
+_CANDIDATES = ['utf-8', 'gb18030', 'utf-16-le', 'utf-16-be']
+
+class EncodingDetector:
+    """基于前缀采样的编码检测器"""
+
+    def __init__(self, sample_size: int = 64 * 1024, block_size: int = 4096, cache_size: int = 1024):
+        """
+        初始化编码检测器
+
+        Args:
+            sample_size: 采样前缀的最大字节数
+            block_size: 增量解码的块大小
+            cache_size: 缓存的内容哈希数量
+        """
+        self.sample_size = sample_size
+        self.block_size = block_size
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _score(text: str) -> float:
+        """对解码结果打分：中文和可打印字符越多得分越高，控制字符、私有区字符和替换字符扣分"""
+        if not text:
+            return 0.0
+        score = 0.0
+        for ch in text:
+            code = ord(ch)
+            if 0x4E00 <= code <= 0x9FFF or 0x3000 <= code <= 0x303F or 0xFF00 <= code <= 0xFFEF:
+                score += 2.0
+            elif 0xE000 <= code <= 0xF8FF or code == 0xFFFD or (code < 0x20 and ch not in '\r\n\t'):
+                score -= 5.0
+            elif ch.isprintable() or ch in '\r\n\t':
+                score += 1.0
+        return score / len(text)
+
+    def _rank(self, sample: bytes) -> List[str]:
+        """
+        对前缀样本检测，返回按可能性排序的候选编码
+
+        BOM和纯ASCII直接确定首选；其余候选逐块严格解码，出错的淘汰，
+        能解码的按_score排序（UTF-8能解码非ASCII内容时误判概率极低，排在最前）
+        """
+        for bom, encoding in _BOMS:
+            if sample.startswith(bom):
+                return [encoding]
+
+        # 纯ASCII前缀（不含零字节，否则可能是英文UTF-16）：之后的内容仍可能是GBK，保留gb18030作为备选
+        if b'\x00' not in sample and all(b < 0x80 for b in sample):
+            return ['utf-8', 'gb18030']
+
+        # 无BOM的英文UTF-16：大量交替出现的零字节
+        if len(sample) >= 4:
+            even_zeros = sample[0::2].count(0)
+            odd_zeros = sample[1::2].count(0)
+            half = len(sample) / 2
+            if odd_zeros > half * 0.3 and even_zeros < half * 0.05:
+                return ['utf-16-le', 'utf-16-be']
+            if even_zeros > half * 0.3 and odd_zeros < half * 0.05:
+                return ['utf-16-be', 'utf-16-le']
+
+        # 逐块增量解码，出错的候选立即淘汰
+        decoders = {encoding: codecs.getincrementaldecoder(encoding)() for encoding in _CANDIDATES}
+        decoded = {encoding: [] for encoding in _CANDIDATES}
+        for offset in range(0, len(sample), self.block_size):
+            block = sample[offset:offset + self.block_size]
+            for encoding in list(decoders):
+                try:
+                    decoded[encoding].append(decoders[encoding].decode(block, final=False))
+                except UnicodeDecodeError:
+                    del decoders[encoding]
+            if not decoders:
+                break
+
+        if not decoders:
+            return ['latin-1']
+
+        scores = {encoding: self._score(''.join(decoded[encoding])) for encoding in decoders}
+        ranked = sorted(decoders, key=lambda encoding: scores[encoding], reverse=True)
+        if 'utf-8' in decoders and b'\x00' not in sample:
+            ranked.remove('utf-8')
+            ranked.insert(0, 'utf-8')
+        return ranked
+
+    def _candidates(self, data: Data, content_hash: Optional[str] = None) -> Tuple[str, List[str]]:
+        """按内容哈希缓存的候选编码列表，返回(缓存键, 候选编码)"""
+        content_hash = content_hash or hashlib.md5(data).hexdigest()
+        with self._lock:
+            ranked = self._cache.get(content_hash)
+            if ranked:
+                self._cache.move_to_end(content_hash)
+                return content_hash, list(ranked)
+
+        ranked = self._rank(bytes(data[:self.sample_size]))
+        self._remember(content_hash, ranked)
+        return content_hash, ranked
+
+    def _remember(self, content_hash: str, ranked: List[str]):
+        with self._lock:
+            self._cache[content_hash] = list(ranked)
+            self._cache.move_to_end(content_hash)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _confirm(self, content_hash: str, ranked: List[str], encoding: str):
+        """全文验证通过的编码移到候选首位，后续检测直接使用"""
+        if ranked[0] != encoding:
+            self._remember(content_hash, [encoding] + [e for e in ranked if e != encoding])
+
+    def _blocks(self, data: Data) -> Iterator[memoryview]:
+        """按采样大小切分内存数据（不复制）"""
+        view = memoryview(data)
+        for offset in range(0, len(view), self.sample_size):
+            yield view[offset:offset + self.sample_size]
+
+    def _file_blocks(self, file_path: str) -> Iterator[bytes]:
+        """按采样大小逐块读取本地文件"""
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(self.sample_size), b''):
+                yield block
+
+    @staticmethod
+    def _validates(blocks: Iterable[Data], encoding: str) -> bool:
+        """逐块严格解码整个数据（不保留文本），判断编码是否适用"""
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            for block in blocks:
+                decoder.decode(block, final=False)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def detect(self, data: Data, content_hash: Optional[str] = None) -> str:
+        """
+        检测编码
+
+        超出采样前缀的数据按候选顺序逐块严格验证，前缀之后才出现的非ASCII内容（如ASCII表头后的GBK正文）不会被误判
+
+        Args:
+            data: 文件数据
+            content_hash: 已计算的内容哈希，为空时自动计算
+
+        Returns:
+            编码名称
+        """
+        content_hash, ranked = self._candidates(data, content_hash)
+        return self._verify(content_hash, ranked, len(data), lambda: self._blocks(data))
+
+    def detect_file(self, file_path: str) -> str:
+        """
+        检测本地文件编码
+
+        与detect相同，超出采样前缀的部分逐块从磁盘读取验证，不整体载入文件
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            编码名称
+        """
+        with open(file_path, 'rb') as f:
+            sample = f.read(self.sample_size)
+        file_size = os.path.getsize(file_path)
+        # 以前缀哈希和文件大小作为缓存键，命中时无需重新采样
+        content_hash = f"{hashlib.md5(sample).hexdigest()}:{file_size}"
+        content_hash, ranked = self._candidates(sample, content_hash)
+        return self._verify(content_hash, ranked, file_size, lambda: self._file_blocks(file_path))
+
+    def _verify(self, content_hash: str, ranked: List[str], size: int, blocks) -> str:
+        """
+        数据超出采样前缀且候选不唯一时，按候选顺序验证全部数据，返回第一个通过的编码
+
+        Args:
+            content_hash: 缓存键
+            ranked: 候选编码
+            size: 数据总字节数
+            blocks: 每次调用返回一个新的数据块迭代器
+
+        Returns:
+            编码名称
+        """
+        encoding = ranked[0]
+        if size > self.sample_size and len(ranked) > 1:
+            for candidate in ranked:
+                if self._validates(blocks(), candidate):
+                    encoding = candidate
+                    self._confirm(content_hash, ranked, candidate)
+                    break
+
+        logger.debug(f"检测到文本编码: {encoding}")
+        return encoding
+
+    def decode_file(self, file_path: str) -> Tuple[str, str]:
+        """
+        读取本地文件并解码
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            (文本, 编码名称)
+        """
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        return self.decode(data)
+
+    def decode(self, data: Data, content_hash: Optional[str] = None) -> Tuple[str, str]:
+        """
+        检测编码并解码
+
+        按候选顺序严格解码，出错时换下一个候选；所有候选都无法完整解码时，
+        才以替换字符解码，选择前缀打分（_score，替换字符和私有区字符扣分）最高的编码
+
+        Args:
+            data: 文件数据
+            content_hash: 已计算的内容哈希
+
+        Returns:
+            (文本, 编码名称)
+        """
+        content_hash, ranked = self._candidates(data, content_hash)
+        for encoding in ranked:
+            try:
+                text = codecs.decode(data, encoding)
+            except UnicodeDecodeError:
+                continue
+            self._confirm(content_hash, ranked, encoding)
+            return text, encoding
+
+        # 采样阶段被淘汰的候选也参与比较（如UTF-8文件中混入个别非法字节）
+        ranked = ranked + [encoding for encoding in _CANDIDATES if encoding not in ranked]
+
+        # 最后手段：以替换字符解码，选择前缀打分最高的编码
+        replaced = {encoding: codecs.decode(data, encoding, errors='replace') for encoding in ranked}
+        encoding = max(ranked, key=lambda e: self._score(replaced[e][:self.sample_size]))
+        logger.warning(f"文本无法按候选编码 {ranked} 完整解码，使用{encoding}并替换非法字节")
+        return replaced[encoding], encoding
+
+# 全局编码检测器实例
+encoding_detector = EncodingDetector()
@@ -0,0 +1,316 @@
+"""
+公文生成任务
+生成接口的异步模式：提交时校验参数并创建状态为processing的生成记录（记录ID即任务ID），立即返回；
+后台线程执行知识库检索和大模型生成，结果写回生成记录。客户端轮询任务状态或订阅事件流获取结果，
+任务不在当前进程（多进程部署或进程重启）时从生成记录读取状态。持有任务的进程定期刷新排队中和执行中
+记录的心跳，processing记录超过orphan_timeout没有心跳时视为执行进程已退出，标记为失败，
+因此排队等待时间不受超时限制。事件流的持续时间不超过max_stream_seconds。
+"""
+import json
+import time
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config_rag import GENERATION_JOB_CONFIG
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('generation_jobs')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# 已结束的任务状态
+FINISHED_STATUSES = ('completed', 'failed')
+
+# 执行进程退出或超时导致中断的生成记录的错误信息
+ORPHANED_ERROR = '生成任务已中断（执行进程退出或超时），请重新提交'
+
+class GenerationJobQueue:
+    """生成任务队列（有界排队，固定数量的后台线程执行）"""
+
+    def __init__(self, record_loader: Callable[[int], Optional[Dict[str, Any]]],
+                 config: Optional[Dict[str, Any]] = None,
+                 record_failer: Optional[Callable[[int, str], int]] = None,
+                 record_heartbeat: Optional[Callable[[List[int]], Any]] = None):
+        """
+        初始化任务队列
+
+        Args:
+            record_loader: 按ID读取生成记录的函数（任务不在当前进程时使用）
+            config: 任务配置，默认使用GENERATION_JOB_CONFIG
+            record_failer: 将心跳超时的生成记录标记为失败的函数（参数为记录ID和错误信息，返回标记的记录数）
+            record_heartbeat: 刷新生成记录心跳的函数（参数为记录ID列表）
+        """
+        self.record_loader = record_loader
+        self.record_failer = record_failer
+        self.record_heartbeat = record_heartbeat
+        self.config = dict(GENERATION_JOB_CONFIG)
+        if config:
+            self.config.update(config)
+
+        # 心跳超时过短时，执行进程正常刷新心跳的记录也可能被其他进程标记为失败
+        min_timeout = 3 * self.config['record_heartbeat_interval']
+        if self.config['orphan_timeout'] < min_timeout:
+            logger.warning(f"orphan_timeout={self.config['orphan_timeout']}秒小于心跳间隔的3倍，调整为{min_timeout}秒")
+            self.config['orphan_timeout'] = min_timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=self.config['max_queued'])
+        self._jobs: Dict[int, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+        self._workers = []
+        self._started = False
+
+    def _start_workers(self):
+        """首次提交任务时启动后台线程"""
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.config['workers']):
+            worker = threading.Thread(target=self._worker, name=f"generation-job-{i}")
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        if self.record_heartbeat:
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name="generation-job-heartbeat")
+            heartbeat.daemon = True
+            heartbeat.start()
+
+    def _heartbeat(self, record_ids: List[int]):
+        """刷新生成记录心跳（失败只记录日志）"""
+        if not self.record_heartbeat or not record_ids:
+            return
+        try:
+            self.record_heartbeat(record_ids)
+        except Exception as e:
+            logger.error(f"刷新生成记录心跳失败: {e}")
+
+    def _heartbeat_loop(self):
+        """后台线程：定期刷新当前进程中排队和执行中任务的记录心跳"""
+        while True:
+            time.sleep(self.config['record_heartbeat_interval'])
+            with self._condition:
+                record_ids = [job['record_id'] for job in self._jobs.values()
+                              if job['status'] not in FINISHED_STATUSES]
+            self._heartbeat(record_ids)
+
+    def submit(self, route, data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """
+        提交生成任务
+
+        Args:
+            route: 生成接口的处理流程（LLMRoute，需提供begin阶段）
+            data: 请求数据
+
+        Returns:
+            (响应体, HTTP状态码)
+        """
+        if self._queue.full():
+            return {'success': False, 'error': '生成任务排队已满，请稍后再试'}, 503
+
+        state: Dict[str, Any] = {}
+        early = route.begin(state, data)
+        if early is not None:
+            return early
+
+        record_id = state.get('record_id')
+        if not record_id:
+            return {'success': False, 'error': '创建生成记录失败'}, 500
+
+        job = {
+            'job_id': record_id,
+            'record_id': record_id,
+            'type': route.name,
+            'status': 'queued',
+            'submitted_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'http_status': None,
+            'expires': None
+        }
+        with self._condition:
+            self._start_workers()
+            self._cleanup()
+            self._jobs[record_id] = job
+        try:
+            self._queue.put_nowait((job, route, data, state))
+        except queue.Full:
+            # 与其他提交并发时队列已满，提交阶段创建的记录标记为失败
+            route.on_error(state, RuntimeError('生成任务排队已满'))
+            self._finish(job, {'success': False, 'error': '生成任务排队已满，请稍后再试'}, 503)
+            return job['result'], 503
+
+        logger.info(f"生成任务已提交: {record_id} ({route.name})，排队 {self._queue.qsize()} 个")
+        return {'success': True, **self._public(job)}, 202
+
+    def _worker(self):
+        """后台线程：依次执行排队的任务"""
+        while True:
+            job, route, data, state = self._queue.get()
+            try:
+                with self._condition:
+                    job['status'] = 'running'
+                    job['started_at'] = datetime.now().isoformat()
+                    self._condition.notify_all()
+                self._heartbeat([job['record_id']])
+                body, status = route.run(data, state)
+                self._finish(job, body, status)
+            except Exception as e:
+                logger.error(f"生成任务执行失败: {job['job_id']}: {e}")
+                self._finish(job, {'success': False, 'error': str(e)}, 500)
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job: Dict[str, Any], body: Dict[str, Any], status: int):
+        """记录任务结果并通知等待者"""
+        with self._condition:
+            job['status'] = 'completed' if body.get('success') else 'failed'
+            job['result'] = body
+            job['http_status'] = status
+            job['finished_at'] = datetime.now().isoformat()
+            job['expires'] = time.time() + self.config['result_ttl']
+            self._condition.notify_all()
+
+    def _cleanup(self):
+        """移除过期的已结束任务（调用方持有锁）"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items() if job['expires'] and job['expires'] < now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """任务状态（不含内部字段）"""
+        return {k: v for k, v in job.items() if k != 'expires'}
+
+    def _is_orphaned(self, record: Dict[str, Any]) -> bool:
+        """processing记录超过orphan_timeout没有心跳（从未刷新心跳时按创建时间），执行进程已退出"""
+        last_seen = record.get('heartbeat_at') or record.get('created_at')
+        if record.get('status') != 'processing' or not last_seen:
+            return False
+        if isinstance(last_seen, str):
+            try:
+                last_seen = datetime.fromisoformat(last_seen)
+            except ValueError:
+                return False
+        return (datetime.now() - last_seen).total_seconds() > self.config['orphan_timeout']
+
+    def _expire(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将心跳超时的processing记录标记为失败
+
+        由record_failer在数据库中按心跳条件标记，未标记（执行进程刚刷新了心跳）或标记出错时原样返回记录
+        """
+        if not self.record_failer:
+            return record
+        error = ORPHANED_ERROR
+        try:
+            if not self.record_failer(record.get('id'), error):
+                return record
+        except Exception as e:
+            logger.error(f"标记生成记录失败状态失败: {record.get('id')}: {e}")
+            return record
+        logger.warning(f"生成记录 {record.get('id')} 超过 {self.config['orphan_timeout']} 秒没有心跳，已标记为失败")
+        return dict(record, status='failed', error_message=error)
+
+    @staticmethod
+    def _from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """由生成记录构建任务状态（任务不在当前进程时）"""
+        status = record.get('status')
+        job = {
+            'job_id': record.get('id'),
+            'record_id': record.get('id'),
+            'status': 'running' if status == 'processing' else status,
+            'result': None
+        }
+        if status in FINISHED_STATUSES:
+            content = record.get('content') or record.get('generated_content')
+            job['result'] = ({'success': True, 'record_id': record.get('id'), 'content': content}
+                             if status == 'completed'
+                             else {'success': False, 'error': record.get('error_message')})
+        return job
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        查询任务状态
+
+        Args:
+            job_id: 任务ID（生成记录ID）
+
+        Returns:
+            任务状态，不存在时返回None
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                state = self._public(job)
+                if job['status'] == 'queued':
+                    state['queued'] = self._queue.qsize()
+                return state
+
+        record = self.record_loader(job_id)
+        if not record:
+            return None
+        if self._is_orphaned(record):
+            record = self._expire(record)
+        return self._from_record(record)
+
+    def events(self, job_id: int) -> Iterator[str]:
+        """
+        任务状态事件流（SSE），状态变化时推送，任务结束后推送结果并关闭；
+        超过max_stream_seconds仍未结束时推送timeout事件并关闭，客户端可重新订阅或轮询任务状态
+
+        Args:
+            job_id: 任务ID（生成记录ID）
+        """
+        last_status = None
+        last_sent = time.time()
+        deadline = last_sent + self.config['max_stream_seconds']
+        while True:
+            if time.time() >= deadline:
+                yield self._event('timeout', {'success': False, 'job_id': job_id, 'status': last_status,
+                                              'error': '事件流已达到最长持续时间，请重新订阅或查询任务状态'})
+                return
+            with self._condition:
+                job = self._jobs.get(job_id)
+                if job is not None and job['status'] == last_status:
+                    self._condition.wait(max(0.0, min(self.config['heartbeat_interval'], deadline - time.time())))
+            state = self.get(job_id)
+
+            if state is None:
+                yield self._event('error', {'success': False, 'error': '任务不存在'})
+                return
+            if state['status'] != last_status:
+                last_status = state['status']
+                last_sent = time.time()
+                yield self._event('status', state)
+                if last_status in FINISHED_STATUSES:
+                    return
+            elif time.time() - last_sent >= self.config['heartbeat_interval']:
+                last_sent = time.time()
+                yield ': keepalive\n\n'
+
+            if job is None:
+                # 任务不在当前进程，定期读取生成记录
+                time.sleep(self.config['poll_interval'])
+
+    @staticmethod
+    def _event(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """队列统计"""
+        with self._condition:
+            statuses: Dict[str, int] = {}
+            for job in self._jobs.values():
+                statuses[job['status']] = statuses.get(job['status'], 0) + 1
+        return {
+            'workers': self.config['workers'],
+            'queued': self._queue.qsize(),
+            'max_queued': self.config['max_queued'],
+            'jobs': statuses
+        }
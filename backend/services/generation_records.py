@@ -0,0 +1,232 @@
+"""
+公文生成记录查询服务
+详情按主键读取，已结束（completed/failed）的记录内容不再变化，缓存在进程内LRU中；
+列表按ID游标分页，不读取生成内容和RAG上下文等大字段：先在(user_id, id)索引上完成筛选、排序和分页
+（只读取索引中的id），再按主键读取当页记录的其余列。索引由init_database.py创建。
+"""
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from config_rag import GENERATION_RECORD_CONFIG
+
+try:
+    from utils.tracing import TracedConnection
+except ImportError:
+    TracedConnection = None
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('generation_records')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# 内容不再变化、可以缓存的记录状态
+CACHEABLE_STATUSES = ('completed', 'failed')
+
+class GenerationRecordStore:
+    """生成记录的主键查询和游标分页"""
+
+    def __init__(self, db_model, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化查询服务
+
+        Args:
+            db_model: 知识库数据库模型（提供_get_connection）
+            config: 查询配置，默认使用GENERATION_RECORD_CONFIG
+        """
+        self.db_model = db_model
+        self.config = dict(GENERATION_RECORD_CONFIG)
+        if config:
+            self.config.update(config)
+
+        self.table = self.config['table']
+        self._cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._list_columns: Optional[List[str]] = None
+
+    def _connect(self):
+        conn = self.db_model._get_connection()
+        return TracedConnection(conn) if TracedConnection else conn
+
+    def _prepare(self, conn):
+        """首次查询时读取表结构，确定列表接口读取的列"""
+        if self._list_columns is not None:
+            return
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (self.table,)
+        )
+        columns = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        large_columns = set(self.config['large_columns'])
+        self._list_columns = [column for column in columns if column not in large_columns] or ['*']
+
+    def touch(self, record_ids: List[int]) -> int:
+        """
+        刷新processing记录的心跳时间（heartbeat_at列由init_database.py添加）
+
+        Args:
+            record_ids: 当前进程中排队或执行中的记录ID
+
+        Returns:
+            更新的记录数
+        """
+        if not record_ids:
+            return 0
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            placeholders = ', '.join(['%s'] * len(record_ids))
+            cursor.execute(
+                f"UPDATE {self.table} SET heartbeat_at = NOW() "
+                f"WHERE status = 'processing' AND id IN ({placeholders})",
+                list(record_ids)
+            )
+            count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        return count
+
+    def fail_stale(self, max_age: int, error_message: str, record_id: Optional[int] = None) -> int:
+        """
+        将超过max_age秒没有心跳（从未刷新心跳时按创建时间）的processing记录标记为失败（执行进程已退出）
+
+        条件在同一条UPDATE中判断，执行进程仍在刷新心跳的记录不会被误标记
+
+        Args:
+            max_age: 心跳超时时间（秒）
+            error_message: 写入记录的错误信息
+            record_id: 只处理指定记录，为空时处理全部
+
+        Returns:
+            标记的记录数
+        """
+        sql = (f"UPDATE {self.table} SET status = 'failed', error_message = %s "
+               "WHERE status = 'processing' AND COALESCE(heartbeat_at, created_at) < NOW() - INTERVAL %s SECOND")
+        params = [error_message, int(max_age)]
+        if record_id is not None:
+            sql += " AND id = %s"
+            params.append(record_id)
+
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        if count:
+            logger.warning(f"已将 {count} 条中断的生成记录标记为失败")
+        return count
+
+    @staticmethod
+    def _normalize(record: Dict[str, Any]) -> Dict[str, Any]:
+        """转换为可JSON序列化的记录"""
+        for key, value in record.items():
+            if isinstance(value, (datetime, date)):
+                record[key] = value.isoformat()
+            elif isinstance(value, Decimal):
+                record[key] = float(value)
+        reference_files = record.get('reference_files')
+        if isinstance(reference_files, str):
+            try:
+                record['reference_files'] = json.loads(reference_files)
+            except ValueError:
+                pass
+        return record
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        """
+        按ID获取生成记录（包含生成内容）
+
+        Args:
+            record_id: 记录ID
+
+        Returns:
+            记录，不存在时返回None
+        """
+        with self._lock:
+            record = self._cache.get(record_id)
+            if record is not None:
+                self._cache.move_to_end(record_id)
+                return dict(record)
+
+        conn = self._connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT * FROM {self.table} WHERE id = %s", (record_id,))
+            record = cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+
+        if not record:
+            return None
+        record = self._normalize(record)
+
+        if record.get('status') in CACHEABLE_STATUSES:
+            with self._lock:
+                self._cache[record_id] = dict(record)
+                self._cache.move_to_end(record_id)
+                while len(self._cache) > self.config['cache_size']:
+                    self._cache.popitem(last=False)
+        return record
+
+    def list(self, user_id: Optional[str] = None, cursor: Optional[int] = None,
+             limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        按ID倒序分页获取生成记录（不含大字段）
+
+        Args:
+            user_id: 用户ID，为空时返回所有用户的记录
+            cursor: 上一页返回的next_cursor，为空时从最新记录开始
+            limit: 每页数量（不超过max_page_size）
+
+        Returns:
+            (记录列表, 下一页游标，没有更多记录时为None)
+        """
+        limit = max(1, min(int(limit), self.config['max_page_size']))
+
+        conn = self._connect()
+        try:
+            self._prepare(conn)
+            conditions, params = [], []
+            if user_id:
+                conditions.append("user_id = %s")
+                params.append(user_id)
+            if cursor:
+                conditions.append("id < %s")
+                params.append(int(cursor))
+            where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+            columns = ', '.join(f"r.{column}" if column != '*' else 'r.*' for column in self._list_columns)
+
+            db_cursor = conn.cursor(dictionary=True)
+            # 子查询只读取索引中的id完成筛选和分页（多取一条判断是否还有下一页），其余列按主键读取当页记录
+            db_cursor.execute(
+                f"SELECT {columns} FROM {self.table} r "
+                f"JOIN (SELECT id FROM {self.table} {where}ORDER BY id DESC LIMIT %s) page ON r.id = page.id "
+                f"ORDER BY r.id DESC",
+                params + [limit + 1]
+            )
+            records = [self._normalize(record) for record in db_cursor.fetchall()]
+            db_cursor.close()
+        finally:
+            conn.close()
+
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = records[-1]['id']
+        return records, next_cursor
@@ -5,16 +5,22 @@
 import os
 import hashlib
 import tempfile
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Callable, Union
 from datetime import datetime
 import threading
 import time
 
 from services.minio_service import MinioService
 from services.document_parser import DocumentParser
-from services.vector_service import VectorService
+from services.vector_service import get_vector_service
+from services.reembedding_job import ReembeddingJob
+from services.stats_aggregator import StatsAggregator
+from services.retrieval_log_writer import RetrievalLogWriter
+from services.upload_spool import SpooledUpload
+from services.bulk_delete import BulkDeleter
 from models.knowledge_base import KnowledgeBaseModel
-from config_rag import MAX_FILE_SIZE
+from config_rag import MAX_FILE_SIZE, TABULAR_CONFIG
+from utils.tracing import TracedProxy
 
 # 导入统一的日志管理器
 try:
@@ -33,8 +39,8 @@ class KnowledgeBaseService:
             # 初始化各个服务
             self.minio_service = MinioService()
             self.document_parser = DocumentParser()
-            self.vector_service = VectorService()
-            self.db_model = KnowledgeBaseModel()
+            self.vector_service = get_vector_service()
+            self.db_model = TracedProxy(KnowledgeBaseModel(), 'db')
             
             # 创建数据库表
             self.db_model.create_tables()
@@ -43,38 +49,65 @@ class KnowledgeBaseService:
             self.processing_queue = {}
             self.processing_lock = threading.Lock()
             
+            # 嵌入模型迁移任务
+            self.reembedding_job = ReembeddingJob(self.vector_service)
+            
+            # 检索日志异步批量写入
+            self.retrieval_log_writer = RetrievalLogWriter(self.db_model)
+            
+            # 统计聚合（事件计数 + 后台定期对账）
+            self.stats_aggregator = StatsAggregator(self.minio_service, self.vector_service, self.db_model,
+                                                    log_writer=self.retrieval_log_writer)
+            self.stats_aggregator.start()
+            
+            # 批量删除（启动时继续上次中断的删除）
+            self.bulk_deleter = BulkDeleter(self.minio_service, self.vector_service, self.db_model,
+                                            self.stats_aggregator)
+            threading.Thread(target=self._resume_bulk_delete, daemon=True).start()
+            
             logger.info("知识库管理服务初始化成功")
             
         except Exception as e:
             logger.error(f"知识库管理服务初始化失败: {e}")
             raise
     
-    def upload_and_process_file(self, file_data: bytes, file_name: str, content_type: str = None) -> Dict[str, Any]:
+    def upload_and_process_file(self, file_data: Union[bytes, SpooledUpload], file_name: str, content_type: str = None) -> Dict[str, Any]:
         """
         上传并处理文件
         
+        传入SpooledUpload时，哈希使用流式读取时的计算结果，MinIO分片流式上传，
+        解析使用同一份数据的只读视图；缓冲区由本服务在处理结束后关闭
+        
         Args:
-            file_data: 文件数据
+            file_data: 文件数据或上传缓冲区
             file_name: 文件名
             content_type: 内容类型
             
         Returns:
             处理结果
         """
+        upload = file_data if isinstance(file_data, SpooledUpload) else None
         try:
+            data = upload.view() if upload else file_data
+            
             # 1. 验证文件
-            validation_result = self.document_parser.validate_file(file_data, file_name)
+            validation_result = self.document_parser.validate_file(data, file_name)
             if not validation_result['valid']:
+                if upload:
+                    upload.close()
                 return {
                     'success': False,
                     'error': validation_result['error']
                 }
             
             # 2. 上传文件到MinIO
-            file_info = self.minio_service.upload_file_data(file_data, file_name, content_type)
+            if upload:
+                file_info = self.minio_service.upload_file_stream(upload.open_stream(), upload.size, file_name, content_type)
+            else:
+                file_info = self.minio_service.upload_file_data(data, file_name, content_type)
             
             # 3. 计算内容哈希
-            content_hash = hashlib.md5(file_data).hexdigest()
+            content_hash = upload.content_hash if upload else hashlib.md5(data).hexdigest()
             
             # 4. 准备数据库记录
             db_file_info = {
@@ -90,9 +123,10 @@ class KnowledgeBaseService:
             
             # 5. 插入数据库记录
             file_id = self.db_model.insert_knowledge_file(db_file_info)
+            self.stats_aggregator.on_file_uploaded()
             
             # 6. 异步处理文档
-            self._process_document_async(file_id, file_data, file_name, content_type)
+            self._process_document_async(file_id, data, file_name, content_type, on_finish=upload.close if upload else None)
             
             return {
                 'success': True,
@@ -105,12 +139,15 @@ class KnowledgeBaseService:
             
         except Exception as e:
             logger.error(f"文件上传处理失败: {e}")
+            if upload:
+                upload.close()
             return {
                 'success': False,
                 'error': f"文件上传处理失败: {str(e)}"
             }
     
-    def _process_document_async(self, file_id: int, file_data: bytes, file_name: str, content_type: str = None):
+    def _process_document_async(self, file_id: int, file_data: bytes, file_name: str, content_type: str = None,
+                                on_finish: Optional[Callable[[], None]] = None):
         """
         异步处理文档
         
@@ -119,11 +156,19 @@ class KnowledgeBaseService:
             file_data: 文件数据
             file_name: 文件名
             content_type: 内容类型
+            on_finish: 处理结束（无论成功失败）后的回调，用于释放上传缓冲区
         """
         def process_task():
             try:
                 logger.info(f"开始处理文档，文件ID: {file_id}")
                 
+                # 表格文件按行组分批向量化入库，不生成全文
+                if self.document_parser.streams_chunks(file_data, file_name):
+                    result = self._ingest_chunk_stream(file_id, file_data, file_name)
+                    self.db_model.update_file_status(file_id, 'completed', result)
+                    logger.info(f"文档处理完成，文件ID: {file_id}")
+                    return
+                
                 # 1. 解析文档内容
                 parse_result = self.document_parser.parse_document(file_data, file_name, content_type)
                 
@@ -138,6 +183,7 @@ class KnowledgeBaseService:
                 
                 # 3. 添加到向量数据库
                 vector_ids = self.vector_service.add_documents_to_vector_db(chunks, str(file_id))
+                self.stats_aggregator.on_vectors_changed(len(vector_ids))
                 
                 # 4. 保存文档块到数据库
                 for i, chunk in enumerate(chunks):
@@ -159,12 +205,57 @@ class KnowledgeBaseService:
                 self.db_model.update_file_status(file_id, 'failed', {
                     'error': str(e)
                 })
+            finally:
+                if on_finish:
+                    on_finish()
         
         # 启动异步处理线程
         thread = threading.Thread(target=process_task)
         thread.daemon = True
         thread.start()
     
+    def _ingest_chunk_stream(self, file_id: int, file_data: bytes, file_name: str) -> Dict[str, Any]:
+        """
+        边解析边分批写入向量数据库和文档块表，内存中只保留当前一批文档块
+        
+        Args:
+            file_id: 文件ID
+            file_data: 文件数据
+            file_name: 文件名
+            
+        Returns:
+            文件处理结果（chunk_count、vector_count、content_length）
+        """
+        batch_size = max(1, TABULAR_CONFIG['ingest_batch_size'])
+        stats: Dict[str, Any] = {}
+        chunk_count = 0
+        vector_count = 0
+        batch: List[Dict[str, Any]] = []
+        
+        def flush():
+            nonlocal chunk_count, vector_count
+            vector_ids = self.vector_service.add_documents_to_vector_db(batch, str(file_id), start_index=chunk_count)
+            self.stats_aggregator.on_vectors_changed(len(vector_ids))
+            for i, chunk in enumerate(batch):
+                chunk['vector_id'] = vector_ids[i] if i < len(vector_ids) else ''
+            self.db_model.insert_document_chunks(file_id, batch)
+            chunk_count += len(batch)
+            vector_count += len(vector_ids)
+            batch.clear()
+        
+        for chunk in self.document_parser.iter_chunks(file_data, file_name, stats):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        
+        return {
+            'chunk_count': chunk_count,
+            'vector_count': vector_count,
+            'content_length': stats.get('content_length', 0)
+        }
+    
     def search_knowledge_base(self, query: str, top_k: Optional[int] = None) -> Dict[str, Any]:
         """
         搜索知识库
@@ -182,14 +273,15 @@ class KnowledgeBaseService:
             # 1. 向量搜索
             similar_docs = self.vector_service.search_similar_documents(query, top_k)
             
-            # 2. 记录检索日志
+            # 2. 记录检索日志（异步批量写入，不等待数据库）
             response_time = int((time.time() - start_time) * 1000)
-            self.db_model.insert_retrieval_log({
+            self.retrieval_log_writer.log({
                 'query_text': query,
                 'retrieved_chunks': similar_docs,
                 'document_type': 'knowledge_base',
                 'response_time_ms': response_time
             })
+            self.stats_aggregator.on_retrieval(response_time, 'knowledge_base')
             
             # 3. 构建搜索结果
             results = []
@@ -295,67 +387,66 @@ class KnowledgeBaseService:
         Returns:
             删除结果
         """
-        try:
-            # 获取文件信息
-            file_info = self.db_model.get_file_by_id(file_id)
-            if not file_info:
-                return {
-                    'success': False,
-                    'error': '文件不存在'
-                }
-            
-            # 1. 删除MinIO中的文件
-            self.minio_service.delete_file(file_info['file_path'])
-            
-            # 2. 删除向量数据库中的向量
-            self.vector_service.delete_document_vectors(str(file_id))
-            
-            # 3. 删除数据库记录
-            success = self.db_model.delete_knowledge_file(file_id)
-            
-            if success:
-                return {
-                    'success': True,
-                    'message': '文件删除成功'
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': '文件删除失败'
-                }
-                
-        except Exception as e:
-            logger.error(f"删除知识库文件失败: {e}")
+        result = self.bulk_delete_files([file_id])
+        if not result['success']:
+            return result
+        if result['missing']:
             return {
                 'success': False,
-                'error': f"删除知识库文件失败: {str(e)}"
+                'error': '文件不存在'
             }
+        return {
+            'success': True,
+            'message': '文件删除成功'
+        }
     
-    def get_knowledge_base_stats(self) -> Dict[str, Any]:
+    def bulk_delete_files(self, file_ids: List[int]) -> Dict[str, Any]:
         """
-        获取知识库统计信息
+        批量删除知识库文件
+        
+        MinIO对象批量删除、向量按file_id集合一次删除、数据库记录单事务删除；
+        中途失败时保留删除日志，重试或服务重启后从未完成的阶段继续
         
+        Args:
+            file_ids: 文件ID列表
+            
+        Returns:
+            删除结果
+        """
+        return self.bulk_deleter.delete(file_ids)
+    
+    def get_bulk_delete_status(self) -> Dict[str, Any]:
+        """获取未完成的批量删除状态"""
+        return {
+            'success': True,
+            'data': self.bulk_deleter.get_status()
+        }
+    
+    def _resume_bulk_delete(self):
+        """继续上次中断的批量删除"""
+        try:
+            self.bulk_deleter.resume()
+        except Exception as e:
+            logger.error(f"继续批量删除失败，将在下次删除时重试: {e}")
+    
+    def get_knowledge_base_stats(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        获取知识库统计信息（返回缓存快照，由入库/检索事件实时更新并定期后台对账）
+        
+        Args:
+            refresh: 是否先与MinIO、ChromaDB和检索日志同步对账
+            
         Returns:
             统计信息
         """
         try:
-            # 获取数据库统计
-            db_stats = self.db_model.get_retrieval_stats()
-            
-            # 获取向量数据库统计
-            vector_stats = self.vector_service.get_vector_db_stats()
-            
-            # 获取MinIO文件列表
-            minio_files = self.minio_service.list_files()
-            
-            stats = {
-                'total_files': len(minio_files),
-                'total_vectors': vector_stats['total_vectors'],
-                'total_queries': db_stats['total_queries'],
-                'avg_response_time': db_stats['avg_response_time'],
-                'embedding_model': vector_stats['embedding_model'],
-                'document_type_stats': db_stats['document_type_stats']
-            }
+            if refresh:
+                self.stats_aggregator.reconcile()
+            
+            stats = self.stats_aggregator.snapshot()
+            stats['retrieval_log'] = self.retrieval_log_writer.get_stats()
+            if self.minio_service.cache:
+                stats['object_cache'] = self.minio_service.cache.get_stats()
             
             return {
                 'success': True,
@@ -370,9 +461,31 @@ class KnowledgeBaseService:
                 'stats': {}
             }
     
+    def verify_vector_stats(self, repair: bool = False) -> Dict[str, Any]:
+        """
+        分页扫描向量集合，校验统计侧表
+        
+        Args:
+            repair: 发现差异时是否修复
+            
+        Returns:
+            校验结果
+        """
+        try:
+            return {
+                'success': True,
+                'verification': self.vector_service.verify_collection_stats(repair)
+            }
+        except Exception as e:
+            logger.error(f"校验向量统计失败: {e}")
+            return {
+                'success': False,
+                'error': f"校验向量统计失败: {str(e)}"
+            }
+    
     def regenerate_vectors(self, file_id: int) -> Dict[str, Any]:
         """
-        重新生成向量
+        重新生成向量（增量）
         
         Args:
             file_id: 文件ID
@@ -397,8 +510,8 @@ class KnowledgeBaseService:
                     'error': '无法获取文件数据'
                 }
             
-            # 重新处理文档
-            self._process_document_async(file_id, file_data, file_info['original_name'])
+            # 增量重建向量
+            self._reindex_document_async(file_id, file_data, file_info['original_name'])
             
             return {
                 'success': True,
@@ -412,13 +525,110 @@ class KnowledgeBaseService:
                 'error': f"重新生成向量失败: {str(e)}"
             }
     
-    def batch_search(self, queries: List[str], top_k: Optional[int] = None) -> Dict[str, Any]:
+    def _reindex_document_async(self, file_id: int, file_data: bytes, file_name: str):
+        """
+        异步增量重建文档向量
+        
+        只对新增或内容变化的文档块重新向量化，删除已不存在的块，其余块仅更新位置元数据
+        
+        Args:
+            file_id: 文件ID
+            file_data: 文件数据
+            file_name: 文件名
+        """
+        def reindex_task():
+            try:
+                start_time = time.time()
+                logger.info(f"开始增量重建向量，文件ID: {file_id}")
+                
+                # 1-2. 解析并分块（表格文件直接产出行组文档块，不生成全文）
+                if self.document_parser.streams_chunks(file_data, file_name):
+                    stats: Dict[str, Any] = {}
+                    chunks = list(self.document_parser.iter_chunks(file_data, file_name, stats))
+                    content_length = stats.get('content_length', 0)
+                else:
+                    parse_result = self.document_parser.parse_document(file_data, file_name)
+                    if not parse_result['parse_success']:
+                        self.db_model.update_file_status(file_id, 'failed', {
+                            'error': parse_result['error_message']
+                        })
+                        return
+                    chunks = self.vector_service.chunk_text(parse_result['content'], file_name)
+                    content_length = parse_result['content_length']
+                
+                # 3. 按内容哈希增量更新向量数据库
+                reindex_result = self.vector_service.reindex_file_chunks(chunks, str(file_id))
+                self.stats_aggregator.on_vectors_changed(reindex_result['added'] - reindex_result['removed'])
+                for i, chunk in enumerate(chunks):
+                    chunk['vector_id'] = reindex_result['ids'][i]
+                
+                # 4. 替换数据库中的文档块记录（模型在同一事务内删除旧记录并写入新记录，失败时回滚保留旧记录）
+                self.db_model.replace_document_chunks(file_id, chunks)
+                
+                # 5. 更新文件状态
+                elapsed_ms = int((time.time() - start_time) * 1000)
+                self.db_model.update_file_status(file_id, 'completed', {
+                    'chunk_count': len(chunks),
+                    'vector_count': len(chunks),
+                    'content_length': content_length,
+                    'reindex': {k: v for k, v in reindex_result.items() if k != 'ids'},
+                    'reindex_time_ms': elapsed_ms
+                })
+                
+                logger.info(f"增量重建向量完成，文件ID: {file_id}, 耗时: {elapsed_ms}ms")
+                
+            except Exception as e:
+                logger.error(f"增量重建向量失败，文件ID: {file_id}, 错误: {e}")
+                self.db_model.update_file_status(file_id, 'failed', {
+                    'error': str(e)
+                })
+        
+        thread = threading.Thread(target=reindex_task)
+        thread.daemon = True
+        thread.start()
+    
+    def start_reembedding(self, target_model: str, batch_size: Optional[int] = None,
+                          max_chunks_per_sec: Optional[float] = None) -> Dict[str, Any]:
+        """
+        启动嵌入模型迁移任务
+        
+        Args:
+            target_model: 新嵌入模型的名称或本地路径
+            batch_size: 每批处理的文档块数量
+            max_chunks_per_sec: 限流速率，0表示不限制
+            
+        Returns:
+            任务状态
+        """
+        try:
+            return self.reembedding_job.start(target_model, batch_size, max_chunks_per_sec)
+        except Exception as e:
+            logger.error(f"启动向量重建任务失败: {e}")
+            return {
+                'success': False,
+                'error': f"启动向量重建任务失败: {str(e)}"
+            }
+    
+    def stop_reembedding(self) -> Dict[str, Any]:
+        """停止嵌入模型迁移任务"""
+        return self.reembedding_job.stop()
+    
+    def get_reembedding_status(self) -> Dict[str, Any]:
+        """获取嵌入模型迁移任务进度"""
+        return {
+            'success': True,
+            'progress': self.reembedding_job.get_progress()
+        }
+    
+    def batch_search(self, queries: List[str], top_k: Optional[int] = None,
+                     file_ids: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         批量搜索
         
         Args:
             queries: 查询列表
             top_k: 每个查询返回结果数量
+            file_ids: 限制搜索的文件ID列表
             
         Returns:
             批量搜索结果
@@ -426,14 +636,14 @@ class KnowledgeBaseService:
         try:
             start_time = time.time()
             
-            # 批量搜索
-            all_results = self.vector_service.batch_search(queries, top_k)
+            # 批量搜索（一次编码、一次多查询检索）
+            batch_result = self.vector_service.batch_search(queries, top_k, file_ids)
             
             response_time = int((time.time() - start_time) * 1000)
             
             # 构建结果
             results = []
-            for i, query_results in enumerate(all_results):
+            for i, query_results in enumerate(batch_result['results']):
                 query_result = {
                     'query': queries[i],
                     'results': query_results,
@@ -445,6 +655,8 @@ class KnowledgeBaseService:
                 'success': True,
                 'queries': queries,
                 'results': results,
+                'unique_queries': batch_result['unique_queries'],
+                'timing': batch_result['timing'],
                 'response_time_ms': response_time
             }
             
@@ -454,4 +666,4 @@ class KnowledgeBaseService:
                 'success': False,
                 'error': f"批量搜索失败: {str(e)}",
                 'results': []
-            } 
\ No newline at end of file
+            }
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+大模型接口调用
+调用大模型的接口统一拆分为 准备（校验、检索、构建请求）→ 调用上游 → 处理结果 三段，
+Flask视图通过LLMRoute.run同步调用（requests），ASGI视图通过LLMRoute.arun异步等待上游（httpx），
+两种部署方式共用同一套业务处理，响应保持一致
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+
+from config_rag import ASGI_CONFIG
+from utils.tracing import tracer
+
+# (响应体, HTTP状态码)
+RouteResult = Tuple[Dict[str, Any], int]
+
+_async_client = None
+
+def get_async_client():
+    """获取共享的异步HTTP客户端（按ASGI_CONFIG限制连接池）"""
+    global _async_client
+    if _async_client is None:
+        import httpx
+
+        _async_client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=ASGI_CONFIG['llm_max_connections'],
+            max_keepalive_connections=ASGI_CONFIG['llm_max_keepalive']
+        ))
+    return _async_client
+
+async def close_async_client():
+    """关闭异步HTTP客户端（ASGI应用退出时调用）"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+class LLMRoute:
+    """
+    调用大模型的接口处理流程
+
+    prepare(state, data)：校验参数并构建上游请求，写入state['request']（requests和httpx通用的post参数：
+        url、headers、json、timeout）；需要直接返回时返回(响应体, 状态码)
+    finish(state, response)：解析上游响应（requests.Response或httpx.Response），返回(响应体, 状态码)
+    on_error(state, error)：处理过程中的异常，返回(响应体, 状态码)
+    begin(state, data)：可选，提交阶段（校验参数并创建生成记录），异步任务模式下在请求线程中执行，
+        prepare需在state中已有begin的结果时跳过这些步骤
+    """
+
+    def __init__(self, name: str,
+                 prepare: Callable[[Dict[str, Any], Any], Optional[RouteResult]],
+                 finish: Callable[[Dict[str, Any], Any], RouteResult],
+                 on_error: Callable[[Dict[str, Any], Exception], RouteResult],
+                 blocking: bool = False,
+                 begin: Optional[Callable[[Dict[str, Any], Any], Optional[RouteResult]]] = None):
+        """
+        Args:
+            name: 接口名称
+            prepare: 准备阶段
+            finish: 结果处理阶段
+            on_error: 异常处理
+            blocking: 准备和结果处理阶段是否包含数据库、向量检索等阻塞操作（异步调用时放入线程池执行）
+            begin: 提交阶段（支持异步任务模式的接口）
+        """
+        self.name = name
+        self.prepare = prepare
+        self.finish = finish
+        self.on_error = on_error
+        self.blocking = blocking
+        self.begin = begin
+
+    def run(self, data: Any, state: Optional[Dict[str, Any]] = None) -> RouteResult:
+        """
+        同步处理（Flask视图、后台任务）
+
+        Args:
+            data: 请求数据
+            state: 已执行begin阶段的处理状态（异步任务模式）
+        """
+        state = {} if state is None else state
+        try:
+            early = self.prepare(state, data)
+            if early is not None:
+                return early
+            with tracer.span('llm', 'deepseek'):
+                response = requests.post(**state['request'])
+            return self.finish(state, response)
+        except Exception as e:
+            return self.on_error(state, e)
+
+    async def arun(self, data: Any, executor: Optional[Executor] = None) -> RouteResult:
+        """
+        异步处理（ASGI视图）：等待上游期间不占用线程
+
+        Args:
+            data: 请求数据
+            executor: 执行阻塞阶段的线程池
+        """
+        state: Dict[str, Any] = {}
+        try:
+            early = await self._call(self.prepare, executor, state, data)
+            if early is not None:
+                return early
+            with tracer.span('llm', 'deepseek'):
+                response = await get_async_client().post(**state['request'])
+            return await self._call(self.finish, executor, state, response)
+        except Exception as e:
+            return await self._call(self.on_error, executor, state, e)
+
+    async def _call(self, func: Callable, executor: Optional[Executor], *args):
+        """非阻塞阶段直接调用，阻塞阶段在线程池中执行（保留追踪上下文）"""
+        if not self.blocking:
+            return func(*args)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(context.run, func, *args))
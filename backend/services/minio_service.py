@@ -5,11 +5,15 @@ MinIO S3服务类
 import os
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, Union
 from minio import Minio
 from minio.error import S3Error
+from minio.deleteobjects import DeleteObject
 
-from config_rag import MINIO_CONFIG, KNOWLEDGE_BASE_CONFIG
+from config_rag import MINIO_CONFIG, KNOWLEDGE_BASE_CONFIG, OBJECT_CACHE_CONFIG
+from services.minio_transfer import TransferManager
+from services.object_cache import ObjectDiskCache
+from utils.tracing import traced
 
 # 导入统一的日志管理器
 try:
@@ -34,6 +38,10 @@ class MinioService:
             )
             self.bucket_name = KNOWLEDGE_BASE_CONFIG['bucket_name']
             self._ensure_bucket_exists()
+            # 大对象分片上传和并行分段下载
+            self.transfer = TransferManager(self.client, self.bucket_name)
+            # 本地磁盘读缓存
+            self.cache = ObjectDiskCache() if OBJECT_CACHE_CONFIG['enabled'] else None
             logger.info("MinIO客户端初始化成功")
         except Exception as e:
             logger.error(f"MinIO客户端初始化失败: {e}")
@@ -51,6 +59,7 @@ class MinioService:
             logger.error(f"存储桶操作失败: {e}")
             raise
     
+    @traced('minio')
     def upload_file(self, file_path: str, file_name: Optional[str] = None) -> Dict[str, Any]:
         """
         上传文件到MinIO
@@ -104,6 +113,7 @@ class MinioService:
             logger.error(f"文件上传失败: {e}")
             raise
     
+    @traced('minio')
     def upload_file_data(self, file_data: bytes, file_name: str, content_type: str = None) -> Dict[str, Any]:
         """
         上传文件数据到MinIO
@@ -126,17 +136,8 @@ class MinioService:
             unique_id = str(uuid.uuid4())[:8]
             final_file_name = f"{file_name_without_ext}_{timestamp}_{unique_id}{file_ext}"
             
-            # 创建BytesIO对象
-            data_stream = io.BytesIO(file_data)
-            
-            # 上传文件
-            result = self.client.put_object(
-                self.bucket_name,
-                final_file_name,
-                data_stream,
-                len(file_data),
-                content_type=content_type
-            )
+            # 上传文件（大文件自动并发分片上传）
+            result = self.transfer.upload(io.BytesIO(file_data), len(file_data), final_file_name, content_type)
             
             file_info = {
                 'file_name': final_file_name,
@@ -156,6 +157,49 @@ class MinioService:
             logger.error(f"文件数据上传失败: {e}")
             raise
     
+    @traced('minio')
+    def upload_file_stream(self, stream, length: int, file_name: str, content_type: str = None) -> Dict[str, Any]:
+        """
+        流式上传文件到MinIO（超过阈值时并发分片上传，内存占用与文件大小无关）
+        
+        Args:
+            stream: 可读取的文件对象
+            length: 数据长度
+            file_name: 文件名
+            content_type: 内容类型
+            
+        Returns:
+            包含文件信息的字典
+        """
+        try:
+            # 生成唯一的文件名
+            file_ext = os.path.splitext(file_name)[1]
+            file_name_without_ext = os.path.splitext(file_name)[0]
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            unique_id = str(uuid.uuid4())[:8]
+            final_file_name = f"{file_name_without_ext}_{timestamp}_{unique_id}{file_ext}"
+            
+            result = self.transfer.upload(stream, length, final_file_name, content_type)
+            
+            file_info = {
+                'file_name': final_file_name,
+                'original_name': file_name,
+                'file_size': length,
+                'etag': result.etag,
+                'version_id': result.version_id,
+                'upload_time': datetime.now().isoformat(),
+                'bucket_name': self.bucket_name,
+                'content_type': content_type
+            }
+            
+            logger.info(f"文件流上传成功: {final_file_name}")
+            return file_info
+            
+        except Exception as e:
+            logger.error(f"文件流上传失败: {e}")
+            raise
+    
+    @traced('minio')
     def download_file(self, file_name: str, local_path: str) -> bool:
         """
         从MinIO下载文件
@@ -168,17 +212,20 @@ class MinioService:
             是否下载成功
         """
         try:
-            self.client.fget_object(self.bucket_name, file_name, local_path)
+            self.transfer.download_to_file(file_name, local_path)
             logger.info(f"文件下载成功: {file_name} -> {local_path}")
             return True
         except Exception as e:
             logger.error(f"文件下载失败: {e}")
             return False
     
-    def get_file_data(self, file_name: str) -> Optional[bytes]:
+    @traced('minio')
+    def get_file_data(self, file_name: str) -> Optional[Union[bytearray, memoryview]]:
         """
         获取文件数据
         
+        优先读取本地磁盘缓存（mmap只读视图），未命中时并行分段下载到预分配缓冲区并写入缓存
+        
         Args:
             file_name: 文件名
             
@@ -186,16 +233,38 @@ class MinioService:
             文件数据
         """
         try:
-            response = self.client.get_object(self.bucket_name, file_name)
-            data = response.read()
-            response.close()
-            response.release_conn()
+            stat = None
+            if self.cache:
+                if OBJECT_CACHE_CONFIG['revalidate']:
+                    stat = self.transfer.stat(file_name)
+                cached = self.cache.get(file_name, stat.etag if stat else None)
+                if cached is not None:
+                    logger.info(f"获取文件数据成功（本地缓存）: {file_name}")
+                    return cached
+            
+            stat = stat or self.transfer.stat(file_name)
+            data = self.transfer.download(file_name, stat=stat)
+            if self.cache:
+                self.cache.put(file_name, stat.etag, data)
             logger.info(f"获取文件数据成功: {file_name}")
             return data
         except Exception as e:
             logger.error(f"获取文件数据失败: {e}")
             return None
     
+    def iter_file_data(self, file_name: str) -> Iterator[bytes]:
+        """
+        流式读取文件数据（按顺序产出分段，后台预取后续分段）
+        
+        Args:
+            file_name: 文件名
+            
+        Yields:
+            数据分段
+        """
+        return self.transfer.iter_object(file_name)
+    
+    @traced('minio')
     def delete_file(self, file_name: str) -> bool:
         """
         删除文件
@@ -208,12 +277,43 @@ class MinioService:
         """
         try:
             self.client.remove_object(self.bucket_name, file_name)
+            if self.cache:
+                self.cache.invalidate(file_name)
             logger.info(f"文件删除成功: {file_name}")
             return True
         except Exception as e:
             logger.error(f"文件删除失败: {e}")
             return False
     
+    @traced('minio')
+    def remove_files(self, file_names: List[str]) -> List[str]:
+        """
+        批量删除文件（每个请求最多1000个对象，由客户端自动分批）
+        
+        Args:
+            file_names: 文件名列表
+            
+        Returns:
+            删除失败的文件名列表（对象不存在不视为失败）
+        """
+        if not file_names:
+            return []
+        
+        failed = []
+        errors = self.client.remove_objects(self.bucket_name, (DeleteObject(name) for name in file_names))
+        # remove_objects惰性执行，必须遍历结果
+        for error in errors:
+            if error.code != 'NoSuchKey':
+                logger.error(f"批量删除对象失败: {error.name}, {error.code}: {error.message}")
+                failed.append(error.name)
+        
+        if self.cache:
+            for name in file_names:
+                self.cache.invalidate(name)
+        logger.info(f"批量删除文件完成: {len(file_names) - len(failed)}/{len(file_names)}")
+        return failed
+    
+    @traced('minio')
     def list_files(self, prefix: str = "") -> List[Dict[str, Any]]:
         """
         列出文件
@@ -243,6 +343,7 @@ class MinioService:
             logger.error(f"列出文件失败: {e}")
             return []
     
+    @traced('minio')
     def get_file_info(self, file_name: str) -> Optional[Dict[str, Any]]:
         """
         获取文件信息
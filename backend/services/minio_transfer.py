@@ -0,0 +1,263 @@
+"""
+MinIO传输管理
+大对象并发分片上传、并行分段下载（写入预分配缓冲区）和流式迭代读取
+下载按分段独立重试；上传只对可回退的数据流整体重试（重新上传整个对象），不支持单个分片重试，不可回退的数据流失败即报错
+客户端通过构造参数注入，可对接本地MinIO或兼容S3的替身服务（如moto server）
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config_rag import MINIO_TRANSFER_CONFIG
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('minio_transfer')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# S3分片上传的最小分片大小（最后一片除外）
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+class TransferManager:
+    """MinIO对象传输管理器"""
+
+    def __init__(self, client, bucket_name: str, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化传输管理器
+
+        Args:
+            client: minio.Minio客户端
+            bucket_name: 存储桶名称
+            config: 传输配置，默认使用MINIO_TRANSFER_CONFIG
+        """
+        self.client = client
+        self.bucket_name = bucket_name
+        self.config = dict(MINIO_TRANSFER_CONFIG)
+        if config:
+            self.config.update(config)
+        self.part_size = max(self.config['part_size'], MIN_PART_SIZE)
+        self.max_workers = self.config['max_workers']
+        self.multipart_threshold = max(self.config['multipart_threshold'], self.part_size)
+
+    def _retry(self, func: Callable, *args, description: str = '', **kwargs):
+        """按配置重试单个操作（指数退避）"""
+        attempts = self.config['max_retries'] + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= attempts:
+                    raise
+                delay = self.config['retry_backoff'] * (2 ** (attempt - 1))
+                logger.warning(f"{description}失败（第{attempt}次），{delay:.1f}秒后重试: {e}")
+                time.sleep(delay)
+
+    def _ranges(self, size: int) -> List[Tuple[int, int]]:
+        """按分片大小切分字节区间 [(offset, length), ...]"""
+        return [(offset, min(self.part_size, size - offset)) for offset in range(0, size, self.part_size)]
+
+    # ------------------------------------------------------------------
+    # 上传
+    # ------------------------------------------------------------------
+
+    def upload(self, stream: BinaryIO, length: int, object_name: str, content_type: str = None):
+        """
+        上传对象：数据流直接交给minio的put_object，小于阈值时单次上传，
+        否则按part_size分片、max_workers个分片并发上传
+
+        minio按顺序读取数据流，同时在途的分片不超过max_workers个，内存占用与对象大小无关；
+        失败时由minio取消分片上传，可定位的数据流回到起始位置整体重试
+
+        Args:
+            stream: 可读取的文件对象
+            length: 数据长度
+            object_name: 对象名称
+            content_type: 内容类型
+
+        Returns:
+            minio的ObjectWriteResult
+        """
+        content_type = content_type or 'application/octet-stream'
+        multipart = length > self.multipart_threshold
+        # 单次上传时分片大小取对象大小，minio不会再切分
+        part_size = self.part_size if multipart else max(length, MIN_PART_SIZE)
+        position = stream.tell() if stream.seekable() else None
+        start_time = time.time()
+
+        def put():
+            if position is not None:
+                stream.seek(position)
+            return self.client.put_object(
+                self.bucket_name, object_name, stream, length, content_type=content_type,
+                part_size=part_size, num_parallel_uploads=self.max_workers
+            )
+
+        if position is None:
+            result = put()
+        else:
+            result = self._retry(put, description=f"上传对象 {object_name} ")
+
+        if multipart:
+            elapsed = time.time() - start_time
+            logger.info(f"分片上传完成: {object_name}, {-(-length // part_size)}个分片, "
+                        f"{length / 1024 / 1024 / max(elapsed, 1e-6):.1f}MB/s")
+        return result
+
+    # ------------------------------------------------------------------
+    # 下载
+    # ------------------------------------------------------------------
+
+    def _read_range(self, object_name: str, offset: int, length: int, target: memoryview,
+                    version_id: Optional[str] = None):
+        """分段读取对象数据写入目标缓冲区（失败时整段重读）"""
+        response = self.client.get_object(self.bucket_name, object_name, offset=offset, length=length,
+                                          version_id=version_id)
+        try:
+            position = 0
+            for chunk in response.stream(256 * 1024):
+                target[position:position + len(chunk)] = chunk
+                position += len(chunk)
+            if position != length:
+                raise IOError(f"分段数据不完整: {object_name}@{offset} 期望{length}字节，实际{position}字节")
+        finally:
+            response.close()
+            response.release_conn()
+
+    def stat(self, object_name: str):
+        """获取对象信息（带重试）"""
+        return self._retry(self.client.stat_object, self.bucket_name, object_name,
+                           description=f"获取对象信息 {object_name} ")
+
+    def download(self, object_name: str, buffer: Optional[bytearray] = None, stat=None) -> bytearray:
+        """
+        下载整个对象：并行分段读取，直接写入预分配的缓冲区
+
+        Args:
+            object_name: 对象名称
+            buffer: 预分配的缓冲区（长度不小于对象大小），为空时自动分配
+            stat: 已获取的对象信息，为空时自动获取
+
+        Returns:
+            对象数据（bytearray）
+        """
+        stat = stat or self.stat(object_name)
+        size = stat.size
+        if buffer is None:
+            buffer = bytearray(size)
+        elif len(buffer) < size:
+            raise ValueError(f"缓冲区过小: {len(buffer)} < {size}")
+
+        target = memoryview(buffer)
+        ranges = self._ranges(size)
+        start_time = time.time()
+        try:
+            # 同一版本的各分段，避免下载期间对象被覆盖导致数据错位
+            tasks = [
+                (self._read_range, object_name, offset, length, target[offset:offset + length], stat.version_id)
+                for offset, length in ranges
+            ]
+            if len(tasks) <= 1:
+                for func, *args in tasks:
+                    self._retry(func, *args, description=f"下载对象 {object_name} ")
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = [
+                        executor.submit(self._retry, func, *args, description=f"下载分段 {object_name}@{args[1]} ")
+                        for func, *args in tasks
+                    ]
+                    for future in futures:
+                        future.result()
+        finally:
+            target.release()
+
+        elapsed = time.time() - start_time
+        logger.info(f"对象下载完成: {object_name}, {len(ranges)}个分段, "
+                    f"{size / 1024 / 1024 / max(elapsed, 1e-6):.1f}MB/s")
+        return buffer if len(buffer) == size else buffer[:size]
+
+    def download_to_file(self, object_name: str, file_path: str) -> int:
+        """
+        并行分段下载到本地文件（先写临时文件再原子替换）
+
+        Args:
+            object_name: 对象名称
+            file_path: 本地文件路径
+
+        Returns:
+            文件大小
+        """
+        stat = self.stat(object_name)
+        temp_path = f"{file_path}.part-{os.getpid()}-{threading.get_ident()}"
+        fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+
+        def fetch(offset: int, length: int):
+            part = bytearray(length)
+            target = memoryview(part)
+            try:
+                self._read_range(object_name, offset, length, target, stat.version_id)
+            finally:
+                target.release()
+            os.pwrite(fd, part, offset)
+
+        try:
+            os.ftruncate(fd, stat.size)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(self._retry, fetch, offset, length, description=f"下载分段 {object_name}@{offset} ")
+                    for offset, length in self._ranges(stat.size)
+                ]
+                for future in futures:
+                    future.result()
+            os.fsync(fd)
+        except Exception:
+            os.close(fd)
+            os.remove(temp_path)
+            raise
+        os.close(fd)
+        os.replace(temp_path, file_path)
+        return stat.size
+
+    def iter_object(self, object_name: str) -> Iterator[bytes]:
+        """
+        按顺序流式迭代对象数据，后台并行预取后续分段
+
+        同时预取的分段不超过max_workers个，消费方处理速度决定内存占用上限
+
+        Args:
+            object_name: 对象名称
+
+        Yields:
+            按顺序排列的数据分段
+        """
+        stat = self.stat(object_name)
+
+        def fetch(offset: int, length: int) -> bytes:
+            part = bytearray(length)
+            target = memoryview(part)
+            try:
+                self._read_range(object_name, offset, length, target, stat.version_id)
+            finally:
+                target.release()
+            return bytes(part)
+
+        ranges = deque(self._ranges(stat.size))
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while ranges or pending:
+                while ranges and len(pending) < self.max_workers:
+                    offset, length = ranges.popleft()
+                    pending.append(executor.submit(
+                        self._retry, fetch, offset, length, description=f"下载分段 {object_name}@{offset} "
+                    ))
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
@@ -0,0 +1,196 @@
+"""
+MinIO对象本地磁盘缓存
+按对象名称和ETag缓存对象内容，超出容量时按最近最少使用淘汰，写入先落临时文件再原子替换，
+读取通过mmap映射，热点知识文件的重复访问不再经过网络
+"""
+import os
+import mmap
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Union
+
+from config_rag import OBJECT_CACHE_CONFIG
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('object_cache')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+class ObjectDiskCache:
+    """对象内容的本地磁盘缓存"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存容量上限（字节）
+        """
+        self.cache_dir = cache_dir or OBJECT_CACHE_CONFIG['cache_dir']
+        self.max_bytes = max_bytes or OBJECT_CACHE_CONFIG['max_bytes']
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # 对象名称摘要 -> (ETag, 文件路径, 大小)，按访问时间从旧到新排列
+        self._entries: "OrderedDict[str, Tuple[str, str, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._load_index()
+
+    @staticmethod
+    def _object_key(object_name: str) -> str:
+        """对象名称摘要（用作文件名前缀）"""
+        return hashlib.sha1(object_name.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _safe_etag(etag: str) -> str:
+        """ETag转为可用于文件名的形式"""
+        return ''.join(ch for ch in (etag or '').strip('"') if ch.isalnum() or ch == '-') or 'none'
+
+    def _path(self, key: str, etag: str) -> str:
+        """缓存文件路径：按摘要前两位分目录"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}-{self._safe_etag(etag)}")
+
+    def _load_index(self):
+        """启动时扫描缓存目录重建索引，按文件修改时间恢复访问顺序"""
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if '.tmp-' in name:
+                    # 上次写入中断留下的临时文件
+                    os.remove(path)
+                    continue
+                key, _, etag = name.partition('-')
+                stat = os.stat(path)
+                found.append((stat.st_mtime, key, etag, path, stat.st_size))
+
+        for _, key, etag, path, size in sorted(found):
+            previous = self._entries.pop(key, None)
+            if previous:
+                # 同一对象的旧版本
+                self._total_bytes -= previous[2]
+                self._remove_file(previous[1])
+            self._entries[key] = (etag, path, size)
+            self._total_bytes += size
+
+        if self._entries:
+            logger.info(f"对象缓存索引已加载: {len(self._entries)}个对象, {self._total_bytes / 1024 / 1024:.1f}MB")
+        self._evict()
+
+    @staticmethod
+    def _remove_file(path: str):
+        """删除缓存文件（已映射的读取方不受影响）"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """超出容量时淘汰最久未访问的对象（调用方持有锁或处于初始化阶段）"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, (_, path, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._stats['evictions'] += 1
+            self._remove_file(path)
+
+    def get(self, object_name: str, etag: Optional[str] = None) -> Optional[memoryview]:
+        """
+        读取缓存
+
+        Args:
+            object_name: 对象名称
+            etag: 期望的ETag，为空时不校验版本
+
+        Returns:
+            对象内容的只读mmap视图，未命中时返回None
+        """
+        key = self._object_key(object_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (etag is not None and entry[0] != self._safe_etag(etag)):
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            path, size = entry[1], entry[2]
+
+        try:
+            # 持久化访问顺序，重启后仍按LRU淘汰
+            os.utime(path)
+            if size == 0:
+                return memoryview(b'')
+            with open(path, 'rb') as f:
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            with self._lock:
+                if self._entries.get(key, (None, None))[1] == path:
+                    self._total_bytes -= self._entries.pop(key)[2]
+            return None
+
+    def put(self, object_name: str, etag: str, data: Union[bytes, bytearray, memoryview]) -> bool:
+        """
+        写入缓存（先写临时文件再原子替换）
+
+        Args:
+            object_name: 对象名称
+            etag: 对象ETag
+            data: 对象内容
+
+        Returns:
+            是否写入
+        """
+        size = len(data)
+        if size > self.max_bytes:
+            return False
+
+        key = self._object_key(object_name)
+        path = self._path(key, etag)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"写入对象缓存失败: {object_name}, {e}")
+            self._remove_file(temp_path)
+            return False
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._total_bytes -= previous[2]
+                if previous[1] != path:
+                    self._remove_file(previous[1])
+            self._entries[key] = (self._safe_etag(etag), path, size)
+            self._total_bytes += size
+            self._evict()
+        return True
+
+    def invalidate(self, object_name: str):
+        """删除对象的缓存"""
+        key = self._object_key(object_name)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._total_bytes -= entry[2]
+                self._remove_file(entry[1])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'objects': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            })
+        return stats
@@ -0,0 +1,421 @@
+"""
+文档解析后端注册表
+按检测到的文件格式选择解析后端，所有后端直接解析内存数据流并逐页产出内容，不落地临时文件
+"""
+import io
+import os
+import re
+import zipfile
+import threading
+from typing import Dict, List, Any, Optional, Iterator, BinaryIO, Union
+
+from config_rag import PARSER_CONFIG
+from services.tabular_ingester import TabularIngester
+from services.encoding_detector import encoding_detector
+from services.upload_spool import BufferStream
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('parser_registry')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+Data = Union[bytes, bytearray, memoryview]
+
+class ParserBackend:
+    """
+    解析后端基类
+
+    子类声明支持的格式和开销特征，并实现iter_pages逐页产出内容。
+    每一页为 {'content': 文本, 'page': 页码, ...}，后端可附加sheet、row_start等定位信息。
+    """
+
+    name = 'base'
+    formats: tuple = ()
+    # cpu: light/heavy，决定调度时进入哪个并发池
+    # memory: streaming表示逐页读取，document表示需要整体载入文档结构
+    # throughput_mb_s: 粗略的解析吞吐，用于估算耗时
+    cost: Dict[str, Any] = {'cpu': 'light', 'memory': 'streaming', 'throughput_mb_s': 50}
+    # 解析时直接产出文档块（无需全文再分块）的后端实现iter_chunks
+    streams_chunks = False
+
+    def iter_pages(self, stream: BinaryIO, file_name: str) -> Iterator[Dict[str, Any]]:
+        """逐页产出解析内容"""
+        raise NotImplementedError
+
+    def iter_chunks(self, stream: BinaryIO, file_name: str,
+                    stats: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """逐个产出文档块（streams_chunks为True的后端实现）"""
+        raise NotImplementedError
+
+    def extract_metadata(self, stream: BinaryIO, file_name: str) -> Dict[str, Any]:
+        """提取文档元数据（至少包含has_content）"""
+        return {'has_content': True}
+
+    def parse(self, stream: BinaryIO, file_name: str) -> Dict[str, Any]:
+        """
+        解析完整文档
+
+        Returns:
+            {'content', 'pages', 'chunks'(可选), 'metadata'}
+        """
+        pages = [page for page in self.iter_pages(stream, file_name) if page['content']]
+        return {
+            'content': '\n\n'.join(page['content'] for page in pages),
+            'pages': len(pages),
+            'metadata': {}
+        }
+
+    def estimate_seconds(self, size: int) -> float:
+        """按声明的吞吐估算解析耗时"""
+        return size / (self.cost['throughput_mb_s'] * 1024 * 1024)
+
+class PdfParserBackend(ParserBackend):
+    """PDF解析后端（PyPDF2逐页提取文本）"""
+
+    name = 'pdf'
+    formats = ('pdf',)
+    cost = {'cpu': 'heavy', 'memory': 'streaming', 'throughput_mb_s': 2}
+
+    def iter_pages(self, stream, file_name):
+        import PyPDF2
+
+        pdf_reader = PyPDF2.PdfReader(stream)
+        for page_num, page in enumerate(pdf_reader.pages):
+            page_text = page.extract_text() or ''
+            if page_text.strip():
+                yield {'content': f"第{page_num + 1}页:\n{page_text}", 'page': page_num + 1}
+
+    def extract_metadata(self, stream, file_name):
+        import PyPDF2
+
+        pdf_reader = PyPDF2.PdfReader(stream)
+        metadata = {
+            'page_count': len(pdf_reader.pages),
+            'has_content': len(pdf_reader.pages) > 0
+        }
+
+        # 提取PDF信息
+        if pdf_reader.metadata:
+            info = pdf_reader.metadata
+            for key in ('title', 'author', 'subject', 'creator'):
+                value = info.get(f'/{key.capitalize()}')
+                if value:
+                    metadata[key] = value
+        return metadata
+
+class DocxParserBackend(ParserBackend):
+    """Word（docx）解析后端：正文为第一页，每个表格为单独一页"""
+
+    name = 'docx'
+    formats = ('docx',)
+    cost = {'cpu': 'light', 'memory': 'document', 'throughput_mb_s': 10}
+
+    def iter_pages(self, stream, file_name):
+        from docx import Document
+
+        doc = Document(stream)
+        paragraphs = [paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()]
+        if paragraphs:
+            yield {'content': '\n\n'.join(paragraphs), 'page': 1, 'section': 'body'}
+
+        for table_index, table in enumerate(doc.tables, start=1):
+            table_content = []
+            for row in table.rows:
+                row_content = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+                if row_content:
+                    table_content.append(' | '.join(row_content))
+            if table_content:
+                yield {'content': '\n'.join(table_content), 'page': table_index + 1, 'section': f'table_{table_index}'}
+
+    def extract_metadata(self, stream, file_name):
+        from docx import Document
+
+        doc = Document(stream)
+        metadata = {
+            'paragraph_count': len(doc.paragraphs),
+            'table_count': len(doc.tables),
+            'image_count': sum(1 for rel in doc.part.rels.values() if "image" in rel.reltype),
+            'has_content': len(doc.paragraphs) > 0 or len(doc.tables) > 0
+        }
+
+        # 提取核心属性
+        core_props = doc.core_properties
+        for key in ('title', 'author', 'subject'):
+            value = getattr(core_props, key)
+            if value:
+                metadata[key] = value
+        if core_props.created:
+            metadata['created'] = core_props.created.isoformat()
+        if core_props.modified:
+            metadata['modified'] = core_props.modified.isoformat()
+        return metadata
+
+class DocParserBackend(ParserBackend):
+    """旧版Word（doc）解析后端（mammoth）"""
+
+    name = 'doc'
+    formats = ('doc',)
+    cost = {'cpu': 'heavy', 'memory': 'document', 'throughput_mb_s': 5}
+
+    def iter_pages(self, stream, file_name):
+        import mammoth
+
+        text = mammoth.extract_raw_text(stream).value
+        if text:
+            yield {'content': text, 'page': 1}
+
+class TextParserBackend(ParserBackend):
+    """纯文本/Markdown解析后端：前缀采样检测编码后只解码一次"""
+
+    name = 'text'
+    formats = ('txt', 'md')
+    cost = {'cpu': 'light', 'memory': 'streaming', 'throughput_mb_s': 200}
+
+    def iter_pages(self, stream, file_name):
+        text, _ = encoding_detector.decode(stream.getbuffer() if hasattr(stream, 'getbuffer') else stream.read())
+        if text:
+            yield {'content': text, 'page': 1}
+
+    def extract_metadata(self, stream, file_name):
+        metadata = {'has_content': True}
+        if file_name.lower().endswith('.md'):
+            text = next(self.iter_pages(stream, file_name), {'content': ''})['content']
+            titles = re.findall(r'^#{1,6}\s+(.+)$', text, re.MULTILINE)
+            metadata.update({'titles': titles, 'title_count': len(titles)})
+        return metadata
+
+class TabularParserBackend(ParserBackend):
+    """表格解析后端：每个带表头的行组为一页，可直接作为文档块"""
+
+    name = 'tabular'
+    formats = ('xlsx', 'xls', 'csv')
+    cost = {'cpu': 'light', 'memory': 'streaming', 'throughput_mb_s': 20}
+    streams_chunks = True
+
+    def __init__(self, ingester: Optional[TabularIngester] = None):
+        self.ingester = ingester or TabularIngester()
+
+    def iter_pages(self, stream, file_name):
+        for chunk in self.ingester.iter_chunks(stream, file_name):
+            yield {
+                'content': chunk['content'],
+                'page': chunk['chunk_index'] + 1,
+                'sheet': chunk['sheet'],
+                'row_start': chunk['row_start'],
+                'row_end': chunk['row_end']
+            }
+
+    def iter_chunks(self, stream, file_name, stats=None):
+        return self.ingester.iter_chunks(stream, file_name, stats=stats)
+
+    def parse(self, stream, file_name):
+        stats: Dict[str, Any] = {}
+        contents = [chunk['content'] for chunk in self.ingester.iter_chunks(stream, file_name, stats=stats)]
+        return {
+            'content': '\n\n'.join(contents),
+            'pages': len(contents),
+            'metadata': stats
+        }
+
+    def extract_metadata(self, stream, file_name):
+        file_ext = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if file_ext == 'xlsx':
+            import openpyxl
+
+            workbook = openpyxl.load_workbook(stream, read_only=True)
+            sheet_names = workbook.sheetnames
+            workbook.close()
+        elif file_ext == 'xls':
+            import pandas as pd
+
+            # 只读取工作表名称，不解析表格内容
+            sheet_names = pd.ExcelFile(stream, engine='xlrd').sheet_names
+        else:
+            return {'has_content': True}
+        return {
+            'sheet_count': len(sheet_names),
+            'sheet_names': sheet_names,
+            'has_content': len(sheet_names) > 0
+        }
+
+class ParserRegistry:
+    """解析后端注册表"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化注册表
+
+        Args:
+            config: 调度配置，默认使用PARSER_CONFIG
+        """
+        self.config = dict(PARSER_CONFIG)
+        if config:
+            self.config.update(config)
+        self._backends: Dict[str, ParserBackend] = {}
+        # 按开销等级限制并发，避免多个PDF同时解析占满CPU
+        self._slots = {
+            'heavy': threading.BoundedSemaphore(self.config['heavy_concurrency']),
+            'light': threading.BoundedSemaphore(self.config['light_concurrency'])
+        }
+
+    @classmethod
+    def default(cls) -> 'ParserRegistry':
+        """创建注册了全部内置后端的注册表"""
+        registry = cls()
+        for backend in (PdfParserBackend(), DocxParserBackend(), DocParserBackend(),
+                        TextParserBackend(), TabularParserBackend()):
+            registry.register(backend)
+        return registry
+
+    def register(self, backend: ParserBackend):
+        """注册解析后端（同一格式后注册的覆盖先注册的）"""
+        for fmt in backend.formats:
+            self._backends[fmt] = backend
+
+    @property
+    def supported_formats(self) -> List[str]:
+        """支持的格式（不带点号的扩展名）"""
+        return sorted(self._backends)
+
+    def supports(self, file_name: str) -> bool:
+        """按扩展名判断是否支持"""
+        return os.path.splitext(file_name)[1].lower().lstrip('.') in self._backends
+
+    def detect_format(self, data: Data, file_name: str) -> str:
+        """
+        检测文件格式：二进制格式以文件头为准，文本格式以扩展名为准
+
+        Args:
+            data: 文件数据
+            file_name: 文件名
+
+        Returns:
+            格式名称（不带点号的扩展名）
+        """
+        file_ext = os.path.splitext(file_name)[1].lower().lstrip('.')
+        head = bytes(data[:8])
+
+        if head.startswith(b'%PDF'):
+            return 'pdf'
+        if head.startswith(b'PK\x03\x04'):
+            try:
+                # 只读取ZIP中央目录
+                names = zipfile.ZipFile(self._stream(data)).namelist()
+                if 'word/document.xml' in names:
+                    return 'docx'
+                if any(name.startswith('xl/') for name in names):
+                    return 'xlsx'
+            except zipfile.BadZipFile:
+                pass
+        # OLE复合文档无法仅凭文件头区分doc和xls，沿用扩展名
+        return file_ext
+
+    def get_backend(self, fmt: str) -> ParserBackend:
+        """获取格式对应的解析后端"""
+        backend = self._backends.get(fmt)
+        if backend is None:
+            raise ValueError(f"不支持的文件类型: {fmt}")
+        return backend
+
+    def _stream(self, data: Data) -> BinaryIO:
+        """包装为内存数据流（memoryview和bytearray不复制底层数据）"""
+        if isinstance(data, (memoryview, bytearray)):
+            return BufferStream(data)
+        return io.BytesIO(data)
+
+    def _throttled(self, backend: ParserBackend, items: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        按开销等级限流迭代解析结果
+
+        只在解析后端产出每一项时占用并发槽位，产出后立即释放，
+        调用方处理该项（向量化、写库等）期间不占用解析槽位。
+
+        Args:
+            backend: 解析后端
+            items: 后端返回的迭代器
+
+        Yields:
+            解析结果
+        """
+        slot = self._slots[backend.cost['cpu']]
+        items = iter(items)
+        try:
+            while True:
+                with slot:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            # 调用方提前结束迭代时关闭后端生成器，释放其持有的文件句柄
+            close = getattr(items, 'close', None)
+            if close:
+                close()
+
+    def iter_pages(self, data: Data, file_name: str) -> Iterator[Dict[str, Any]]:
+        """
+        逐页解析文档
+
+        Args:
+            data: 文件数据
+            file_name: 文件名
+
+        Yields:
+            页内容字典
+        """
+        backend = self.get_backend(self.detect_format(data, file_name))
+        yield from self._throttled(backend, backend.iter_pages(self._stream(data), file_name))
+
+    def streams_chunks(self, data: Data, file_name: str) -> bool:
+        """解析后端是否直接产出文档块（表格文件）"""
+        return self.get_backend(self.detect_format(data, file_name)).streams_chunks
+
+    def iter_chunks(self, data: Data, file_name: str,
+                    stats: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐个产出文档块，不生成全文（仅streams_chunks为True的格式）
+
+        Args:
+            data: 文件数据
+            file_name: 文件名
+            stats: 可选的统计字典，由解析后端在迭代过程中更新
+
+        Yields:
+            文档块字典
+        """
+        backend = self.get_backend(self.detect_format(data, file_name))
+        yield from self._throttled(backend, backend.iter_chunks(self._stream(data), file_name, stats))
+
+    def parse(self, data: Data, file_name: str) -> Dict[str, Any]:
+        """
+        解析完整文档
+
+        Args:
+            data: 文件数据
+            file_name: 文件名
+
+        Returns:
+            {'format', 'backend', 'content', 'pages', 'metadata', 'cost'}
+        """
+        fmt = self.detect_format(data, file_name)
+        backend = self.get_backend(fmt)
+        with self._slots[backend.cost['cpu']]:
+            result = backend.parse(self._stream(data), file_name)
+        result.update({'format': fmt, 'backend': backend.name, 'cost': backend.cost})
+        return result
+
+    def extract_metadata(self, data: Data, file_name: str) -> Dict[str, Any]:
+        """提取文档元数据"""
+        fmt = self.detect_format(data, file_name)
+        return self.get_backend(fmt).extract_metadata(self._stream(data), file_name)
+
+    def estimate_seconds(self, data: Data, file_name: str) -> float:
+        """估算解析耗时（秒）"""
+        return self.get_backend(self.detect_format(data, file_name)).estimate_seconds(len(data))
+
+# 全局解析注册表实例
+parser_registry = ParserRegistry.default()
@@ -0,0 +1,301 @@
+"""
+向量重建任务
+嵌入模型升级时，将现有文档块批量重新向量化到影子集合，完成后原子切换
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from config_rag import REEMBED_CONFIG
+from utils.file_lock import file_lock
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('reembedding_job')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+class ReembeddingJob:
+    """嵌入模型迁移任务（支持进度查询、限流和断点续传）"""
+
+    def __init__(self, vector_service, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化迁移任务
+
+        Args:
+            vector_service: VectorService实例
+            config: 迁移配置，默认使用REEMBED_CONFIG
+        """
+        self.vector_service = vector_service
+        self.config = dict(REEMBED_CONFIG)
+        if config:
+            self.config.update(config)
+
+        self.state_file = os.path.join(vector_service.persist_directory, self.config['state_file'])
+        self.state: Dict[str, Any] = self._load_state()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._cleanup_timer: Optional[threading.Timer] = None
+        self._schedule_cleanup()
+
+    def _load_state(self) -> Dict[str, Any]:
+        """读取断点状态"""
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"读取向量重建状态失败: {e}")
+            return {}
+
+    def _save_state(self):
+        """原子写入断点状态"""
+        self.state['updated_at'] = datetime.now().isoformat()
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.state_file)
+
+    def is_running(self) -> bool:
+        """任务是否正在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, target_model: str, batch_size: Optional[int] = None,
+              max_chunks_per_sec: Optional[float] = None) -> Dict[str, Any]:
+        """
+        启动（或恢复）迁移任务
+
+        同一目标模型存在未完成的任务时，从上次的断点继续
+
+        Args:
+            target_model: 新嵌入模型的名称或本地路径
+            batch_size: 每批处理的文档块数量
+            max_chunks_per_sec: 限流速率，0表示不限制
+
+        Returns:
+            任务状态
+        """
+        with self._lock:
+            if self.is_running():
+                return {'success': False, 'error': '向量重建任务正在运行', 'progress': self.get_progress()}
+
+            resumable = (self.state.get('status') in ('running', 'failed', 'stopped')
+                         and self.state.get('target_model') == target_model
+                         and self.state.get('source_collection') == self.vector_service.collection_name)
+
+            if not resumable:
+                job_id = uuid.uuid4().hex[:8]
+                self.state = {
+                    'job_id': job_id,
+                    'source_collection': self.vector_service.collection_name,
+                    'shadow_collection': f"{self.vector_service.collection_name.split('__')[0]}__{job_id}",
+                    'target_model': target_model,
+                    'offset': 0,
+                    'processed': 0,
+                    'total': self.vector_service.collection.count(),
+                    'started_at': datetime.now().isoformat(),
+                    'elapsed_seconds': 0.0,
+                    'error': None
+                }
+
+            self.state['status'] = 'running'
+            self.state['batch_size'] = batch_size or self.state.get('batch_size') or self.config['batch_size']
+            self.state['max_chunks_per_sec'] = (self.config['max_chunks_per_sec']
+                                                if max_chunks_per_sec is None else max_chunks_per_sec)
+            self._save_state()
+
+            # 复制开始前记录源集合的变化，切换前重放到影子集合
+            self.vector_service.stats_store.start_tracking(self.state['source_collection'])
+
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+        logger.info(f"向量重建任务已{'恢复' if resumable else '启动'}: {self.state['job_id']}, 目标模型: {target_model}")
+        return {'success': True, 'resumed': resumable, 'progress': self.get_progress()}
+
+    def stop(self) -> Dict[str, Any]:
+        """请求停止任务（当前批次完成后停止，可稍后恢复）"""
+        self._stop_event.set()
+        return {'success': True, 'progress': self.get_progress()}
+
+    def get_progress(self) -> Dict[str, Any]:
+        """获取任务进度"""
+        if not self.state:
+            return {'status': 'idle'}
+
+        processed = self.state.get('processed', 0)
+        total = self.state.get('total', 0)
+        elapsed = self.state.get('elapsed_seconds', 0.0)
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, total - processed)
+
+        progress = {k: v for k, v in self.state.items()}
+        progress.update({
+            'percent': round(processed * 100 / total, 2) if total else 100.0,
+            'chunks_per_sec': round(rate, 2),
+            'eta_seconds': int(remaining / rate) if rate > 0 else None,
+            'target_chunks_per_sec': self.config['target_chunks_per_sec'],
+            'below_target': bool(processed) and rate < self.config['target_chunks_per_sec']
+        })
+        return progress
+
+    def _embed_and_write(self, shadow, model, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """对一批文档块重新向量化并写入影子集合（upsert保证重复写入幂等）"""
+        embeddings = model.encode(documents, batch_size=min(len(documents), 64), show_progress_bar=False).tolist()
+        shadow.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def _throttle(self, batch_count: int, batch_started: float):
+        """按限流速率等待"""
+        max_rate = self.state.get('max_chunks_per_sec') or 0
+        if max_rate > 0:
+            min_duration = batch_count / max_rate
+            elapsed = time.time() - batch_started
+            if elapsed < min_duration:
+                self._stop_event.wait(min_duration - elapsed)
+
+    def _list_ids(self, collection) -> set:
+        """分页读取集合中的全部ID（不读取文档和向量）"""
+        ids = set()
+        offset = 0
+        batch_size = self.state['batch_size'] * 4
+        while True:
+            page = collection.get(limit=batch_size, offset=offset, include=[])
+            if not page['ids']:
+                break
+            ids.update(page['ids'])
+            offset += len(page['ids'])
+        return ids
+
+    def _replay_changes(self, source, shadow, model) -> int:
+        """将迁移期间源集合中发生变化（新增、删除、内容或元数据修改）的文件整体重新写入影子集合"""
+        stats_store = self.vector_service.stats_store
+        changes = stats_store.get_changes(self.state['source_collection'])
+        batch_size = self.state['batch_size']
+        for file_id in changes:
+            shadow.delete(where={"file_id": file_id})
+            page = source.get(where={"file_id": file_id}, include=["documents", "metadatas"])
+            for i in range(0, len(page['ids']), batch_size):
+                self._embed_and_write(shadow, model, page['ids'][i:i + batch_size],
+                                      page['documents'][i:i + batch_size], page['metadatas'][i:i + batch_size])
+        stats_store.remove_changes(self.state['source_collection'], changes)
+        if changes:
+            logger.info(f"向量重建任务重放 {len(changes)} 个文件的变更")
+        return len(changes)
+
+    def _schedule_cleanup(self):
+        """按配置延迟删除切换前的旧集合（延迟期间其他进程完成跟随切换）"""
+        if (self.state.get('status') != 'completed' or not self.state.get('previous_collection')
+                or self.state.get('previous_dropped') or self.config['drop_previous_after'] < 0):
+            return
+        delay = max(0.0, self.state.get('drop_previous_at', 0) - time.time())
+        self._cleanup_timer = threading.Timer(delay, self._drop_previous_collection)
+        self._cleanup_timer.daemon = True
+        self._cleanup_timer.start()
+
+    def _drop_previous_collection(self):
+        """删除旧集合及其统计"""
+        previous = self.state.get('previous_collection')
+        if not previous or previous == self.vector_service.collection_name:
+            return
+        try:
+            self.vector_service.client.delete_collection(previous)
+            logger.info(f"已删除迁移前的旧集合: {previous}")
+        except Exception as e:
+            # 其他进程已删除时同样视为完成
+            logger.warning(f"删除旧集合失败: {previous}: {e}")
+        self.vector_service.stats_store.clear(previous)
+        self.state['previous_dropped'] = True
+        self._save_state()
+
+    def _run(self):
+        """迁移主流程"""
+        run_started = time.time()
+        elapsed_before = self.state.get('elapsed_seconds', 0.0)
+        try:
+            source = self.vector_service.collection
+            model = self.vector_service.load_embedding_model(self.state['target_model'])
+            shadow = self.vector_service.client.get_or_create_collection(
+                name=self.state['shadow_collection'],
+                metadata={"description": "知识库文档块向量存储"}
+            )
+            batch_size = self.state['batch_size']
+
+            # 1. 分页流式读取源集合，批量向量化写入影子集合
+            while not self._stop_event.is_set():
+                batch_started = time.time()
+                page = source.get(
+                    limit=batch_size,
+                    offset=self.state['offset'],
+                    include=["documents", "metadatas"]
+                )
+                if not page['ids']:
+                    break
+
+                self._embed_and_write(shadow, model, page['ids'], page['documents'], page['metadatas'])
+
+                self.state['offset'] += len(page['ids'])
+                self.state['processed'] = self.state['offset']
+                self.state['elapsed_seconds'] = elapsed_before + time.time() - run_started
+                self._save_state()
+
+                self._throttle(len(page['ids']), batch_started)
+
+            if self._stop_event.is_set():
+                self.state['status'] = 'stopped'
+                self._save_state()
+                logger.info(f"向量重建任务已停止，可稍后恢复: {self.state['job_id']}")
+                return
+
+            # 2. 补齐迁移期间源集合的增删（按ID比对）
+            source_ids = self._list_ids(source)
+            shadow_ids = self._list_ids(shadow)
+            missing_ids = list(source_ids - shadow_ids)
+            stale_ids = list(shadow_ids - source_ids)
+            for i in range(0, len(missing_ids), batch_size):
+                page = source.get(ids=missing_ids[i:i + batch_size], include=["documents", "metadatas"])
+                if page['ids']:
+                    self._embed_and_write(shadow, model, page['ids'], page['documents'], page['metadatas'])
+            if stale_ids:
+                shadow.delete(ids=stale_ids)
+
+            self.state['total'] = len(source_ids)
+            self.state['processed'] = len(source_ids)
+            self.state['elapsed_seconds'] = elapsed_before + time.time() - run_started
+
+            # 3. 补齐复制期间内容或元数据发生变化的文件（不持锁，缩短切换时的阻塞时间）
+            self._replay_changes(source, shadow, model)
+
+            # 4. 持有排他写入锁（所有进程的写入在此期间阻塞）：重放最后的变更后原子切换当前集合
+            with file_lock(self.vector_service.write_lock_file):
+                self._replay_changes(source, shadow, model)
+                if not self.vector_service.switch_collection(self.state['shadow_collection'], self.state['target_model'], model):
+                    raise RuntimeError('切换集合失败')
+            self.vector_service.stats_store.stop_tracking(self.state['source_collection'])
+
+            self.state['status'] = 'completed'
+            self.state['completed_at'] = datetime.now().isoformat()
+            self.state['previous_collection'] = self.state['source_collection']
+            self.state['drop_previous_at'] = time.time() + max(0, self.config['drop_previous_after'])
+            self._save_state()
+            self._schedule_cleanup()
+
+            progress = self.get_progress()
+            logger.info(f"向量重建任务完成: {self.state['job_id']}, 共 {progress['processed']} 个文档块, "
+                        f"{progress['chunks_per_sec']} 块/秒")
+
+        except Exception as e:
+            logger.error(f"向量重建任务失败: {e}")
+            self.state['status'] = 'failed'
+            self.state['error'] = str(e)
+            self.state['elapsed_seconds'] = elapsed_before + time.time() - run_started
+            self._save_state()
@@ -0,0 +1,194 @@
+"""
+重排序服务
+使用本地多语言Cross-Encoder对向量检索结果进行重排序
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+from config_rag import RERANK_CONFIG
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('rerank_service')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+class RerankService:
+    """Cross-Encoder重排序服务"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化重排序服务
+
+        Args:
+            config: 重排序配置，默认使用RERANK_CONFIG
+        """
+        self.config = dict(RERANK_CONFIG)
+        if config:
+            self.config.update(config)
+
+        self.batch_size = max(1, self.config['batch_size'])
+        self.latency_budget_ms = self.config['latency_budget_ms']
+        self.top_n = self.config['top_n']
+
+        # 模型在后台线程中加载，加载完成前的请求回退到向量检索顺序，不占用请求的延迟预算
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._loading = False
+
+        # 重排序分数缓存: (query, chunk_id) -> score
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_size = self.config['cache_size']
+        self._cache_lock = threading.Lock()
+
+        if self.config['enabled']:
+            self.warm_up()
+
+        logger.info("重排序服务初始化成功")
+
+    def warm_up(self):
+        """在后台线程中加载Cross-Encoder模型（已加载或正在加载时直接返回）"""
+        with self._model_lock:
+            if self._model is not None or self._loading:
+                return
+            self._loading = True
+        loader = threading.Thread(target=self._load_model, name='rerank-model-loader')
+        loader.daemon = True
+        loader.start()
+
+    def _load_model(self):
+        """加载Cross-Encoder模型（失败时下次请求重新尝试）"""
+        try:
+            from sentence_transformers import CrossEncoder
+
+            model_path = self.config['model_path']
+            if os.path.exists(model_path):
+                model = CrossEncoder(model_path, max_length=512)
+                logger.info(f"使用本地重排序模型: {model_path}")
+            else:
+                model = CrossEncoder(self.config['model_name'], max_length=512)
+                logger.info(f"使用在线重排序模型: {self.config['model_name']}")
+            self._model = model
+        except Exception as e:
+            logger.error(f"重排序模型加载失败: {e}")
+        finally:
+            with self._model_lock:
+                self._loading = False
+
+    def _get_model(self):
+        """获取已加载的Cross-Encoder模型，未加载时触发后台加载并返回None"""
+        if self._model is None:
+            self.warm_up()
+        return self._model
+
+    def _get_cached_score(self, key: Tuple[str, str]) -> Optional[float]:
+        """读取缓存的重排序分数"""
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _set_cached_scores(self, items: List[Tuple[Tuple[str, str], float]]):
+        """写入重排序分数缓存（LRU淘汰）"""
+        with self._cache_lock:
+            for key, score in items:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query: str, chunks: List[Dict[str, Any]], top_n: Optional[int] = None,
+               latency_budget_ms: Optional[int] = None) -> Dict[str, Any]:
+        """
+        对检索结果进行重排序
+
+        Args:
+            query: 查询文本
+            chunks: search_similar_chunks返回的文档块列表（按向量距离排序）
+            top_n: 保留的文档块数量
+            latency_budget_ms: 本次请求的延迟预算（毫秒），超出时回退到向量检索顺序
+
+        Returns:
+            {'chunks': 文档块列表, 'reranked': 是否完成重排序, 'elapsed_ms': 耗时, ...}
+        """
+        top_n = top_n or self.top_n
+        budget_ms = self.latency_budget_ms if latency_budget_ms is None else latency_budget_ms
+        start_time = time.time()
+
+        if not chunks:
+            return {'chunks': [], 'reranked': False, 'elapsed_ms': 0, 'cache_hits': 0}
+
+        # 1. 读取缓存分数，收集需要推理的候选
+        scores: List[Optional[float]] = []
+        pending: List[int] = []
+        for i, chunk in enumerate(chunks):
+            score = self._get_cached_score((query, chunk.get('id', '')))
+            scores.append(score)
+            if score is None:
+                pending.append(i)
+        cache_hits = len(chunks) - len(pending)
+
+        # 2. 分批推理，每批完成后检查延迟预算
+        fallback_reason = None
+        try:
+            model = self._get_model() if pending else None
+            if pending and model is None:
+                fallback_reason = '重排序模型尚未加载完成'
+                pending = []
+            for batch_start in range(0, len(pending), self.batch_size):
+                batch = pending[batch_start:batch_start + self.batch_size]
+                pairs = [(query, chunks[i]['content']) for i in batch]
+                batch_scores = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+                cache_items = []
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+                    if chunks[i].get('id'):
+                        cache_items.append(((query, chunks[i]['id']), float(score)))
+                self._set_cached_scores(cache_items)
+
+                elapsed_ms = (time.time() - start_time) * 1000
+                if elapsed_ms > budget_ms:
+                    fallback_reason = f'超出延迟预算: {elapsed_ms:.0f}ms > {budget_ms}ms'
+                    break
+        except Exception as e:
+            fallback_reason = f'重排序模型推理失败: {e}'
+
+        elapsed_ms = int((time.time() - start_time) * 1000)
+
+        # 3. 未能在预算内完成全部打分时，保持向量检索顺序
+        if fallback_reason or any(score is None for score in scores):
+            logger.warning(f"重排序回退到向量检索顺序: {fallback_reason}")
+            return {
+                'chunks': chunks[:top_n],
+                'reranked': False,
+                'elapsed_ms': elapsed_ms,
+                'cache_hits': cache_hits,
+                'fallback_reason': fallback_reason
+            }
+
+        order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+        reranked_chunks = []
+        for i in order[:top_n]:
+            chunk = dict(chunks[i])
+            chunk['rerank_score'] = scores[i]
+            reranked_chunks.append(chunk)
+
+        logger.info(f"重排序完成: {len(chunks)} -> {len(reranked_chunks)} 个文档块, 耗时: {elapsed_ms}ms, 缓存命中: {cache_hits}")
+        return {
+            'chunks': reranked_chunks,
+            'reranked': True,
+            'elapsed_ms': elapsed_ms,
+            'cache_hits': cache_hits
+        }
+
+    def clear_cache(self):
+        """清空重排序分数缓存"""
+        with self._cache_lock:
+            self._cache.clear()
@@ -0,0 +1,167 @@
+"""
+检索日志异步写入服务
+检索日志先进入有界环形缓冲区，由后台线程按数量或时间触发多行批量写入数据库
+"""
+import json
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from config_rag import RETRIEVAL_LOG_CONFIG
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('retrieval_log_writer')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+class RetrievalLogWriter:
+    """非阻塞的检索日志批量写入器"""
+
+    def __init__(self, db_model, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化写入器
+
+        Args:
+            db_model: 知识库数据库模型（提供_get_connection）
+            config: 写入配置，默认使用RETRIEVAL_LOG_CONFIG
+        """
+        self.db_model = db_model
+        self.config = dict(RETRIEVAL_LOG_CONFIG)
+        if config:
+            self.config.update(config)
+
+        self._buffer: deque = deque(maxlen=self.config['buffer_size'])
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._flush_lock = threading.Lock()
+
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'last_flush_at': None
+        }
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def compact_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """只保留文档块ID和得分"""
+        compact = []
+        for chunk in chunks or []:
+            metadata = chunk.get('metadata') or {}
+            chunk_id = chunk.get('id') or f"{metadata.get('file_id', '')}_chunk_{metadata.get('chunk_index', 0)}"
+            score = chunk.get('similarity_score', chunk.get('rerank_score', chunk.get('distance')))
+            compact.append({'id': chunk_id, 'score': round(float(score), 6) if score is not None else None})
+        return compact
+
+    def log(self, record: Dict[str, Any]):
+        """
+        记录一条检索日志（不阻塞调用方）
+
+        Args:
+            record: {'query_text', 'retrieved_chunks', 'document_type', 'response_time_ms'}
+        """
+        entry = (
+            record.get('query_text', ''),
+            json.dumps(self.compact_chunks(record.get('retrieved_chunks')), ensure_ascii=False),
+            record.get('document_type', 'knowledge_base'),
+            int(record.get('response_time_ms', 0))
+        )
+        with self._condition:
+            # 缓冲区已满时覆盖最旧的记录，仅计数不阻塞
+            if len(self._buffer) == self._buffer.maxlen:
+                self._stats['dropped'] += 1
+            self._buffer.append(entry)
+            self._stats['enqueued'] += 1
+            if len(self._buffer) >= self.config['batch_size']:
+                self._condition.notify()
+
+    def _run(self):
+        """后台写入循环：达到批量大小或超过写入间隔时写入"""
+        while not self._stop_event.is_set():
+            with self._condition:
+                if len(self._buffer) < self.config['batch_size']:
+                    self._condition.wait(self.config['flush_interval'])
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        将缓冲区中的日志批量写入数据库
+
+        Returns:
+            写入的记录数
+        """
+        # 串行化写入：对账调用flush时会等待后台线程正在写入的批次提交完成
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        """取出缓冲区并写入数据库（调用方持有_flush_lock）"""
+        with self._condition:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        if not batch:
+            return 0
+
+        written = 0
+        conn = None
+        try:
+            conn = self.db_model._get_connection()
+            cursor = conn.cursor()
+            batch_size = self.config['batch_size']
+            for i in range(0, len(batch), batch_size):
+                # mysql-connector会将INSERT的executemany改写为单条多行INSERT
+                cursor.executemany(
+                    f"INSERT INTO {self.config['table']} "
+                    "(query_text, retrieved_chunks, document_type, response_time_ms) "
+                    "VALUES (%s, %s, %s, %s)",
+                    batch[i:i + batch_size]
+                )
+                written += len(batch[i:i + batch_size])
+            conn.commit()
+            cursor.close()
+        except Exception as e:
+            logger.error(f"批量写入检索日志失败: {e}")
+            written = 0
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+        finally:
+            if conn:
+                conn.close()
+
+        with self._condition:
+            self._stats['written'] += written
+            self._stats['failed'] += len(batch) - written
+            self._stats['last_flush_at'] = datetime.now().isoformat()
+        return written
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取写入统计"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._buffer)
+            stats['buffer_size'] = self._buffer.maxlen
+        return stats
+
+    def close(self):
+        """停止后台线程并写入剩余日志"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        self._thread.join(timeout=5)
+        self.flush()
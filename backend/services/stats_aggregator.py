@@ -0,0 +1,217 @@
+"""
+知识库统计聚合服务
+根据入库和检索事件实时维护计数，并定期在后台与MinIO、ChromaDB和检索日志对账
+"""
+import copy
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from config_rag import STATS_CONFIG
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('stats_aggregator')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+class StatsAggregator:
+    """知识库统计聚合器"""
+
+    def __init__(self, minio_service, vector_service, db_model, reconcile_interval: Optional[int] = None,
+                 log_writer=None):
+        """
+        初始化统计聚合器
+
+        Args:
+            minio_service: MinioService实例
+            vector_service: VectorService实例
+            db_model: 知识库数据库模型
+            reconcile_interval: 后台对账间隔（秒）
+            log_writer: 可选的RetrievalLogWriter，对账前先写入其缓冲的检索日志
+        """
+        self.minio_service = minio_service
+        self.vector_service = vector_service
+        self.db_model = db_model
+        self.log_writer = log_writer
+        self.reconcile_interval = reconcile_interval or STATS_CONFIG['reconcile_interval']
+        self.retry_backoff = STATS_CONFIG['retry_backoff']
+
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Any] = {
+            'total_files': 0,
+            'total_vectors': 0,
+            'total_queries': 0,
+            'avg_response_time': 0,
+            'embedding_model': None,
+            'document_type_stats': {}
+        }
+        self._updated_at: Optional[float] = None
+        self._reconciled_at: Optional[float] = None
+        self._reconcile_lock = threading.Lock()
+        # 对账扫描期间发生的事件增量，扫描结束后叠加到真实值上
+        self._pending: Optional[Dict[str, Any]] = None
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台对账线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._reconcile_loop)
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(f"统计聚合后台对账已启动，间隔: {self.reconcile_interval}秒")
+
+    def stop(self):
+        """停止后台对账线程"""
+        self._stop_event.set()
+
+    def _reconcile_loop(self):
+        """后台对账循环（失败时按指数退避重试）"""
+        failures = 0
+        while not self._stop_event.is_set():
+            if self.reconcile():
+                failures = 0
+                wait = self.reconcile_interval
+            else:
+                failures += 1
+                wait = min(self.reconcile_interval, self.retry_backoff * 2 ** (failures - 1))
+            self._stop_event.wait(wait)
+
+    def reconcile(self) -> bool:
+        """
+        与MinIO、ChromaDB和检索日志对账，用真实值覆盖计数
+
+        扫描在锁外进行，期间到达的事件记为增量，写回时叠加在扫描结果之上，避免被覆盖丢失
+
+        Returns:
+            是否成功
+        """
+        # 已有对账在进行时直接返回，避免并发的全量扫描
+        if not self._reconcile_lock.acquire(blocking=False):
+            return False
+        try:
+            start_time = time.time()
+            with self._lock:
+                self._pending = self._empty_pending()
+
+            # 缓冲中的检索日志尚未入库，先写入再读取查询统计
+            if self.log_writer is not None:
+                self.log_writer.flush()
+            db_stats = self.db_model.get_retrieval_stats()
+            vector_stats = self.vector_service.get_vector_db_stats()
+            minio_files = self.minio_service.list_files()
+
+            with self._lock:
+                pending = self._pending
+                self._pending = None
+
+                total_queries = (db_stats['total_queries'] or 0) + pending['queries']
+                avg_response_time = db_stats['avg_response_time'] or 0
+                if total_queries:
+                    avg_response_time = ((avg_response_time * (db_stats['total_queries'] or 0)
+                                          + pending['response_time']) / total_queries)
+                type_stats = dict(db_stats['document_type_stats'] or {})
+                for document_type, count in pending['document_types'].items():
+                    type_stats[document_type] = type_stats.get(document_type, 0) + count
+
+                self._counters.update({
+                    'total_files': max(0, len(minio_files) + pending['total_files']),
+                    'total_vectors': max(0, vector_stats['total_vectors'] + pending['total_vectors']),
+                    'total_queries': total_queries,
+                    'avg_response_time': avg_response_time,
+                    'embedding_model': vector_stats['embedding_model'],
+                    'document_type_stats': type_stats
+                })
+                self._reconciled_at = self._updated_at = time.time()
+
+            logger.info(f"知识库统计对账完成，耗时: {int((time.time() - start_time) * 1000)}ms")
+            return True
+
+        except Exception as e:
+            # 失败时增量已实时累加到计数上，直接丢弃
+            with self._lock:
+                self._pending = None
+            logger.error(f"知识库统计对账失败: {e}")
+            return False
+        finally:
+            self._reconcile_lock.release()
+
+    @staticmethod
+    def _empty_pending() -> Dict[str, Any]:
+        """对账期间的事件增量"""
+        return {'total_files': 0, 'total_vectors': 0, 'queries': 0, 'response_time': 0, 'document_types': {}}
+
+    def _apply(self, **deltas):
+        """累加计数"""
+        with self._lock:
+            for key, delta in deltas.items():
+                self._counters[key] = max(0, (self._counters.get(key) or 0) + delta)
+                if self._pending is not None:
+                    self._pending[key] += delta
+            self._updated_at = time.time()
+
+    def on_file_uploaded(self):
+        """文件上传事件"""
+        self._apply(total_files=1)
+
+    def on_file_deleted(self, vector_count: int = 0):
+        """文件删除事件"""
+        self.on_files_deleted(1, vector_count)
+
+    def on_files_deleted(self, file_count: int, vector_count: int = 0):
+        """批量删除事件"""
+        self._apply(total_files=-file_count, total_vectors=-vector_count)
+
+    def on_vectors_changed(self, delta: int):
+        """向量数量变化事件"""
+        self._apply(total_vectors=delta)
+
+    def on_retrieval(self, response_time_ms: int, document_type: str = 'knowledge_base'):
+        """检索事件：更新查询次数、平均响应时间和文档类型分布"""
+        with self._lock:
+            total = self._counters['total_queries'] or 0
+            avg = self._counters['avg_response_time'] or 0
+            self._counters['total_queries'] = total + 1
+            self._counters['avg_response_time'] = (avg * total + response_time_ms) / (total + 1)
+
+            type_stats = self._counters['document_type_stats']
+            if isinstance(type_stats, dict):
+                type_stats[document_type] = type_stats.get(document_type, 0) + 1
+
+            if self._pending is not None:
+                self._pending['queries'] += 1
+                self._pending['response_time'] += response_time_ms
+                document_types = self._pending['document_types']
+                document_types[document_type] = document_types.get(document_type, 0) + 1
+            self._updated_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取缓存的统计快照
+
+        不在请求线程中对账：尚未对账成功或对账已超过两个周期未成功时，计数标记为stale，由后台线程重试
+
+        Returns:
+            统计信息（带快照时间和数据新鲜度）
+        """
+        now = time.time()
+        with self._lock:
+            stats = copy.deepcopy(self._counters)
+            updated_at = self._updated_at
+            reconciled_at = self._reconciled_at
+
+        stats['snapshot'] = {
+            'updated_at': datetime.fromtimestamp(updated_at).isoformat() if updated_at else None,
+            'reconciled_at': datetime.fromtimestamp(reconciled_at).isoformat() if reconciled_at else None,
+            'age_seconds': round(now - updated_at, 3) if updated_at else None,
+            'reconcile_age_seconds': round(now - reconciled_at, 3) if reconciled_at else None,
+            'stale': reconciled_at is None or now - reconciled_at > 2 * self.reconcile_interval
+        }
+        return stats
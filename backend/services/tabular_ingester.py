@@ -0,0 +1,273 @@
+"""
+表格文件流式解析服务
+逐行读取Excel、分块读取CSV，按行组生成带表头上下文的文档块
+"""
+import io
+import codecs
+import os
+from datetime import datetime, date
+from typing import Dict, List, Any, Optional, Iterator, Tuple, Union, BinaryIO
+
+from config_rag import TABULAR_CONFIG
+from services.encoding_detector import encoding_detector
+from services.upload_spool import BufferStream
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('tabular_ingester')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+Source = Union[bytes, str, BinaryIO]
+
+class TabularIngester:
+    """表格文件流式解析器"""
+
+    def __init__(self, rows_per_chunk: Optional[int] = None, max_chunk_chars: Optional[int] = None):
+        """
+        初始化解析器
+
+        Args:
+            rows_per_chunk: 每个行组最多包含的数据行数
+            max_chunk_chars: 每个行组的最大字符数
+        """
+        self.rows_per_chunk = rows_per_chunk or TABULAR_CONFIG['rows_per_chunk']
+        self.max_chunk_chars = max_chunk_chars or TABULAR_CONFIG['max_chunk_chars']
+
+    @staticmethod
+    def _open(source: Source):
+        """bytes包装为文件对象（memoryview和bytearray不复制），路径和文件对象原样返回"""
+        if isinstance(source, (memoryview, bytearray)):
+            return BufferStream(source)
+        return io.BytesIO(source) if isinstance(source, bytes) else source
+
+    @staticmethod
+    def format_cell(value: Any) -> str:
+        """单元格值转文本"""
+        if value is None:
+            return ''
+        if isinstance(value, float):
+            if value != value:  # NaN
+                return ''
+            if value.is_integer():
+                return str(int(value))
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return str(value).replace('\r', ' ').replace('\n', ' ').strip()
+
+    def _decode_csv(self, source: Source, encoding: Optional[str] = None) -> str:
+        """
+        解码CSV全文
+
+        严格解码本身就是编码验证，验证通过的文本直接交给pandas，不再按编码重新解码；
+        内存数据、文件对象和本地路径走同一流程
+
+        Args:
+            source: 文件数据、本地路径或文件对象
+            encoding: 指定的编码，为空时自动检测
+
+        Returns:
+            CSV文本
+        """
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                data = f.read()
+        elif hasattr(source, 'getbuffer'):
+            data = source.getbuffer()
+        elif hasattr(source, 'read'):
+            data = source.read()
+        else:
+            data = source
+
+        if encoding:
+            return codecs.decode(data, encoding)
+        text, _ = encoding_detector.decode(data)
+        return text
+
+    def iter_sheets(self, source: Source, file_ext: str, encoding: Optional[str] = None) -> Iterator[Tuple[str, Iterator[tuple]]]:
+        """
+        逐个工作表迭代行数据，每个工作表只读取一次
+
+        Args:
+            source: 文件数据、本地路径或文件对象
+            file_ext: 文件扩展名（xlsx/xls/csv，可带点号）
+            encoding: CSV编码，为空时自动检测
+
+        Yields:
+            (工作表名称, 行迭代器)
+        """
+        file_ext = file_ext.lower().lstrip('.')
+
+        if file_ext == 'xlsx':
+            import openpyxl
+
+            workbook = openpyxl.load_workbook(self._open(source), read_only=True, data_only=True)
+            try:
+                for worksheet in workbook.worksheets:
+                    yield worksheet.title, worksheet.iter_rows(values_only=True)
+            finally:
+                workbook.close()
+
+        elif file_ext == 'xls':
+            import pandas as pd
+
+            # xlrd会整体载入旧版工作簿，这里仍保证每个工作表只解析一次
+            excel_file = pd.ExcelFile(self._open(source), engine='xlrd')
+            for sheet_name in excel_file.sheet_names:
+                df = excel_file.parse(sheet_name, header=None, dtype=object)
+                yield sheet_name, df.itertuples(index=False, name=None)
+
+        elif file_ext == 'csv':
+            yield 'CSV', self._iter_csv_rows(self._decode_csv(source, encoding))
+
+        else:
+            raise ValueError(f"不支持的表格格式: {file_ext}")
+
+    def _iter_csv_rows(self, text: str) -> Iterator[tuple]:
+        """分块读取已解码的CSV行"""
+        import pandas as pd
+
+        reader = pd.read_csv(
+            io.StringIO(text),
+            header=None,
+            dtype=str,
+            keep_default_na=False,
+            skip_blank_lines=False,
+            chunksize=max(self.rows_per_chunk * 20, 1000)
+        )
+        for frame in reader:
+            yield from frame.itertuples(index=False, name=None)
+
+    def _render_group(self, sheet_name: str, header: List[str], rows: List[List[str]], row_start: int, row_end: int) -> str:
+        """渲染带表头上下文的行组文本"""
+        lines = [f"工作表: {sheet_name} (第{row_start}-{row_end}行)", "列: " + " | ".join(header)]
+        lines.extend(" | ".join(row) for row in rows)
+        return "\n".join(lines)
+
+    def iter_row_groups(self, source: Source, file_ext: str, encoding: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        按行组迭代表格内容
+
+        Args:
+            source: 文件数据、本地路径或文件对象
+            file_ext: 文件扩展名
+            encoding: CSV编码，为空时自动检测
+
+        Yields:
+            {'content', 'sheet', 'row_start', 'row_end', 'header'}
+        """
+        for sheet_name, rows in self.iter_sheets(source, file_ext, encoding):
+            header: Optional[List[str]] = None
+            group: List[List[str]] = []
+            group_chars = 0
+            group_start = 0
+
+            for row_number, row in enumerate(rows, start=1):
+                cells = [self.format_cell(value) for value in row]
+                if not any(cells):
+                    continue
+
+                # 第一行非空数据作为表头
+                if header is None:
+                    header = [cell or f"列{i + 1}" for i, cell in enumerate(cells)]
+                    continue
+
+                row_chars = sum(len(cell) for cell in cells) + 3 * len(cells)
+                if group and (len(group) >= self.rows_per_chunk or group_chars + row_chars > self.max_chunk_chars):
+                    yield {
+                        'content': self._render_group(sheet_name, header, group, group_start, row_number - 1),
+                        'sheet': sheet_name,
+                        'row_start': group_start,
+                        'row_end': row_number - 1,
+                        'header': header
+                    }
+                    group, group_chars = [], 0
+
+                if not group:
+                    group_start = row_number
+                group.append(cells)
+                group_chars += row_chars
+                last_row = row_number
+
+            if group:
+                yield {
+                    'content': self._render_group(sheet_name, header, group, group_start, last_row),
+                    'sheet': sheet_name,
+                    'row_start': group_start,
+                    'row_end': last_row,
+                    'header': header
+                }
+            elif header is not None:
+                # 只有表头的工作表
+                yield {
+                    'content': f"工作表: {sheet_name}\n列: " + " | ".join(header),
+                    'sheet': sheet_name,
+                    'row_start': 0,
+                    'row_end': 0,
+                    'header': header
+                }
+
+    def iter_chunks(self, source: Source, file_name: str, encoding: Optional[str] = None,
+                    stats: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐个产出行组文档块（与chunk_text格式一致），不拼接全文
+
+        Args:
+            source: 文件数据、本地路径或文件对象
+            file_name: 文件名（用于判断格式）
+            encoding: CSV编码，为空时自动检测
+            stats: 可选的统计字典，迭代过程中更新sheets/sheet_names/total_rows/total_columns/content_length
+
+        Yields:
+            文档块（附带sheet、row_start、row_end、chunk_index）
+        """
+        file_ext = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if stats is None:
+            stats = {}
+        stats.update({'sheets': 0, 'sheet_names': [], 'total_rows': 0, 'total_columns': 0, 'content_length': 0})
+        offset = 0
+        chunk_index = 0
+
+        for group in self.iter_row_groups(source, file_ext, encoding):
+            content = group['content']
+            if group['sheet'] not in stats['sheet_names']:
+                stats['sheet_names'].append(group['sheet'])
+                stats['sheets'] = len(stats['sheet_names'])
+            if group['row_start']:
+                stats['total_rows'] += group['row_end'] - group['row_start'] + 1
+            stats['total_columns'] = max(stats['total_columns'], len(group['header']))
+            stats['content_length'] += len(content)
+
+            yield {
+                'content': content,
+                'start': offset,
+                'end': offset + len(content),
+                'size': len(content),
+                'chunk_index': chunk_index,
+                'sheet': group['sheet'],
+                'row_start': group['row_start'],
+                'row_end': group['row_end']
+            }
+            offset += len(content) + 2  # 块之间按空行分隔计算偏移
+            chunk_index += 1
+
+        logger.info(f"表格解析完成: {file_name}, 工作表 {stats['sheets']} 个, "
+                    f"数据行约 {stats['total_rows']} 行, 生成 {chunk_index} 个行组")
+
+    def ingest(self, source: Source, file_name: str, encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        解析表格文件为行组文档块列表（需要全部文档块时使用，如增量重建；上传入库使用iter_chunks分批写入）
+
+        Args:
+            source: 文件数据、本地路径或文件对象
+            file_name: 文件名（用于判断格式）
+            encoding: CSV编码，为空时自动检测
+
+        Returns:
+            {'chunks': 文档块列表, 'metadata': 统计}
+        """
+        stats: Dict[str, Any] = {}
+        chunks = list(self.iter_chunks(source, file_name, encoding, stats))
+        return {'chunks': chunks, 'metadata': stats}
@@ -0,0 +1,232 @@
+"""
+上传文件缓冲服务
+流式读取上传内容并增量计算哈希，小文件保存在内存中，超过阈值后转存到临时文件，
+解析阶段通过memoryview/mmap访问同一份数据，不产生额外的完整副本
+"""
+import io
+import mmap
+import hashlib
+import tempfile
+from typing import BinaryIO, Optional, Union
+
+from config_rag import UPLOAD_CONFIG, MAX_FILE_SIZE
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('upload_spool')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+class FileTooLargeError(ValueError):
+    """上传文件超过大小限制"""
+
+class BufferStream(io.RawIOBase):
+    """基于memoryview的只读文件对象，read只复制请求的片段"""
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        super().__init__()
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def getbuffer(self) -> memoryview:
+        """返回底层缓冲区（不复制）"""
+        return self._view
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"无效的whence: {whence}")
+        if position < 0:
+            raise ValueError(f"无效的偏移量: {position}")
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._position + size, len(self._view))
+        data = self._view[self._position:end].tobytes() if end > self._position else b''
+        self._position = max(self._position, end)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+class SpooledUpload:
+    """
+    上传文件缓冲区
+
+    使用方式：
+        upload = SpooledUpload.from_stream(file.stream)
+        upload.size / upload.content_hash      # 读取过程中已计算
+        upload.open_stream()                   # 上传到MinIO时使用的文件对象
+        upload.view()                          # 解析时使用的只读memoryview
+        upload.close()                         # 处理完成后释放内存或删除临时文件
+    """
+
+    def __init__(self, spool_threshold: Optional[int] = None, max_size: Optional[int] = None):
+        """
+        初始化缓冲区
+
+        Args:
+            spool_threshold: 超过该字节数后转存到临时文件
+            max_size: 允许的最大字节数
+        """
+        self.spool_threshold = spool_threshold or UPLOAD_CONFIG['spool_threshold']
+        self.max_size = max_size or MAX_FILE_SIZE
+        self.size = 0
+        self._hash = hashlib.md5()
+        self._file: BinaryIO = io.BytesIO()
+        self._on_disk = False
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self._closed = False
+
+    @classmethod
+    def from_stream(cls, stream: BinaryIO, chunk_size: Optional[int] = None, **kwargs) -> 'SpooledUpload':
+        """
+        从输入流分块读取全部内容
+
+        Args:
+            stream: 输入流（如werkzeug FileStorage.stream）
+            chunk_size: 每次读取的字节数
+
+        Returns:
+            SpooledUpload实例
+
+        Raises:
+            FileTooLargeError: 超过大小限制（已读取的数据会被释放）
+        """
+        upload = cls(**kwargs)
+        chunk_size = chunk_size or UPLOAD_CONFIG['read_chunk_size']
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                upload.write(chunk)
+        except Exception:
+            upload.close()
+            raise
+        return upload
+
+    @property
+    def on_disk(self) -> bool:
+        """数据是否已转存到临时文件"""
+        return self._on_disk
+
+    @property
+    def content_hash(self) -> str:
+        """内容MD5（流式计算）"""
+        return self._hash.hexdigest()
+
+    def write(self, chunk: bytes):
+        """追加数据并更新哈希"""
+        if self._view is not None:
+            raise RuntimeError("缓冲区已进入只读状态")
+        if self.size + len(chunk) > self.max_size:
+            raise FileTooLargeError(
+                f"文件大小超过限制: > {self.max_size / 1024 / 1024:.0f}MB"
+            )
+
+        if not self._on_disk and self.size + len(chunk) > self.spool_threshold:
+            # 转存到临时文件（自动删除，不出现在目录中）
+            spool_file = tempfile.TemporaryFile(dir=UPLOAD_CONFIG['spool_dir'])
+            spool_file.write(self._file.getbuffer())
+            self._file.close()
+            self._file = spool_file
+            self._on_disk = True
+            logger.debug(f"上传数据超过 {self.spool_threshold} 字节，转存到临时文件")
+
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def view(self) -> memoryview:
+        """
+        获取只读的数据视图（内存数据直接引用，磁盘数据使用mmap映射）
+
+        Returns:
+            memoryview
+        """
+        if self._closed:
+            raise ValueError("缓冲区已关闭")
+        if self._view is None:
+            if self._on_disk:
+                self._file.flush()
+                if self.size:
+                    self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._view = memoryview(self._mmap)
+                else:
+                    self._view = memoryview(b'')
+            else:
+                self._view = self._file.getbuffer().toreadonly()
+        return self._view
+
+    def open_stream(self) -> BinaryIO:
+        """获取从头读取的文件对象（用于上传，磁盘数据直接顺序读取临时文件）"""
+        if self._closed:
+            raise ValueError("缓冲区已关闭")
+        if self._on_disk:
+            self._file.flush()
+            stream = open(self._file.fileno(), 'rb', closefd=False)
+            stream.seek(0)
+            return stream
+        return BufferStream(self.view())
+
+    def close(self):
+        """
+        释放内存视图和临时文件
+
+        视图或mmap仍被解析器持有的派生视图引用（BufferError）时，已能释放的资源照常释放，
+        其余资源不再主动重试，在最后一个派生视图和本对象被回收时由垃圾回收释放
+        （临时文件创建后即已从磁盘删除）；缓冲区在调用后即不可再使用
+        """
+        self._closed = True
+        if self._view is not None:
+            try:
+                self._view.release()
+                self._view = None
+            except BufferError:
+                logger.debug("上传缓冲区视图仍被引用，留待垃圾回收释放")
+        if self._mmap is not None and self._view is None:
+            try:
+                self._mmap.close()
+                self._mmap = None
+            except BufferError:
+                logger.debug("上传缓冲区映射仍被引用，留待垃圾回收释放")
+        if not self._file.closed:
+            try:
+                self._file.close()
+            except BufferError:
+                # 内存缓冲区仍有导出的视图
+                logger.debug("上传缓冲区仍被引用，留待垃圾回收释放")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -3,12 +3,23 @@
 使用ChromaDB进行向量存储和检索
 """
 import os
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
 from typing import Dict, List, Any, Optional
 import chromadb
 from chromadb.config import Settings
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import json
+from datetime import datetime
+
+from config_rag import KNOWLEDGE_BASE_CONFIG
+from services.vector_stats import VectorStatsStore
+from utils.tracing import tracer, traced
+from utils.profiling import profiled
+from utils.file_lock import file_lock
 
 # 导入统一的日志管理器
 try:
@@ -18,6 +29,16 @@ except ImportError:
     import logging
     logger = logging.getLogger(__name__)
 
+class SentenceTransformerEmbedding:
+    """将SentenceTransformer模型包装为ChromaDB嵌入函数"""
+    
+    def __init__(self, model: SentenceTransformer):
+        self.model = model
+    
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        with tracer.span('embedding', 'encode'):
+            return self.model.encode(list(input), show_progress_bar=False).tolist()
+
 class VectorService:
     """向量数据库服务"""
     
@@ -37,27 +58,34 @@ class VectorService:
                 )
             )
             
+            # 集合统计侧表（增量维护，避免统计时全量读取集合）
+            self.stats_store = VectorStatsStore(os.path.join(self.persist_directory, 'collection_stats.db'))
+            
+            # 当前使用的集合及其嵌入模型（模型升级迁移后由collection_state.json记录）
+            self.collection_state_file = os.path.join(self.persist_directory, 'collection_state.json')
+            # 写入集合时持有共享锁，迁移切换集合时持有排他锁（跨进程）
+            self.write_lock_file = os.path.join(self.persist_directory, 'collection_write.lock')
+            self._state_lock = threading.Lock()
+            self._state_mtime = self._collection_state_mtime()
+            collection_state = self._load_collection_state()
+            self.collection_name = collection_state.get('collection_name', 'knowledge_chunks')
+            self.embedding_model_name = collection_state.get('embedding_model')
+            
             # 初始化嵌入模型
-            model_path = "/opt/official_ai_writer/official_document/models/sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-            if os.path.exists(model_path):
-                self.embedding_model = SentenceTransformer(model_path)
-                logger.info(f"使用本地嵌入模型: {model_path}")
+            if self.embedding_model_name:
+                self.embedding_model = self.load_embedding_model(self.embedding_model_name)
             else:
-                # 如果本地模型不存在，使用在线模型
-                self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-                logger.info("使用在线嵌入模型")
+                model_path = "/opt/official_ai_writer/official_document/models/sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+                if os.path.exists(model_path):
+                    self.embedding_model = SentenceTransformer(model_path)
+                    logger.info(f"使用本地嵌入模型: {model_path}")
+                else:
+                    # 如果本地模型不存在，使用在线模型
+                    self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+                    logger.info("使用在线嵌入模型")
             
             # 获取或创建集合
-            self.collection_name = "knowledge_chunks"
-            try:
-                self.collection = self.client.get_collection(self.collection_name)
-                logger.info(f"获取现有集合: {self.collection_name}")
-            except:
-                self.collection = self.client.create_collection(
-                    name=self.collection_name,
-                    metadata={"description": "知识库文档块向量存储"}
-                )
-                logger.info(f"创建新集合: {self.collection_name}")
+            self.collection = self.get_or_create_collection(self.collection_name, self.embedding_model_name and self.embedding_model)
             
             logger.info("向量数据库服务初始化成功")
             
@@ -65,13 +93,211 @@ class VectorService:
             logger.error(f"向量数据库服务初始化失败: {e}")
             raise
     
-    def add_documents_to_vector_db(self, chunks: List[Dict[str, Any]], file_id: str) -> List[str]:
+    @staticmethod
+    def load_embedding_model(model_name: str) -> SentenceTransformer:
+        """加载嵌入模型（本地路径或模型名称）"""
+        model = SentenceTransformer(model_name)
+        logger.info(f"加载嵌入模型: {model_name}")
+        return model
+    
+    def get_or_create_collection(self, collection_name: str, embedding_model: Optional[SentenceTransformer] = None):
+        """
+        获取或创建集合
+        
+        Args:
+            collection_name: 集合名称
+            embedding_model: 集合使用的嵌入模型，为空时使用ChromaDB默认嵌入函数
+            
+        Returns:
+            ChromaDB集合
+        """
+        kwargs = {}
+        if embedding_model:
+            kwargs['embedding_function'] = SentenceTransformerEmbedding(embedding_model)
+        try:
+            collection = self.client.get_collection(collection_name, **kwargs)
+            logger.info(f"获取现有集合: {collection_name}")
+        except Exception:
+            collection = self.client.create_collection(
+                name=collection_name,
+                metadata={"description": "知识库文档块向量存储"},
+                **kwargs
+            )
+            logger.info(f"创建新集合: {collection_name}")
+        return collection
+    
+    @property
+    def collection(self):
+        """当前使用的集合（其他实例或进程切换集合后自动跟随）"""
+        self._sync_collection_state()
+        return self._collection
+    
+    @collection.setter
+    def collection(self, collection):
+        self._collection = collection
+    
+    def _collection_state_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.collection_state_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _sync_collection_state(self):
+        """collection_state.json被其他实例或进程更新（嵌入模型迁移切换）后，重新加载当前集合和嵌入模型"""
+        mtime = self._collection_state_mtime()
+        if mtime == self._state_mtime:
+            return
+        with self._state_lock:
+            if mtime == self._state_mtime:
+                return
+            state = self._load_collection_state()
+            collection_name = state.get('collection_name')
+            embedding_model_name = state.get('embedding_model')
+            if collection_name and collection_name != self.collection_name:
+                try:
+                    embedding_model = self.embedding_model
+                    if embedding_model_name and embedding_model_name != self.embedding_model_name:
+                        embedding_model = self.load_embedding_model(embedding_model_name)
+                    self._collection = self.get_or_create_collection(collection_name, embedding_model_name and embedding_model)
+                    self.embedding_model = embedding_model
+                    self.embedding_model_name = embedding_model_name
+                    self.collection_name = collection_name
+                    logger.info(f"跟随切换到集合: {collection_name}, 嵌入模型: {embedding_model_name}")
+                except Exception as e:
+                    # 保留当前集合，下次访问时重试
+                    logger.error(f"跟随切换集合失败: {e}")
+                    return
+            self._state_mtime = mtime
+    
+    @contextmanager
+    def write_fence(self, file_ids: List[str]):
+        """
+        写入当前集合（迁移切换集合期间阻塞；迁移进行中时记录变化的文件，切换前重放到新集合）
+        
+        Args:
+            file_ids: 本次写入涉及的文件ID
+        """
+        with file_lock(self.write_lock_file, shared=True):
+            self._sync_collection_state()
+            collection_name = self.collection_name
+            try:
+                yield
+            finally:
+                self.stats_store.record_changes(collection_name, [str(file_id) for file_id in file_ids])
+    
+    def _load_collection_state(self) -> Dict[str, Any]:
+        """读取当前集合状态"""
+        if not os.path.exists(self.collection_state_file):
+            return {}
+        try:
+            with open(self.collection_state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"读取集合状态失败: {e}")
+            return {}
+    
+    def switch_collection(self, collection_name: str, embedding_model_name: str,
+                          embedding_model: Optional[SentenceTransformer] = None) -> bool:
+        """
+        原子切换当前使用的集合和嵌入模型
+        
+        Args:
+            collection_name: 新集合名称
+            embedding_model_name: 新集合对应的嵌入模型名称或路径
+            embedding_model: 已加载的嵌入模型，为空时按名称加载
+            
+        Returns:
+            是否成功
+        """
+        try:
+            embedding_model = embedding_model or self.load_embedding_model(embedding_model_name)
+            collection = self.get_or_create_collection(collection_name, embedding_model)
+            
+            # 先持久化状态（写临时文件后原子替换），再切换内存中的引用
+            state = {
+                'collection_name': collection_name,
+                'embedding_model': embedding_model_name,
+                'previous_collection': self.collection_name,
+                'switched_at': datetime.now().isoformat()
+            }
+            tmp_file = f"{self.collection_state_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.collection_state_file)
+            
+            with self._state_lock:
+                self.embedding_model = embedding_model
+                self.embedding_model_name = embedding_model_name
+                self.collection_name = collection_name
+                self.collection = collection
+                self._state_mtime = self._collection_state_mtime()
+            
+            # 新集合的统计通过一次分页扫描初始化
+            self.stats_store.rebuild(collection_name, self.scan_collection_stats())
+            
+            logger.info(f"已切换到集合: {collection_name}, 嵌入模型: {embedding_model_name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"切换集合失败: {e}")
+            return False
+    
+    @staticmethod
+    def compute_content_hash(content: str) -> str:
+        """计算文档块内容哈希"""
+        return hashlib.md5(content.encode('utf-8')).hexdigest()
+    
+    @profiled()
+    def chunk_text(self, text: str, file_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        文本分块
+        
+        Args:
+            text: 文本内容
+            file_name: 文件名（仅用于日志）
+            
+        Returns:
+            文本块列表
+        """
+        chunk_size = KNOWLEDGE_BASE_CONFIG['chunk_size']
+        overlap = KNOWLEDGE_BASE_CONFIG['chunk_overlap']
+        chunks = []
+        
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_size, len(text))
+            
+            # 如果不是最后一块，尝试在句号处分割
+            if end < len(text):
+                for i in range(end, max(start + chunk_size - 100, start), -1):
+                    if text[i] in '。！？.!?':
+                        end = i + 1
+                        break
+            
+            content = text[start:end].strip()
+            if content:
+                chunks.append({
+                    'content': content,
+                    'start': start,
+                    'end': end,
+                    'size': len(content)
+                })
+            
+            if end >= len(text):
+                break
+            start = max(start + 1, end - overlap)
+        
+        logger.info(f"文本分块完成: {file_name or ''}, 共 {len(chunks)} 块")
+        return chunks
+    
+    def add_documents_to_vector_db(self, chunks: List[Dict[str, Any]], file_id: str, start_index: int = 0) -> List[str]:
         """
         将文档块添加到向量数据库
         
         Args:
             chunks: 文档块列表
             file_id: 文件ID
+            start_index: 第一个文档块的序号（分批写入同一文件时使用）
             
         Returns:
             向量ID列表
@@ -86,25 +312,24 @@ class VectorService:
             metadatas = []
             ids = []
             
-            for i, chunk in enumerate(chunks):
+            for i, chunk in enumerate(chunks, start=start_index):
                 chunk_id = f"{file_id}_chunk_{i}"
                 
                 documents.append(chunk['content'])
-                metadatas.append({
-                    'file_id': file_id,
-                    'chunk_index': i,
-                    'chunk_size': chunk.get('size', len(chunk['content'])),
-                    'start': chunk.get('start', 0),
-                    'end': chunk.get('end', len(chunk['content']))
-                })
+                metadatas.append(self._build_chunk_metadata(chunk, file_id, i))
                 ids.append(chunk_id)
             
             # 添加到向量数据库
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            with self.write_fence([file_id]):
+                # 重复添加同一文件时已存在的ID被覆盖，统计只计入新增的ID
+                existing_ids = set(self.collection.get(ids=ids, include=[])['ids'])
+                with tracer.span('chroma', 'add'):
+                    self.collection.upsert(
+                        documents=documents,
+                        metadatas=metadatas,
+                        ids=ids
+                    )
+                self.stats_store.increment(self.collection_name, file_id, len(set(ids) - existing_ids))
             
             logger.info(f"成功添加 {len(chunks)} 个文档块到向量数据库")
             return ids
@@ -113,7 +338,118 @@ class VectorService:
             logger.error(f"添加文档块到向量数据库失败: {e}")
             return []
     
-    def search_similar_chunks(self, query: str, top_k: int = 5, file_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    def _build_chunk_metadata(self, chunk: Dict[str, Any], file_id: str, chunk_index: int) -> Dict[str, Any]:
+        """构建文档块元数据"""
+        metadata = {
+            'file_id': file_id,
+            'chunk_index': chunk_index,
+            'chunk_size': chunk.get('size', len(chunk['content'])),
+            'start': chunk.get('start', 0),
+            'end': chunk.get('end', len(chunk['content'])),
+            'content_hash': chunk.get('content_hash') or self.compute_content_hash(chunk['content'])
+        }
+        # 表格行组文档块附带工作表和行号
+        for key in ('sheet', 'row_start', 'row_end'):
+            if key in chunk:
+                metadata[key] = chunk[key]
+        return metadata
+    
+    def reindex_file_chunks(self, chunks: List[Dict[str, Any]], file_id: str) -> Dict[str, Any]:
+        """
+        增量重建文件的文档块向量
+        
+        按内容哈希比对新旧文档块：内容未变的块复用原向量，仅更新位置元数据；
+        新增或修改的块重新向量化；已不存在的块批量删除。
+        
+        Args:
+            chunks: 新的文档块列表
+            file_id: 文件ID
+            
+        Returns:
+            {'ids': 与chunks一一对应的向量ID列表, 'added': 新增数, 'updated': 元数据更新数,
+             'unchanged': 未变化数, 'removed': 删除数}
+        """
+        # 读取现有块到写入完成期间持有写入锁，迁移切换不会穿插其中
+        with self.write_fence([file_id]):
+            # 只读取元数据；旧数据缺少content_hash时再按ID读取这些块的文档内容
+            existing = self.collection.get(where={"file_id": file_id}, include=["metadatas"])
+            
+            existing_meta: Dict[str, Dict[str, Any]] = {}
+            for i, vector_id in enumerate(existing['ids']):
+                existing_meta[vector_id] = (existing['metadatas'][i] if existing['metadatas'] else None) or {}
+            
+            legacy_ids = [vector_id for vector_id, metadata in existing_meta.items() if not metadata.get('content_hash')]
+            legacy_hashes: Dict[str, str] = {}
+            if legacy_ids:
+                legacy = self.collection.get(ids=legacy_ids, include=["documents"])
+                for i, vector_id in enumerate(legacy['ids']):
+                    document = legacy['documents'][i] if legacy['documents'] else ''
+                    legacy_hashes[vector_id] = self.compute_content_hash(document or '')
+            
+            # 内容哈希 -> 现有向量ID列表（同一内容可能出现多次）
+            existing_by_hash: Dict[str, List[str]] = {}
+            for vector_id, metadata in existing_meta.items():
+                content_hash = metadata.get('content_hash') or legacy_hashes.get(vector_id) or self.compute_content_hash('')
+                existing_by_hash.setdefault(content_hash, []).append(vector_id)
+            
+            used_ids = set(existing['ids'])
+            ids = []
+            add_ids, add_documents, add_metadatas = [], [], []
+            update_ids, update_metadatas = [], []
+            unchanged = 0
+            
+            for i, chunk in enumerate(chunks):
+                chunk['content_hash'] = self.compute_content_hash(chunk['content'])
+                metadata = self._build_chunk_metadata(chunk, file_id, i)
+                matches = existing_by_hash.get(chunk['content_hash'])
+            
+                if matches:
+                    # 内容未变：复用向量，仅在位置变化时更新元数据
+                    vector_id = matches.pop(0)
+                    if existing_meta[vector_id] != metadata:
+                        update_ids.append(vector_id)
+                        update_metadatas.append(metadata)
+                    else:
+                        unchanged += 1
+                else:
+                    # 新增或修改的块：使用基于内容哈希的ID，避免与现有ID冲突
+                    vector_id = f"{file_id}_chunk_{chunk['content_hash'][:16]}"
+                    suffix = 1
+                    while vector_id in used_ids:
+                        vector_id = f"{file_id}_chunk_{chunk['content_hash'][:16]}_{suffix}"
+                        suffix += 1
+                    add_ids.append(vector_id)
+                    add_documents.append(chunk['content'])
+                    add_metadatas.append(metadata)
+            
+                used_ids.add(vector_id)
+                ids.append(vector_id)
+            
+            removed_ids = [vector_id for vector_ids in existing_by_hash.values() for vector_id in vector_ids]
+            
+            # 先删除再更新和新增
+            if removed_ids:
+                with tracer.span('chroma', 'delete'):
+                    self.collection.delete(ids=removed_ids)
+            if update_ids:
+                self.collection.update(ids=update_ids, metadatas=update_metadatas)
+            if add_ids:
+                with tracer.span('chroma', 'add'):
+                    self.collection.add(documents=add_documents, metadatas=add_metadatas, ids=add_ids)
+            self.stats_store.increment(self.collection_name, file_id, len(add_ids) - len(removed_ids))
+        
+        logger.info(f"文件 {file_id} 增量重建完成: 新增 {len(add_ids)}, 更新 {len(update_ids)}, 未变 {unchanged}, 删除 {len(removed_ids)}")
+        return {
+            'ids': ids,
+            'added': len(add_ids),
+            'updated': len(update_ids),
+            'unchanged': unchanged,
+            'removed': len(removed_ids)
+        }
+    
+    @profiled()
+    def search_similar_chunks(self, query: str, top_k: int = 5, file_ids: Optional[List[str]] = None,
+                              include_embeddings: bool = False) -> List[Dict[str, Any]]:
         """
         搜索相似文档块
         
@@ -121,6 +457,7 @@ class VectorService:
             query: 查询文本
             top_k: 返回结果数量
             file_ids: 限制搜索的文件ID列表
+            include_embeddings: 是否同时返回文档块向量（用于MMR去重）
             
         Returns:
             相似文档块列表
@@ -131,12 +468,18 @@ class VectorService:
             if file_ids:
                 where = {"file_id": {"$in": file_ids}}
             
+            include = ["documents", "metadatas", "distances"]
+            if include_embeddings:
+                include.append("embeddings")
+            
             # 执行搜索
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k,
-                where=where
-            )
+            with tracer.span('chroma', 'query'):
+                results = self.collection.query(
+                    query_texts=[query],
+                    n_results=top_k,
+                    where=where,
+                    include=include
+                )
             
             # 格式化结果
             similar_chunks = []
@@ -148,6 +491,8 @@ class VectorService:
                         'distance': results['distances'][0][i] if results['distances'] and results['distances'][0] else 0,
                         'id': results['ids'][0][i] if results['ids'] and results['ids'][0] else ''
                     })
+                    if include_embeddings and results.get('embeddings') is not None:
+                        similar_chunks[-1]['embedding'] = results['embeddings'][0][i]
             
             logger.info(f"搜索到 {len(similar_chunks)} 个相似文档块")
             return similar_chunks
@@ -156,25 +501,108 @@ class VectorService:
             logger.error(f"搜索相似文档块失败: {e}")
             return []
     
+    @traced('embedding')
+    def encode_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        一次性批量编码查询文本（与当前集合使用相同的嵌入函数）
+        
+        Args:
+            queries: 查询文本列表
+            
+        Returns:
+            查询向量列表
+        """
+        if self.embedding_model_name:
+            return self.embedding_model.encode(queries, batch_size=min(len(queries), 64), show_progress_bar=False).tolist()
+        
+        # 未迁移过的集合使用ChromaDB默认嵌入函数
+        if getattr(self, '_default_embedding_function', None) is None:
+            from chromadb.utils import embedding_functions
+            self._default_embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        return [list(map(float, embedding)) for embedding in self._default_embedding_function(queries)]
+    
+    def batch_search(self, queries: List[str], top_k: Optional[int] = None,
+                     file_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        批量搜索相似文档块
+        
+        相同的查询只编码和检索一次；所有查询在一次模型调用中编码，并通过一次多查询请求检索
+        
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回结果数量
+            file_ids: 限制搜索的文件ID列表
+            
+        Returns:
+            {'results': 与queries一一对应的结果列表, 'timing': 耗时统计, 'unique_queries': 去重后的查询数}
+        """
+        top_k = top_k or KNOWLEDGE_BASE_CONFIG['top_k']
+        start_time = time.time()
+        
+        # 1. 去重（保持首次出现的顺序）
+        unique_queries = list(dict.fromkeys(queries))
+        
+        # 2. 一次性编码全部查询
+        query_embeddings = self.encode_queries(unique_queries)
+        encoded_time = time.time()
+        
+        # 3. 一次多查询检索
+        where = {"file_id": {"$in": file_ids}} if file_ids else None
+        with tracer.span('chroma', 'query'):
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                where=where,
+                include=["documents", "metadatas", "distances"]
+            )
+        queried_time = time.time()
+        
+        # 4. 按查询整理结果
+        results_by_query = {}
+        for q, query in enumerate(unique_queries):
+            documents = results['documents'][q] if results['documents'] else []
+            query_results = []
+            for i, doc in enumerate(documents):
+                distance = results['distances'][q][i] if results['distances'] else 0
+                query_results.append({
+                    'content': doc,
+                    'metadata': results['metadatas'][q][i] if results['metadatas'] else {},
+                    'distance': distance,
+                    'similarity_score': 1 - distance,
+                    'rank': i + 1,
+                    'id': results['ids'][q][i]
+                })
+            results_by_query[query] = query_results
+        
+        total_ms = (time.time() - start_time) * 1000
+        timing = {
+            'encode_ms': round((encoded_time - start_time) * 1000, 2),
+            'query_ms': round((queried_time - encoded_time) * 1000, 2),
+            'total_ms': round(total_ms, 2),
+            'per_query_ms': round(total_ms / len(unique_queries), 2) if unique_queries else 0
+        }
+        
+        logger.info(f"批量搜索完成: {len(queries)} 个查询（去重后 {len(unique_queries)} 个）, 耗时: {timing['total_ms']}ms")
+        return {
+            'results': [results_by_query[query] for query in queries],
+            'timing': timing,
+            'unique_queries': len(unique_queries)
+        }
+    
     def get_collection_stats(self) -> Dict[str, Any]:
-        """获取集合统计信息"""
+        """获取集合统计信息（读取统计侧表，首次使用时扫描一次集合进行初始化）"""
         try:
-            count = self.collection.count()
-            
-            # 获取所有文档的元数据
-            results = self.collection.get()
+            if not self.stats_store.is_initialized(self.collection_name):
+                self.stats_store.rebuild(self.collection_name, self.scan_collection_stats())
             
-            # 统计文件数量
-            file_ids = set()
-            if results['metadatas']:
-                for metadata in results['metadatas']:
-                    if metadata and 'file_id' in metadata:
-                        file_ids.add(metadata['file_id'])
+            stats = self.stats_store.get_stats(self.collection_name)
+            file_counts = self.stats_store.get_file_counts(self.collection_name)
             
             return {
-                'total_chunks': count,
-                'total_files': len(file_ids),
-                'file_ids': list(file_ids)
+                'total_chunks': stats['total_chunks'],
+                'total_files': stats['total_files'],
+                'file_ids': list(file_counts.keys()),
+                'rebuilt_at': stats['rebuilt_at']
             }
             
         except Exception as e:
@@ -185,6 +613,74 @@ class VectorService:
                 'file_ids': []
             }
     
+    def get_vector_db_stats(self) -> Dict[str, Any]:
+        """获取向量数据库统计信息"""
+        stats = self.get_collection_stats()
+        return {
+            'total_vectors': stats['total_chunks'],
+            'total_files': stats['total_files'],
+            'collection_name': self.collection_name,
+            'embedding_model': self.embedding_model_name or 'paraphrase-multilingual-MiniLM-L12-v2'
+        }
+    
+    def scan_collection_stats(self, page_size: int = 1000) -> Dict[str, int]:
+        """
+        分页扫描集合元数据，统计每个文件的文档块数量
+        
+        Args:
+            page_size: 每页读取的文档块数量
+            
+        Returns:
+            文件ID -> 文档块数量
+        """
+        counts: Dict[str, int] = {}
+        offset = 0
+        while True:
+            page = self.collection.get(limit=page_size, offset=offset, include=["metadatas"])
+            if not page['ids']:
+                break
+            for metadata in page['metadatas'] or []:
+                if metadata and 'file_id' in metadata:
+                    file_id = str(metadata['file_id'])
+                    counts[file_id] = counts.get(file_id, 0) + 1
+            offset += len(page['ids'])
+        
+        logger.info(f"扫描集合统计完成: {self.collection_name}, 共 {offset} 个文档块")
+        return counts
+    
+    def verify_collection_stats(self, repair: bool = False) -> Dict[str, Any]:
+        """
+        扫描集合校验统计侧表
+        
+        Args:
+            repair: 发现差异时是否用扫描结果修复侧表
+            
+        Returns:
+            校验结果
+        """
+        scanned = self.scan_collection_stats()
+        stored = self.stats_store.get_file_counts(self.collection_name)
+        
+        mismatches = {}
+        for file_id in set(scanned) | set(stored):
+            if scanned.get(file_id, 0) != stored.get(file_id, 0):
+                mismatches[file_id] = {
+                    'stored': stored.get(file_id, 0),
+                    'scanned': scanned.get(file_id, 0)
+                }
+        
+        if mismatches and repair:
+            self.stats_store.rebuild(self.collection_name, scanned)
+            logger.warning(f"集合统计与扫描结果不一致，已修复 {len(mismatches)} 个文件的统计")
+        
+        return {
+            'consistent': not mismatches,
+            'repaired': bool(mismatches) and repair,
+            'scanned_chunks': sum(scanned.values()),
+            'stored_chunks': sum(stored.values()),
+            'mismatches': mismatches
+        }
+    
     def delete_file_chunks(self, file_id: str) -> bool:
         """
         删除指定文件的所有文档块
@@ -195,13 +691,30 @@ class VectorService:
         Returns:
             是否成功
         """
-        try:
-            # 删除指定文件ID的所有文档块
-            self.collection.delete(
-                where={"file_id": file_id}
-            )
+        return self.delete_files_chunks([file_id])
+    
+    def delete_files_chunks(self, file_ids: List[str], batch_size: int = 500) -> bool:
+        """
+        批量删除多个文件的所有文档块（按file_id集合过滤，每批一次删除）
+        
+        Args:
+            file_ids: 文件ID列表
+            batch_size: 每次删除包含的文件数量
             
-            logger.info(f"成功删除文件 {file_id} 的所有文档块")
+        Returns:
+            是否成功
+        """
+        try:
+            file_ids = [str(file_id) for file_id in file_ids]
+            for i in range(0, len(file_ids), batch_size):
+                batch = file_ids[i:i + batch_size]
+                where = {"file_id": batch[0]} if len(batch) == 1 else {"file_id": {"$in": batch}}
+                with self.write_fence(batch):
+                    with tracer.span('chroma', 'delete'):
+                        self.collection.delete(where=where)
+                    self.stats_store.remove_files(self.collection_name, batch)
+            
+            logger.info(f"成功删除 {len(file_ids)} 个文件的所有文档块")
             return True
             
         except Exception as e:
@@ -261,11 +774,15 @@ class VectorService:
                 logger.warning(f"文档块不存在: {chunk_id}")
                 return False
             
+            existing_metadata = (results['metadatas'][0] if results['metadatas'] else None) or {}
+            file_ids = {str(file_id) for file_id in (existing_metadata.get('file_id'), metadata.get('file_id')) if file_id}
+            
             # 更新元数据
-            self.collection.update(
-                ids=[chunk_id],
-                metadatas=[metadata]
-            )
+            with self.write_fence(list(file_ids)):
+                self.collection.update(
+                    ids=[chunk_id],
+                    metadatas=[metadata]
+                )
             
             logger.info(f"成功更新文档块元数据: {chunk_id}")
             return True
@@ -278,14 +795,24 @@ class VectorService:
         """清空集合"""
         try:
             self.client.delete_collection(self.collection_name)
-            self.collection = self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "知识库文档块向量存储"}
-            )
+            self.collection = self.get_or_create_collection(self.collection_name, self.embedding_model_name and self.embedding_model)
+            self.stats_store.clear(self.collection_name)
             
             logger.info("成功清空向量数据库集合")
             return True
             
         except Exception as e:
             logger.error(f"清空集合失败: {e}")
-            return False 
\ No newline at end of file
+            return False 
+
+_shared_service: Optional[VectorService] = None
+_shared_lock = threading.Lock()
+
+def get_vector_service() -> VectorService:
+    """进程内共享的向量服务（知识库管理和RAG生成使用同一实例和嵌入模型）"""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_lock:
+            if _shared_service is None:
+                _shared_service = VectorService()
+    return _shared_service
@@ -0,0 +1,184 @@
+"""
+向量集合统计服务
+在SQLite侧表中增量维护每个文件的文档块数量，避免统计时全量读取集合；
+嵌入模型迁移期间同时记录源集合中发生变化的文件（多进程共享），切换前重放到影子集合
+"""
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Any
+
+# 导入统一的日志管理器
+try:
+    from utils.logger import get_service_logger
+    logger = get_service_logger('vector_stats')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+class VectorStatsStore:
+    """向量集合统计侧表"""
+
+    def __init__(self, db_path: str):
+        """
+        初始化统计侧表
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_chunk_counts (
+                    collection TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (collection, file_id)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS collection_stats_meta (
+                    collection TEXT PRIMARY KEY,
+                    rebuilt_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tracked_collections (
+                    collection TEXT PRIMARY KEY
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS collection_changes (
+                    collection TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (collection, file_id)
+                )
+            """)
+            self._conn.commit()
+
+    def is_initialized(self, collection: str) -> bool:
+        """侧表中是否已有该集合的统计"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM collection_stats_meta WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row is not None
+
+    def increment(self, collection: str, file_id: str, delta: int):
+        """增减文件的文档块数量"""
+        if not delta:
+            return
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO file_chunk_counts (collection, file_id, chunk_count) VALUES (?, ?, ?)
+                ON CONFLICT(collection, file_id) DO UPDATE SET chunk_count = chunk_count + excluded.chunk_count
+            """, (collection, file_id, delta))
+            self._conn.execute(
+                "DELETE FROM file_chunk_counts WHERE collection = ? AND file_id = ? AND chunk_count <= 0",
+                (collection, file_id)
+            )
+            self._conn.commit()
+
+    def remove_files(self, collection: str, file_ids: List[str]):
+        """删除文件的统计"""
+        if not file_ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM file_chunk_counts WHERE collection = ? AND file_id = ?",
+                [(collection, file_id) for file_id in file_ids]
+            )
+            self._conn.commit()
+
+    def clear(self, collection: str):
+        """清空集合的统计（保留已初始化标记）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM file_chunk_counts WHERE collection = ?", (collection,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO collection_stats_meta (collection, rebuilt_at) VALUES (?, ?)",
+                (collection, datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def rebuild(self, collection: str, counts: Dict[str, int]):
+        """用全量扫描结果重建集合统计"""
+        with self._lock:
+            self._conn.execute("DELETE FROM file_chunk_counts WHERE collection = ?", (collection,))
+            self._conn.executemany(
+                "INSERT INTO file_chunk_counts (collection, file_id, chunk_count) VALUES (?, ?, ?)",
+                [(collection, file_id, count) for file_id, count in counts.items() if count > 0]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO collection_stats_meta (collection, rebuilt_at) VALUES (?, ?)",
+                (collection, datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def start_tracking(self, collection: str):
+        """开始记录集合中发生变化的文件（嵌入模型迁移开始时调用）"""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO tracked_collections (collection) VALUES (?)", (collection,))
+            self._conn.commit()
+
+    def stop_tracking(self, collection: str):
+        """停止记录并清除未处理的变更"""
+        with self._lock:
+            self._conn.execute("DELETE FROM tracked_collections WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM collection_changes WHERE collection = ?", (collection,))
+            self._conn.commit()
+
+    def record_changes(self, collection: str, file_ids: List[str]):
+        """记录发生变化的文件（集合未在迁移中时忽略）"""
+        if not file_ids:
+            return
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO collection_changes (collection, file_id)
+                SELECT ?, ? WHERE EXISTS (SELECT 1 FROM tracked_collections WHERE collection = ?)
+                ON CONFLICT(collection, file_id) DO UPDATE SET version = version + 1
+            """, [(collection, str(file_id), collection) for file_id in file_ids])
+            self._conn.commit()
+
+    def get_changes(self, collection: str) -> Dict[str, int]:
+        """获取已记录的变化文件及其版本"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, version FROM collection_changes WHERE collection = ?", (collection,)
+            ).fetchall()
+        return {file_id: version for file_id, version in rows}
+
+    def remove_changes(self, collection: str, changes: Dict[str, int]):
+        """移除已处理的变化（处理期间再次变化的文件版本已增加，保留待下次处理）"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM collection_changes WHERE collection = ? AND file_id = ? AND version = ?",
+                [(collection, file_id, version) for file_id, version in changes.items()]
+            )
+            self._conn.commit()
+
+    def get_file_counts(self, collection: str) -> Dict[str, int]:
+        """获取集合中每个文件的文档块数量"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, chunk_count FROM file_chunk_counts WHERE collection = ?", (collection,)
+            ).fetchall()
+        return {file_id: count for file_id, count in rows}
+
+    def get_stats(self, collection: str) -> Dict[str, Any]:
+        """获取集合汇总统计"""
+        with self._lock:
+            total_chunks, total_files = self._conn.execute(
+                "SELECT COALESCE(SUM(chunk_count), 0), COUNT(*) FROM file_chunk_counts WHERE collection = ?",
+                (collection,)
+            ).fetchone()
+            row = self._conn.execute(
+                "SELECT rebuilt_at FROM collection_stats_meta WHERE collection = ?", (collection,)
+            ).fetchone()
+        return {
+            'total_chunks': total_chunks,
+            'total_files': total_files,
+            'rebuilt_at': row[0] if row else None
+        }
@@ -12,7 +12,8 @@ from .logger import (
     get_model_logger,
     get_util_logger,
     set_module_level,
-    setup_logging
+    setup_logging,
+    get_logging_stats
 )
 
 __all__ = [
@@ -23,5 +24,6 @@ __all__ = [
     'get_model_logger',
     'get_util_logger',
     'set_module_level',
-    'setup_logging'
+    'setup_logging',
+    'get_logging_stats'
 ] 
\ No newline at end of file
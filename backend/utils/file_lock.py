@@ -0,0 +1,41 @@
+"""
+进程间文件锁
+多worker部署（gunicorn/uvicorn）时协调共享目录下的状态文件和向量集合写入
+"""
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # 不支持fcntl的平台（Windows）只有单进程开发服务器，退化为不加锁
+    fcntl = None
+
+@contextmanager
+def file_lock(path: str, shared: bool = False, blocking: bool = True):
+    """
+    持有文件锁（fcntl.flock）
+
+    Args:
+        path: 锁文件路径（不存在时创建）
+        shared: 共享锁（多个持有者可同时持有，与排他锁互斥）
+        blocking: 无法立即获得锁时是否等待
+
+    Yields:
+        是否获得锁（blocking为False且锁被占用时为False）
+    """
+    with open(path, 'a') as f:
+        if fcntl is None:
+            yield True
+            return
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(f.fileno(), flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -3,22 +3,177 @@
 """
 统一的模块化日志管理器
 提供统一的日志配置和管理功能
+
+默认使用异步日志：业务线程只把日志记录放入有界队列，由后台线程写文件和控制台；
+队列满时按策略丢弃低级别日志，支持JSON结构化输出和按日志记录器采样
 """
 
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import random
 import sys
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, Any
 
+def _parse_sampling(value: str) -> Dict[str, float]:
+    """解析采样配置，格式: backend.services.vector_service=0.1,backend.routes=0.5"""
+    rates = {}
+    for item in value.split(','):
+        name, sep, rate = item.strip().partition('=')
+        if sep:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+# 日志配置
+LOGGING_CONFIG = {
+    'async': os.getenv('LOG_ASYNC', 'true').lower() == 'true',  # 是否使用队列异步写日志
+    'queue_size': int(os.getenv('LOG_QUEUE_SIZE', '10000')),  # 队列容量
+    'overflow_policy': os.getenv('LOG_OVERFLOW_POLICY', 'drop'),  # 队列满时: drop丢弃WARNING以下日志 / block等待
+    'block_timeout': 1.0,  # 等待队列空位的最长时间（秒），超时仍丢弃
+    'format': os.getenv('LOG_FORMAT', 'text'),  # text / json
+    'sampling': _parse_sampling(os.getenv('LOG_SAMPLING', '')),  # 按日志记录器前缀对WARNING以下日志采样
+}
+
+class SamplingFilter(logging.Filter):
+    """按日志记录器前缀对WARNING以下的日志采样（最长前缀优先）"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            matched = ''
+            for prefix, prefix_rate in self.rates.items():
+                if (name == prefix or name.startswith(prefix + '.')) and len(prefix) > len(matched):
+                    matched, rate = prefix, prefix_rate
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class RequestContextFilter(logging.Filter):
+    """在调用线程上为日志记录附加请求ID"""
+
+    _get_request_id = None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        getter = RequestContextFilter._get_request_id
+        if getter is None:
+            try:
+                from utils.tracing import get_request_id as getter
+            except Exception:
+                getter = lambda: None
+            RequestContextFilter._get_request_id = getter
+        record.request_id = getter()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """JSON结构化日志格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'func': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            data['request_id'] = request_id
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    有界队列日志处理器
+
+    队列满时：drop策略丢弃WARNING以下的日志，WARNING及以上等待空位；block策略全部等待。
+    等待超时的日志同样丢弃，丢弃数量在队列恢复后以一条警告日志报告
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow_policy: str = 'drop', block_timeout: float = 1.0):
+        super().__init__(log_queue)
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数，不在调用线程上格式化（格式化由后台线程的处理器完成）；
+        # 异常堆栈先转为文本，避免跨线程持有traceback对象
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _report_dropped(self):
+        """队列有空位时报告之前丢弃的日志数量"""
+        with self._lock:
+            count, self._unreported = self._unreported, 0
+        if not count:
+            return
+        notice = logging.makeLogRecord({
+            'name': 'backend.utils.logger', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'module': 'logger', 'funcName': 'enqueue', 'lineno': 0,
+            'msg': f"日志队列已满，丢弃了 {count} 条日志", 'args': None
+        })
+        try:
+            self.queue.put_nowait(notice)
+        except queue.Full:
+            with self._lock:
+                self._unreported += count
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._unreported:
+            self._report_dropped()
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.overflow_policy == 'block' or record.levelno >= logging.WARNING:
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+                return
+            except queue.Full:
+                pass
+        with self._lock:
+            self.dropped += 1
+            self._unreported += 1
+
 class LoggerManager:
     """统一的日志管理器"""
     
     _instance = None
     _initialized = False
     _loggers = {}
+    _listener = None
+    _queue_handler = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -41,8 +196,10 @@ class LoggerManager:
         root_logger.setLevel(logging.INFO)
         
         # 清除现有的处理器
+        self._stop_listener()
         for handler in root_logger.handlers[:]:
             root_logger.removeHandler(handler)
+        config = LOGGING_CONFIG
         
         # 控制台处理器 - 只显示重要信息
         console_handler = logging.StreamHandler()
@@ -71,9 +228,32 @@ class LoggerManager:
         )
         file_handler.setFormatter(file_formatter)
         
-        # 添加处理器到根日志记录器
-        root_logger.addHandler(console_handler)
-        root_logger.addHandler(file_handler)
+        if config['format'] == 'json':
+            json_formatter = JsonFormatter()
+            console_handler.setFormatter(json_formatter)
+            file_handler.setFormatter(json_formatter)
+        
+        filters = [RequestContextFilter()]
+        if config['sampling']:
+            filters.append(SamplingFilter(config['sampling']))
+        
+        if config['async']:
+            # 业务线程只入队，由后台线程写控制台和文件
+            log_queue = queue.Queue(maxsize=config['queue_size'])
+            self._queue_handler = DroppingQueueHandler(log_queue, config['overflow_policy'], config['block_timeout'])
+            for log_filter in filters:
+                self._queue_handler.addFilter(log_filter)
+            self._listener = logging.handlers.QueueListener(
+                log_queue, console_handler, file_handler, respect_handler_level=True
+            )
+            self._listener.start()
+            root_logger.addHandler(self._queue_handler)
+        else:
+            # 添加处理器到根日志记录器
+            for handler in (console_handler, file_handler):
+                for log_filter in filters:
+                    handler.addFilter(log_filter)
+                root_logger.addHandler(handler)
         
         # 设置特定模块的日志级别
         logging.getLogger('werkzeug').setLevel(logging.WARNING)
@@ -93,6 +273,32 @@ class LoggerManager:
         for module, level in self._module_levels.items():
             logging.getLogger(module).setLevel(level)
     
+    def _stop_listener(self):
+        """停止后台日志线程（先写完队列中剩余的日志）"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        self._queue_handler = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取异步日志队列状态"""
+        handler = self._queue_handler
+        if handler is None:
+            return {'async': False}
+        return {
+            'async': True,
+            'queue_size': handler.queue.qsize(),
+            'queue_capacity': handler.queue.maxsize,
+            'dropped': handler.dropped,
+            'overflow_policy': handler.overflow_policy
+        }
+    
+    def shutdown(self):
+        """停止异步日志（进程退出时调用）"""
+        self._stop_listener()
+    
     def get_logger(self, name: str, level: Optional[int] = None) -> logging.Logger:
         """获取指定名称的日志记录器"""
         if name not in self._loggers:
@@ -133,6 +339,7 @@ class LoggerManager:
 
 # 全局日志管理器实例
 _logger_manager = LoggerManager()
+atexit.register(_logger_manager.shutdown)
 
 def get_logger(name: str, level: Optional[int] = None) -> logging.Logger:
     """获取日志记录器的便捷函数"""
@@ -146,6 +353,10 @@ def setup_logging():
     """初始化日志系统的便捷函数"""
     return _logger_manager
 
+def get_logging_stats() -> Dict[str, Any]:
+    """获取异步日志队列状态的便捷函数"""
+    return _logger_manager.get_stats()
+
 # 预定义的日志记录器
 def get_app_logger() -> logging.Logger:
     """获取应用主日志记录器"""
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能剖析模块
+按请求头或采样比例对单个请求进行cProfile剖析，提供对整个进程按时间采样的剖析接口（输出折叠栈，
+可直接用flamegraph.pl或speedscope生成火焰图），并通过装饰器将关键函数的墙钟和CPU耗时记录到指标注册表
+"""
+
+import io
+import os
+import hmac
+import re
+import sys
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import functools
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config_rag import PROFILING_CONFIG
+from utils.tracing import metrics_registry
+
+try:
+    from utils.logger import get_util_logger
+    logger = get_util_logger('profiling')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# 关键函数耗时
+function_wall_seconds = metrics_registry.histogram('function_wall_seconds', '关键函数墙钟耗时（秒）', ('function',))
+function_cpu_seconds = metrics_registry.histogram('function_cpu_seconds', '关键函数在调用线程上的CPU耗时（秒）', ('function',))
+
+# 采样剖析时视为空闲等待的栈顶所在模块
+IDLE_MODULES = ('threading.py', 'selectors.py', 'socketserver.py', 'queue.py', 'socket.py', 'ssl.py')
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """
+    记录函数墙钟耗时和CPU耗时的装饰器
+
+    Args:
+        name: 指标中的函数名称，默认使用函数的限定名
+    """
+    def decorator(func: Callable) -> Callable:
+        function_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                function_wall_seconds.observe(time.perf_counter() - wall_start, function=function_name)
+                function_cpu_seconds.observe(time.thread_time() - cpu_start, function=function_name)
+        return wrapper
+    return decorator
+
+class RequestProfiler:
+    """单个请求的cProfile剖析（同一时间只剖析一个请求，结果保存为.prof文件）"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = dict(PROFILING_CONFIG)
+        if config:
+            self.config.update(config)
+        self.output_dir = self.config['output_dir']
+        self._lock = threading.Lock()
+        self._profiles = deque()
+        self._load_index()
+
+    def _load_index(self):
+        """加载已保存的剖析结果"""
+        if not os.path.isdir(self.output_dir):
+            return
+        names = sorted(
+            (name for name in os.listdir(self.output_dir) if name.endswith('.prof')),
+            key=lambda name: os.path.getmtime(os.path.join(self.output_dir, name))
+        )
+        for name in names:
+            modified = os.path.getmtime(os.path.join(self.output_dir, name))
+            self._profiles.append({
+                'profile_id': name[:-len('.prof')],
+                'created_at': datetime.fromtimestamp(modified).isoformat()
+            })
+
+    def should_profile(self, trigger_value: Optional[str]) -> bool:
+        """
+        判断是否剖析当前请求
+
+        Args:
+            trigger_value: 触发请求头的值（必须与admin_token相同，未配置admin_token时忽略）
+        """
+        if trigger_value:
+            token = self.config['admin_token']
+            return bool(token) and hmac.compare_digest(trigger_value.encode(), token.encode())
+        rate = self.config['sample_rate']
+        return rate > 0 and random.random() < rate
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """开始剖析，已有请求在剖析时返回None"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except Exception:
+            self._lock.release()
+            raise
+        return profile
+
+    def stop(self, profile: cProfile.Profile, info: Dict[str, Any]) -> Optional[str]:
+        """
+        结束剖析并保存结果
+
+        Args:
+            profile: start返回的剖析器
+            info: 请求信息（method、path、status、duration_ms）
+
+        Returns:
+            剖析结果ID
+        """
+        try:
+            profile.disable()
+        finally:
+            self._lock.release()
+
+        profile_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            profile.dump_stats(self._path(profile_id))
+        except OSError as e:
+            logger.error(f"保存剖析结果失败: {e}")
+            return None
+
+        entry = dict(info, profile_id=profile_id, created_at=datetime.now().isoformat())
+        self._profiles.append(entry)
+        while len(self._profiles) > self.config['max_profiles']:
+            expired = self._profiles.popleft()
+            try:
+                os.remove(self._path(expired['profile_id']))
+            except OSError:
+                pass
+        logger.info(f"请求剖析完成: {profile_id} {info.get('method')} {info.get('path')}")
+        return profile_id
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.output_dir, f"{profile_id}.prof")
+
+    def get_path(self, profile_id: str) -> Optional[str]:
+        """剖析结果文件路径（ID格式不合法或不存在时返回None）"""
+        if not re.fullmatch(r'[0-9]{14}-[0-9a-f]{8}', profile_id):
+            return None
+        path = self._path(profile_id)
+        return path if os.path.exists(path) else None
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """列出剖析结果（最新的在前）"""
+        return list(reversed(self._profiles))
+
+    def render_text(self, profile_id: str, sort: str = 'cumulative', limit: int = 50) -> Optional[str]:
+        """以pstats文本形式输出剖析结果"""
+        path = self.get_path(profile_id)
+        if not path:
+            return None
+        output = io.StringIO()
+        stats = pstats.Stats(path, stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+class SamplingProfiler:
+    """按固定间隔采样所有线程调用栈的剖析器（同一时间只运行一个）"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = dict(PROFILING_CONFIG)
+        if config:
+            self.config.update(config)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self, seconds: float, interval: Optional[float] = None,
+               include_idle: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """
+        采样剖析
+
+        Args:
+            seconds: 采样时长（秒）
+            interval: 采样间隔（秒）
+            include_idle: 是否包含等待锁、网络和队列的空闲线程
+
+        Returns:
+            (折叠栈文本, 统计信息)
+
+        Raises:
+            RuntimeError: 已有采样正在进行
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError('已有采样剖析正在进行')
+        try:
+            seconds = min(max(seconds, 0.1), self.config['max_sample_seconds'])
+            interval = max(interval or self.config['sample_interval'], 0.001)
+            current = threading.get_ident()
+            stacks = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+
+            while time.perf_counter() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == current:
+                        continue
+                    if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(self._frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                    stacks[';'.join(reversed(labels))] += 1
+                samples += 1
+                time.sleep(interval)
+
+            collapsed = '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common())
+            return collapsed + '\n', {
+                'seconds': seconds,
+                'interval': interval,
+                'samples': samples,
+                'unique_stacks': len(stacks)
+            }
+        finally:
+            self._lock.release()
+
+# 全局剖析器
+request_profiler = RequestProfiler()
+sampling_profiler = SamplingProfiler()
+
+def register_profiling(app):
+    """
+    注册请求剖析中间件和剖析管理接口
+
+    未启用剖析时不注册任何内容；剖析管理接口只在配置了admin_token时注册，且每个请求都必须携带该令牌
+    （前端服务器从本机代理请求，不能以来源地址判断权限）
+    """
+    from flask import Response, g, jsonify, request, send_file
+
+    config = PROFILING_CONFIG
+    if not config['enabled']:
+        return
+
+    def authorized() -> bool:
+        token = config['admin_token']
+        return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode())
+
+    def forbidden():
+        return jsonify({'success': False, 'error': '无权访问剖析接口'}), 403
+
+    @app.before_request
+    def start_profile():
+        if not request_profiler.should_profile(request.headers.get(config['trigger_header'])):
+            return
+        g.profile = request_profiler.start()
+        g.profile_start = time.perf_counter()
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile_id = request_profiler.stop(profile, {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.pop('profile_start')) * 1000, 1)
+            })
+            if profile_id:
+                response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def teardown_profile(error=None):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            request_profiler.stop(profile, {'method': request.method, 'path': request.path, 'status': 500})
+
+    if not config['admin_token']:
+        logger.warning("已启用剖析但未配置PROFILING_ADMIN_TOKEN，不注册剖析管理接口")
+        return
+
+    @app.route('/api/admin/profiles', methods=['GET'])
+    def list_profiles():
+        """
+        列出请求剖析结果
+
+        GET /api/admin/profiles
+        """
+        if not authorized():
+            return forbidden()
+        return jsonify({'success': True, 'data': request_profiler.list_profiles()})
+
+    @app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        """
+        获取请求剖析结果
+
+        GET /api/admin/profiles/{profile_id}?format=text&sort=cumulative&limit=50
+        format=raw时返回.prof文件（可用snakeviz等工具打开）
+        """
+        if not authorized():
+            return forbidden()
+        if request.args.get('format') == 'raw':
+            path = request_profiler.get_path(profile_id)
+            if not path:
+                return jsonify({'success': False, 'error': '剖析结果不存在'}), 404
+            return send_file(os.path.abspath(path), as_attachment=True, download_name=f"{profile_id}.prof")
+
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'calls', 'ncalls'):
+            return jsonify({'success': False, 'error': f'不支持的排序方式: {sort}'}), 400
+        text = request_profiler.render_text(profile_id, sort, request.args.get('limit', 50, type=int))
+        if text is None:
+            return jsonify({'success': False, 'error': '剖析结果不存在'}), 404
+        return Response(text, mimetype='text/plain; charset=utf-8')
+
+    @app.route('/api/admin/profiling/sample', methods=['POST'])
+    def sample_profile():
+        """
+        对整个进程采样剖析，返回折叠栈（flamegraph.pl / speedscope格式）
+
+        POST /api/admin/profiling/sample
+        Content-Type: application/json
+
+        Body:
+        {
+            "seconds": 10,
+            "interval": 0.005,
+            "include_idle": false
+        }
+        """
+        if not authorized():
+            return forbidden()
+        data = request.get_json(silent=True) or {}
+        try:
+            collapsed, stats = sampling_profiler.sample(
+                float(data.get('seconds', 10)),
+                float(data['interval']) if data.get('interval') else None,
+                bool(data.get('include_idle', False))
+            )
+        except RuntimeError as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': f'参数错误: {e}'}), 400
+
+        logger.info(f"采样剖析完成: {stats}")
+        response = Response(collapsed, mimetype='text/plain; charset=utf-8')
+        response.headers['X-Profile-Samples'] = str(stats['samples'])
+        return response
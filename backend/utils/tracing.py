@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求追踪和延迟统计模块
+为每个请求分配请求ID，记录数据库、MinIO、嵌入、ChromaDB、大模型调用等分段耗时，
+按接口汇总延迟直方图和分位数，以Prometheus文本格式通过/metrics输出
+"""
+
+import math
+import time
+import uuid
+import bisect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config_rag import TRACING_CONFIG
+
+try:
+    from utils.logger import get_util_logger
+    logger = get_util_logger('tracing')
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# 输出的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+def _format_value(value: float) -> str:
+    """Prometheus数值格式"""
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: Iterable[str], values: Iterable[Any], extra: Optional[Dict[str, str]] = None) -> str:
+    """Prometheus标签格式"""
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+class Counter:
+    """计数器"""
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """增加计数"""
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        """输出Prometheus文本"""
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}')
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """以字典形式返回"""
+        with self._lock:
+            return [
+                {'labels': dict(zip(self.label_names, key)), 'value': value}
+                for key, value in sorted(self._values.items())
+            ]
+
+class _HistogramSeries:
+    """直方图的一个标签组合"""
+
+    __slots__ = ('bucket_counts', 'sum', 'count', 'recent')
+
+    def __init__(self, bucket_count: int, window: int):
+        self.bucket_counts = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+class Histogram:
+    """
+    直方图
+
+    分桶计数用于Prometheus聚合（histogram_quantile），
+    同时保留最近若干次观测直接计算p50/p95/p99
+    """
+
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = (),
+                 buckets: Optional[Iterable[float]] = None, window: Optional[int] = None):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = sorted(buckets or TRACING_CONFIG['buckets']) + [math.inf]
+        self.window = window or TRACING_CONFIG['quantile_window']
+        self._series: Dict[Tuple, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """记录一次观测"""
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets), self.window)
+            series.bucket_counts[index] += 1
+            series.sum += value
+            series.count += 1
+            series.recent.append(value)
+
+    @staticmethod
+    def _quantiles(values: List[float]) -> Dict[float, float]:
+        """计算分位数（最近邻排名）"""
+        if not values:
+            return {q: 0.0 for q in QUANTILES}
+        values = sorted(values)
+        return {q: values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))] for q in QUANTILES}
+
+    def _copy(self) -> List[Tuple[Tuple, List[int], float, int, List[float]]]:
+        """在锁内复制各序列"""
+        with self._lock:
+            return [
+                (key, list(series.bucket_counts), series.sum, series.count, list(series.recent))
+                for key, series in sorted(self._series.items())
+            ]
+
+    def render(self) -> List[str]:
+        """输出Prometheus文本（直方图 + 最近观测的分位数）"""
+        series_list = self._copy()
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for key, bucket_counts, total, count, _ in series_list:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, {'le': _format_value(bound)})
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(round(total, 6))}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {count}')
+
+        quantile_name = f'{self.name}_quantile'
+        lines.append(f'# HELP {quantile_name} 最近{self.window}次观测的分位数')
+        lines.append(f'# TYPE {quantile_name} gauge')
+        for key, _, _, _, recent in series_list:
+            for q, value in self._quantiles(recent).items():
+                labels = _format_labels(self.label_names, key, {'quantile': str(q)})
+                lines.append(f'{quantile_name}{labels} {_format_value(round(value, 6))}')
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """以字典形式返回（分位数单位为毫秒）"""
+        result = []
+        for key, _, total, count, recent in self._copy():
+            quantiles = self._quantiles(recent)
+            result.append({
+                'labels': dict(zip(self.label_names, key)),
+                'count': count,
+                'avg_ms': round(total / count * 1000, 2) if count else 0,
+                'p50_ms': round(quantiles[0.5] * 1000, 2),
+                'p95_ms': round(quantiles[0.95] * 1000, 2),
+                'p99_ms': round(quantiles[0.99] * 1000, 2)
+            })
+        return result
+
+class MetricsRegistry:
+    """指标注册表（同名指标只创建一次）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"指标 {name} 已注册为 {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, description: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        """获取或创建计数器"""
+        return self._get_or_create(Counter, name, description, label_names)
+
+    def histogram(self, name: str, description: str, label_names: Tuple[str, ...] = (),
+                  buckets: Optional[Iterable[float]] = None) -> Histogram:
+        """获取或创建直方图"""
+        return self._get_or_create(Histogram, name, description, label_names, buckets)
+
+    def render(self) -> str:
+        """输出全部指标的Prometheus文本"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, Any]:
+        """以字典形式返回全部指标"""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in metrics}
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
+
+class Span:
+    """一次分段调用"""
+
+    __slots__ = ('kind', 'name', 'start', 'duration', 'child_time', 'error')
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.child_time = 0.0
+        self.error = False
+
+    @property
+    def self_time(self) -> float:
+        """扣除嵌套子分段后的耗时"""
+        return max(self.duration - self.child_time, 0.0)
+
+class RequestTrace:
+    """一次请求的追踪信息"""
+
+    def __init__(self, request_id: str, method: str, endpoint: str):
+        self.request_id = request_id
+        self.method = method
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Span] = []
+        self.stack: List[Span] = []
+        self.finished = False
+
+    def breakdown(self) -> Dict[str, float]:
+        """按类型汇总的分段耗时（秒，嵌套分段不重复计算）"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.kind] = totals.get(span.kind, 0.0) + span.self_time
+        return totals
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar('current_trace', default=None)
+
+class Tracer:
+    """请求追踪器"""
+
+    def __init__(self, registry: MetricsRegistry, config: Optional[Dict[str, Any]] = None):
+        self.config = dict(TRACING_CONFIG)
+        if config:
+            self.config.update(config)
+        self.registry = registry
+        self.request_duration = registry.histogram(
+            'http_request_duration_seconds', '请求耗时（秒）', ('method', 'endpoint', 'status'))
+        self.request_breakdown = registry.histogram(
+            'http_request_span_seconds', '每个请求中各类分段调用的累计耗时（秒）', ('endpoint', 'kind'))
+        self.span_duration = registry.histogram(
+            'span_duration_seconds', '分段调用耗时（秒）', ('kind', 'name'))
+        self.span_errors = registry.counter(
+            'span_errors_total', '分段调用失败次数', ('kind', 'name'))
+
+    @property
+    def enabled(self) -> bool:
+        return self.config['enabled']
+
+    def current(self) -> Optional[RequestTrace]:
+        """当前上下文的请求追踪"""
+        return _current_trace.get()
+
+    def start_request(self, method: str, endpoint: str, request_id: Optional[str] = None) -> RequestTrace:
+        """开始追踪请求"""
+        trace = RequestTrace(request_id or uuid.uuid4().hex[:16], method, endpoint)
+        _current_trace.set(trace)
+        return trace
+
+    def finish_request(self, trace: RequestTrace, status: int):
+        """结束追踪请求并记录指标"""
+        if trace.finished:
+            return
+        trace.finished = True
+        trace.duration = time.perf_counter() - trace.start
+        _current_trace.set(None)
+
+        self.request_duration.observe(trace.duration, method=trace.method, endpoint=trace.endpoint, status=status)
+        breakdown = trace.breakdown()
+        for kind, seconds in breakdown.items():
+            self.request_breakdown.observe(seconds, endpoint=trace.endpoint, kind=kind)
+
+        if trace.duration >= self.config['slow_request_threshold']:
+            parts = ', '.join(f"{kind} {seconds * 1000:.0f}ms" for kind, seconds in
+                              sorted(breakdown.items(), key=lambda item: -item[1]))
+            other = trace.duration - sum(breakdown.values())
+            logger.warning(f"慢请求 [{trace.request_id}] {trace.method} {trace.endpoint} "
+                           f"耗时 {trace.duration * 1000:.0f}ms: {parts or '无分段'}, 其他 {other * 1000:.0f}ms")
+
+    @contextmanager
+    def span(self, kind: str, name: str = ''):
+        """
+        记录一次分段调用
+
+        Args:
+            kind: 类型（db / minio / embedding / chroma / llm）
+            name: 操作名称
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        trace = _current_trace.get()
+        span = Span(kind, name)
+        if trace is not None:
+            trace.stack.append(span)
+        try:
+            yield span
+        except BaseException:
+            span.error = True
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            self.span_duration.observe(span.duration, kind=kind, name=name)
+            if span.error:
+                self.span_errors.inc(kind=kind, name=name)
+            if trace is not None:
+                trace.stack.pop()
+                if trace.stack:
+                    trace.stack[-1].child_time += span.duration
+                trace.spans.append(span)
+
+    def traced(self, kind: str, name: Optional[str] = None) -> Callable:
+        """将函数调用记录为分段的装饰器"""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(kind, span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+# 全局追踪器
+tracer = Tracer(metrics_registry)
+
+def traced(kind: str, name: Optional[str] = None) -> Callable:
+    """将函数调用记录为分段的装饰器（使用全局追踪器）"""
+    return tracer.traced(kind, name)
+
+def get_request_id() -> Optional[str]:
+    """当前请求ID"""
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+class TracedProxy:
+    """将对象的公开方法调用记录为分段（用于数据库模型等无法修改源码的对象）"""
+
+    def __init__(self, target: Any, kind: str, prefix: Optional[str] = None):
+        self._target = target
+        self._kind = kind
+        self._prefix = prefix or type(target).__name__
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._target, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+        return tracer.traced(self._kind, f"{self._prefix}.{name}")(attribute)
+
+class TracedCursor:
+    """记录SQL执行耗时的游标包装"""
+
+    def __init__(self, cursor: Any):
+        self._cursor = cursor
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+
+    @staticmethod
+    def _operation(sql: Any) -> str:
+        """SQL语句类型（SELECT / INSERT / ...），避免将完整语句作为标签"""
+        words = str(sql).split(None, 1)
+        return words[0].upper() if words else ''
+
+    def execute(self, sql, *args, **kwargs):
+        with tracer.span('db', self._operation(sql)):
+            return self._cursor.execute(sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        with tracer.span('db', self._operation(sql)):
+            return self._cursor.executemany(sql, *args, **kwargs)
+
+class TracedConnection:
+    """游标记录SQL执行耗时的数据库连接包装"""
+
+    def __init__(self, connection: Any):
+        self._connection = connection
+
+    def __getattr__(self, name: str):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs) -> TracedCursor:
+        return TracedCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        with tracer.span('db', 'COMMIT'):
+            return self._connection.commit()
+
+def trace_headers(trace: RequestTrace) -> Dict[str, str]:
+    """已结束请求的响应头（请求ID和Server-Timing分段耗时）"""
+    timing = [f"{kind};dur={seconds * 1000:.1f}" for kind, seconds in trace.breakdown().items()]
+    timing.append(f"total;dur={trace.duration * 1000:.1f}")
+    return {
+        TRACING_CONFIG['request_id_header']: trace.request_id,
+        'Server-Timing': ', '.join(timing)
+    }
+
+def register_tracing(app):
+    """注册请求追踪中间件和/metrics接口"""
+    from flask import Response, g, request
+
+    header = TRACING_CONFIG['request_id_header']
+
+    @app.before_request
+    def start_trace():
+        if not tracer.enabled:
+            return
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.trace = tracer.start_request(request.method, endpoint, request.headers.get(header))
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            tracer.finish_request(trace, response.status_code)
+            response.headers.update(trace_headers(trace))
+        return response
+
+    @app.teardown_request
+    def teardown_trace(error=None):
+        # 未经过after_request的请求（处理过程中抛出未处理异常）
+        trace = g.pop('trace', None)
+        if trace is not None:
+            tracer.finish_request(trace, 500)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """
+        Prometheus指标
+
+        GET /metrics
+        """
+        return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -102,6 +102,35 @@ class InputValidator:
             logger.error(f"文件内容验证失败: {e}")
             return False
     
+    @classmethod
+    def validate_file_data(cls, file_data: bytes, file_name: str) -> bool:
+        """验证内存中的文件内容（与validate_file_content相同的检查，MIME类型按文件头检测）"""
+        try:
+            # 检查文件大小
+            if len(file_data) > cls.MAX_FILE_SIZE:
+                logger.warning(f"文件过大: {len(file_data)} bytes")
+                return False
+            
+            # 检查MIME类型（只需要文件头）
+            try:
+                mime_type = magic.from_buffer(bytes(file_data[:2048]), mime=True)
+                if mime_type not in cls.ALLOWED_MIME_TYPES:
+                    logger.warning(f"不支持的文件类型: {mime_type}")
+                    return False
+                return True
+            except Exception as magic_error:
+                logger.warning(f"MIME类型检测失败: {magic_error}，使用扩展名验证")
+                # 如果MIME检测失败，使用扩展名验证
+                file_ext = os.path.splitext(file_name)[1].lower()
+                if file_ext in cls.ALLOWED_EXTENSIONS:
+                    logger.info(f"文件扩展名验证通过: {file_ext}")
+                    return True
+                return False
+            
+        except Exception as e:
+            logger.error(f"文件内容验证失败: {e}")
+            return False
+    
     @classmethod
     def validate_file_size(cls, file_size: int) -> bool:
         """验证文件大小"""
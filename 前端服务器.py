@@ -3,231 +3,833 @@
 """
 改进的前端服务器
 支持SPA路由和API代理
+
+基于asyncio的并发实现：每个客户端连接一个协程，API请求经连接池复用到后端的长连接，
+后端响应体（包括SSE和分块传输）边读边转发；静态文件在线程池中读取，
+一个耗时的RAG生成请求不会阻塞其他用户和静态资源加载
 """
 
 import os
 import sys
-from http.server import HTTPServer, BaseHTTPRequestHandler
-import urllib.request
-import urllib.parse
-import urllib.error
+import time
 import json
+import gzip
+import asyncio
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
 from urllib.parse import urlparse
 
+# brotli为可选依赖，未安装时只提供gzip压缩
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # 后端API地址
-BACKEND_URL = "http://localhost:5003"
+BACKEND_URL = os.getenv('BACKEND_URL', "http://localhost:5003")
 # 前端静态文件目录
-FRONTEND_DIR = "/opt/official_ai_writer/official_document/frontend/dist"
+FRONTEND_DIR = os.getenv('FRONTEND_DIR', "/opt/official_ai_writer/official_document/frontend/dist")
 
-class ImprovedHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        """处理GET请求"""
-        try:
-            # 解析URL
-            parsed_url = urlparse(self.path)
-            path = parsed_url.path
-            
-            # 如果是API请求，转发到后端
-            if path.startswith('/api/'):
-                self.proxy_to_backend('GET', path, parsed_url.query)
-                return
-            
-            # 如果是静态资源（assets、templates等），直接提供
-            if path.startswith('/assets/') or path.startswith('/templates/'):
-                self.serve_static_file(path)
+# 服务器配置
+SERVER_CONFIG = {
+    'host': os.getenv('FRONTEND_HOST', '0.0.0.0'),
+    'port': int(os.getenv('FRONTEND_PORT', '8081')),
+    'upstream_connect_timeout': float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '5')),  # 连接后端超时（秒）
+    'upstream_read_timeout': float(os.getenv('UPSTREAM_READ_TIMEOUT', '300')),  # 两次读取后端数据的最大间隔（秒）
+    'upstream_max_connections': int(os.getenv('UPSTREAM_MAX_CONNECTIONS', '100')),  # 到后端的最大并发连接数
+    'upstream_max_idle': int(os.getenv('UPSTREAM_MAX_IDLE', '20')),  # 连接池保留的空闲连接数
+    'upstream_idle_timeout': 60,  # 空闲连接保留时间（秒）
+    'client_header_timeout': 30,  # 读取客户端请求头超时（秒）
+    'keepalive_timeout': 75,  # 客户端长连接空闲超时（秒）
+    'static_workers': int(os.getenv('STATIC_WORKERS', '8')),  # 读取静态文件的线程数
+    'max_header_size': 64 * 1024,
+    'replay_body_limit': 1024 * 1024,  # 不超过该大小的请求体先缓存，复用的后端连接失效时可重发
+    'stream_chunk_size': 64 * 1024,
+    'static_cache_max_bytes': int(os.getenv('STATIC_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),  # 静态文件缓存上限
+    'compress_min_size': 1024,  # 小于该大小的文件不压缩
+    'gzip_level': 9,
+    'brotli_quality': 9,
+    'access_log': os.getenv('ACCESS_LOG', 'true').lower() == 'true'
+}
+
+# 逐跳头部，不在客户端和后端之间转发
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'expect'
+}
+
+# 缓存策略：/assets/下为带内容哈希的构建产物，其余文件每次用ETag验证
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# 可压缩的MIME类型
+COMPRESSIBLE_TYPES = {
+    'text/html', 'application/javascript', 'text/css', 'image/svg+xml',
+    'application/json', 'image/x-icon', 'font/ttf', 'application/vnd.ms-fontobject'
+}
+
+# MIME类型
+MIME_TYPES = {
+    '.html': 'text/html',
+    '.js': 'application/javascript',
+    '.css': 'text/css',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+    '.json': 'application/json',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.ttf': 'font/ttf',
+    '.eot': 'application/vnd.ms-fontobject'
+}
+
+class HttpError(Exception):
+    """需要以错误状态码响应客户端的异常"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class Request:
+    """客户端请求"""
+
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        parsed_url = urlparse(target)
+        self.path = parsed_url.path
+        self.query = parsed_url.query
+
+    def header(self, name, default=None):
+        """获取请求头（不区分大小写）"""
+        return find_header(self.headers, name, default)
+
+    @property
+    def keep_alive(self):
+        """客户端是否保持连接"""
+        connection = (self.header('Connection') or '').lower()
+        if self.version == 'HTTP/1.0':
+            return 'keep-alive' in connection
+        return 'close' not in connection
+
+def find_header(headers, name, default=None):
+    """在头部列表中查找（不区分大小写）"""
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return default
+
+def parse_head(head):
+    """解析请求头或响应头，返回(首行, 头部列表)"""
+    lines = head.decode('latin-1').split('\r\n')
+    headers = []
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise ValueError(f"无效的头部: {line!r}")
+        headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+def parse_request(head):
+    """解析客户端请求"""
+    first_line, headers = parse_head(head)
+    parts = first_line.split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise ValueError(f"无效的请求行: {first_line!r}")
+    return Request(parts[0].upper(), parts[1], parts[2], headers)
+
+def body_framing(headers):
+    """
+    判断消息体的传输方式
+
+    Returns:
+        ('chunked', None) / ('length', 长度) / ('none', None)
+    """
+    transfer_encoding = (find_header(headers, 'Transfer-Encoding') or '').lower()
+    if 'chunked' in transfer_encoding:
+        return 'chunked', None
+    content_length = find_header(headers, 'Content-Length')
+    if content_length is not None:
+        length = int(content_length)
+        if length < 0:
+            raise ValueError(f"无效的Content-Length: {content_length}")
+        return 'length', length
+    return 'none', None
+
+async def iter_body(reader, framing, length, timeout, chunk_size, until_eof=False):
+    """
+    按传输方式逐块读取消息体（分块传输时产出解码后的数据）
+
+    Args:
+        reader: 数据流
+        framing: body_framing返回的传输方式
+        length: 内容长度
+        timeout: 每次读取的超时（秒）
+        chunk_size: 每次读取的最大字节数
+        until_eof: 没有长度信息时是否读到连接关闭（响应体）
+    """
+    if framing == 'chunked':
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if not line:
+                raise asyncio.IncompleteReadError(b'', None)
+            size = int(line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # 跳过trailer
+                while True:
+                    trailer = await asyncio.wait_for(reader.readline(), timeout)
+                    if trailer in (b'\r\n', b'\n', b''):
+                        return
+            while size:
+                data = await asyncio.wait_for(reader.read(min(size, chunk_size)), timeout)
+                if not data:
+                    raise asyncio.IncompleteReadError(b'', size)
+                size -= len(data)
+                yield data
+            await asyncio.wait_for(reader.readexactly(2), timeout)
+    elif framing == 'length':
+        remaining = length
+        while remaining:
+            data = await asyncio.wait_for(reader.read(min(remaining, chunk_size)), timeout)
+            if not data:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(data)
+            yield data
+    elif until_eof:
+        while True:
+            data = await asyncio.wait_for(reader.read(chunk_size), timeout)
+            if not data:
                 return
-            
-            # 其他所有请求都返回index.html（SPA路由支持）
-            self.serve_spa_file(path)
-            
-        except Exception as e:
-            print(f"GET请求处理错误: {e}")
-            self.send_error(500, f"Internal Server Error: {e}")
-    
-    def do_POST(self):
-        """处理POST请求"""
+            yield data
+
+class UpstreamPool:
+    """到后端的连接池（复用HTTP/1.1长连接，限制最大并发连接数）"""
+
+    def __init__(self, backend_url, max_connections, max_idle, connect_timeout, idle_timeout):
+        parsed_url = urlparse(backend_url)
+        self.ssl = parsed_url.scheme == 'https'
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port or (443 if self.ssl else 80)
+        self.host_header = parsed_url.netloc
+        self.max_idle = max_idle
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self._idle = deque()
+        self._slots = asyncio.Semaphore(max_connections)
+        self.stats = {'created': 0, 'reused': 0, 'active': 0}
+
+    async def acquire(self):
+        """
+        获取连接，优先复用空闲连接
+
+        Returns:
+            (reader, writer, 是否复用)
+        """
+        await self._slots.acquire()
         try:
-            # 解析URL
-            parsed_url = urlparse(self.path)
-            path = parsed_url.path
-            
-            # 如果是API请求，转发到后端
-            if path.startswith('/api/'):
-                self.proxy_to_backend('POST', path, parsed_url.query)
-                return
-            
-            # 其他POST请求返回404
-            self.send_error(404, "Not Found")
-            
-        except Exception as e:
-            print(f"POST请求处理错误: {e}")
-            self.send_error(500, f"Internal Server Error: {e}")
-    
-    def proxy_to_backend(self, method, path, query):
-        """将请求代理到后端"""
+            now = time.monotonic()
+            while self._idle:
+                reader, writer, idle_since = self._idle.pop()
+                if reader.at_eof() or writer.is_closing() or now - idle_since > self.idle_timeout:
+                    writer.close()
+                    continue
+                self.stats['reused'] += 1
+                self.stats['active'] += 1
+                return reader, writer, True
+
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self.ssl or None,
+                                        limit=SERVER_CONFIG['max_header_size']),
+                self.connect_timeout
+            )
+            self.stats['created'] += 1
+            self.stats['active'] += 1
+            return reader, writer, False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, reader, writer, reusable):
+        """归还连接，不可复用或空闲连接已满时关闭"""
+        self.stats['active'] -= 1
+        if reusable and len(self._idle) < self.max_idle and not reader.at_eof() and not writer.is_closing():
+            self._idle.append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+        self._slots.release()
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while self._idle:
+            self._idle.pop()[1].close()
+
+class StaticAsset:
+    """缓存的静态文件（原始内容和预压缩版本）"""
+
+    def __init__(self, file_path, stat, content_type, variants):
+        self.file_path = file_path
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.content_type = content_type
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.last_modified_seconds = int(stat.st_mtime)
+        # 编码 -> 内容，identity为原始内容
+        self.variants = variants
+        self.nbytes = sum(len(content) for content in variants.values())
+
+    def variant_etag(self, encoding):
+        """不同编码的内容使用不同的强ETag"""
+        return self.etag if encoding == 'identity' else f'{self.etag[:-1]}-{encoding}"'
+
+    def matches(self, if_none_match):
+        """If-None-Match是否命中（弱比较，任一编码版本都视为同一资源）"""
+        if if_none_match.strip() == '*':
+            return True
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return any(self.variant_etag(encoding) in tags for encoding in self.variants)
+
+class StaticCache:
+    """静态文件内存缓存：按路径和修改时间缓存，加载时预先生成gzip/brotli压缩版本，超出容量按LRU淘汰"""
+
+    def __init__(self, config):
+        self.config = config
+        self.max_bytes = config['static_cache_max_bytes']
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def compress(self, content, content_type):
+        """生成压缩版本（只保留比原始内容小的）"""
+        variants = {'identity': content}
+        if content_type not in COMPRESSIBLE_TYPES or len(content) < self.config['compress_min_size']:
+            return variants
+        compressed = gzip.compress(content, compresslevel=self.config['gzip_level'], mtime=0)
+        if len(compressed) < len(content):
+            variants['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(content, quality=self.config['brotli_quality'])
+            if len(compressed) < len(content):
+                variants['br'] = compressed
+        return variants
+
+    def load(self, file_path, content_type):
+        """读取并压缩文件（在线程池中执行）"""
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            content = f.read()
+        return StaticAsset(file_path, stat, content_type, self.compress(content, content_type))
+
+    def _store(self, asset):
+        """写入缓存并按容量淘汰"""
+        if asset.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(asset.file_path, None)
+            if previous:
+                self._total_bytes -= previous.nbytes
+            self._entries[asset.file_path] = asset
+            self._total_bytes += asset.nbytes
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+                self.stats['evictions'] += 1
+
+    async def get(self, file_path, content_type, executor):
+        """
+        获取文件，修改时间或大小变化时重新加载
+
+        Returns:
+            StaticAsset，文件不存在时返回None
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        with self._lock:
+            asset = self._entries.get(file_path)
+            if asset and asset.mtime_ns == stat.st_mtime_ns and asset.size == stat.st_size:
+                self._entries.move_to_end(file_path)
+                self.stats['hits'] += 1
+                return asset
+        self.stats['misses'] += 1
+
+        # 同一文件的并发未命中只加载一次
+        key = (file_path, stat.st_mtime_ns, stat.st_size)
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(executor, self.load, file_path, content_type)
+            self._loading[key] = future
+            try:
+                asset = await future
+                self._store(asset)
+            except OSError:
+                return None
+            finally:
+                self._loading.pop(key, None)
+            return asset
+        try:
+            return await asyncio.shield(future)
+        except OSError:
+            return None
+
+    async def warm(self, frontend_dir, executor):
+        """预加载index.html和/assets/下的文件"""
+        paths = [os.path.join(frontend_dir, 'index.html')]
+        for root, _, files in os.walk(os.path.join(frontend_dir, 'assets')):
+            paths.extend(os.path.join(root, name) for name in files)
+        for file_path in paths:
+            if os.path.isfile(file_path):
+                await self.get(file_path, MIME_TYPES.get(os.path.splitext(file_path)[1], 'application/octet-stream'),
+                               executor)
+        print(f"静态文件缓存已预热: {len(self._entries)}个文件, {self._total_bytes / 1024 / 1024:.1f}MB, "
+              f"{'gzip+brotli' if brotli else 'gzip'}压缩")
+
+class FrontendServer:
+    """前端服务器：SPA静态文件和API代理"""
+
+    def __init__(self, config=None):
+        self.config = dict(SERVER_CONFIG)
+        if config:
+            self.config.update(config)
+        self.frontend_dir = os.path.realpath(FRONTEND_DIR)
+        self.executor = ThreadPoolExecutor(max_workers=self.config['static_workers'],
+                                           thread_name_prefix='static')
+        self.static_cache = StaticCache(self.config)
+        self.pool = None
+        self.server = None
+        self.warm_task = None
+
+    async def start(self):
+        """启动监听"""
+        self.pool = UpstreamPool(
+            BACKEND_URL,
+            self.config['upstream_max_connections'],
+            self.config['upstream_max_idle'],
+            self.config['upstream_connect_timeout'],
+            self.config['upstream_idle_timeout']
+        )
+        self.server = await asyncio.start_server(
+            self.handle_client, self.config['host'], self.config['port'],
+            limit=self.config['max_header_size']
+        )
+        self.warm_task = asyncio.create_task(self.static_cache.warm(self.frontend_dir, self.executor))
+        return self.server
+
+    async def serve_forever(self):
+        """启动并持续运行"""
+        server = await self.start()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.close()
+            self.executor.shutdown(wait=False)
+
+    async def handle_client(self, reader, writer):
+        """处理一个客户端连接（支持长连接上的多个请求）"""
+        first = True
         try:
-            # 构建后端URL
-            backend_url = f"{BACKEND_URL}{path}"
-            if query:
-                backend_url += f"?{query}"
-            
-            print(f"代理请求: {method} {backend_url}")
-            
-            # 读取请求体
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = None
-            if content_length > 0:
-                post_data = self.rfile.read(content_length)
-            
-            # 构建请求
-            req = urllib.request.Request(backend_url, data=post_data, method=method)
-            
-            # 复制请求头
-            for header, value in self.headers.items():
-                if header.lower() not in ['host', 'content-length']:
-                    req.add_header(header, value)
-            
-            # 发送请求到后端
-            with urllib.request.urlopen(req) as response:
-                # 读取响应
-                response_data = response.read()
-                
-                # 发送响应头
-                self.send_response(response.status)
-                for header, value in response.getheaders():
-                    if header.lower() not in ['transfer-encoding']:
-                        self.send_header(header, value)
-                self.end_headers()
-                
-                # 发送响应体
-                self.wfile.write(response_data)
-                
-        except urllib.error.HTTPError as e:
-            print(f"后端HTTP错误: {e.code} {e.reason}")
-            self.send_error(e.code, e.reason)
-        except urllib.error.URLError as e:
-            print(f"后端连接错误: {e}")
-            self.send_error(502, f"Bad Gateway: {e}")
+            while True:
+                timeout = self.config['client_header_timeout'] if first else self.config['keepalive_timeout']
+                first = False
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send_error(writer, None, 431, "Request Header Fields Too Large")
+                    break
+
+                try:
+                    request = parse_request(head)
+                except ValueError as e:
+                    await self.send_error(writer, None, 400, f"Bad Request: {e}")
+                    break
+
+                start_time = time.monotonic()
+                try:
+                    status, keep_alive = await self.dispatch(request, reader, writer)
+                except HttpError as e:
+                    status, keep_alive = e.status, False
+                    await self.send_error(writer, request, e.status, e.message, keep_alive=False)
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    # 客户端断开或发送请求体超时
+                    break
+
+                if self.config['access_log']:
+                    elapsed = (time.monotonic() - start_time) * 1000
+                    print(f"[{time.strftime('%d/%b/%Y %H:%M:%S')}] \"{request.method} {request.target} "
+                          f"{request.version}\" {status} {elapsed:.1f}ms")
+                if not keep_alive:
+                    break
         except Exception as e:
-            print(f"代理错误: {e}")
-            self.send_error(500, f"Internal Server Error: {e}")
-    
-    def serve_static_file(self, path):
-        """提供静态文件"""
+            print(f"连接处理错误: {e}")
+        finally:
+            writer.close()
+
+    async def dispatch(self, request, reader, writer):
+        """
+        分发请求
+
+        Returns:
+            (状态码, 是否保持客户端连接)
+        """
+        path = request.path
+
+        # 如果是API请求，转发到后端
+        if path.startswith('/api/'):
+            return await self.proxy_to_backend(request, reader, writer)
+
+        # 非API请求不使用请求体，读取丢弃以保持连接同步
+        await self.discard_body(request, reader)
+
+        if request.method not in ('GET', 'HEAD'):
+            await self.send_error(writer, request, 404, "Not Found")
+            return 404, request.keep_alive
+
+        # 如果是静态资源（assets、templates等），直接提供
+        if path.startswith('/assets/') or path.startswith('/templates/'):
+            return await self.serve_static_file(request, writer)
+
+        # 其他所有请求都返回index.html（SPA路由支持）
+        return await self.serve_spa_file(request, writer)
+
+    async def discard_body(self, request, reader):
+        """读取并丢弃请求体"""
         try:
-            # URL解码路径
-            decoded_path = urllib.parse.unquote(path)
-            
-            # 构建文件路径
-            file_path = os.path.join(FRONTEND_DIR, decoded_path.lstrip('/'))
-            
-            # 检查文件是否存在
-            if not os.path.exists(file_path) or not os.path.isfile(file_path):
-                print(f"文件不存在: {file_path}")
-                self.send_error(404, "File not found")
-                return
-            
-            # 获取文件扩展名
+            framing, length = body_framing(request.headers)
+        except ValueError as e:
+            raise HttpError(400, f"Bad Request: {e}")
+        async for _ in iter_body(reader, framing, length, self.config['client_header_timeout'],
+                                 self.config['stream_chunk_size']):
+            pass
+
+    # ------------------------------------------------------------------
+    # API代理
+    # ------------------------------------------------------------------
+
+    def build_upstream_head(self, request, writer, framing, length):
+        """构建发往后端的请求头"""
+        connection_tokens = {
+            token.strip().lower() for token in (request.header('Connection') or '').split(',') if token.strip()
+        }
+        lines = [f"{request.method} {request.target} HTTP/1.1", f"Host: {self.pool.host_header}"]
+        for name, value in request.headers:
+            lowered = name.lower()
+            if lowered in HOP_BY_HOP_HEADERS or lowered in connection_tokens or lowered in ('host', 'content-length'):
+                continue
+            lines.append(f"{name}: {value}")
+
+        peer = writer.get_extra_info('peername')
+        client_ip = peer[0] if peer else ''
+        forwarded_for = request.header('X-Forwarded-For')
+        if not forwarded_for:
+            lines.append(f"X-Forwarded-For: {client_ip}")
+        if request.header('X-Forwarded-Host') is None and request.header('Host'):
+            lines.append(f"X-Forwarded-Host: {request.header('Host')}")
+
+        if framing == 'chunked':
+            lines.append("Transfer-Encoding: chunked")
+        elif framing == 'length':
+            lines.append(f"Content-Length: {length}")
+        lines.append("Connection: keep-alive")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def send_request_body(self, request, reader, upstream_writer, framing, length, body):
+        """将请求体发往后端（已缓存的直接写入，否则边读边发）"""
+        if body is not None:
+            upstream_writer.write(body)
+            return
+        async for data in iter_body(reader, framing, length, self.config['client_header_timeout'],
+                                    self.config['stream_chunk_size']):
+            if framing == 'chunked':
+                upstream_writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+            else:
+                upstream_writer.write(data)
+            await upstream_writer.drain()
+        if framing == 'chunked':
+            upstream_writer.write(b'0\r\n\r\n')
+
+    async def proxy_to_backend(self, request, reader, writer):
+        """将请求代理到后端，响应体流式转发"""
+        try:
+            framing, length = body_framing(request.headers)
+        except ValueError as e:
+            raise HttpError(400, f"Bad Request: {e}")
+
+        if (request.header('Expect') or '').lower() == '100-continue':
+            writer.write(f"{request.version} 100 Continue\r\n\r\n".encode('latin-1'))
+            await writer.drain()
+
+        # 小请求体先缓存，复用的后端连接已被对端关闭时可以换新连接重发
+        body = None
+        if framing == 'none':
+            body = b''
+        elif framing == 'length' and length <= self.config['replay_body_limit']:
+            body = await asyncio.wait_for(reader.readexactly(length), self.config['client_header_timeout'])
+        replayable = body is not None
+        upstream_head = self.build_upstream_head(request, writer, framing, length)
+
+        read_timeout = self.config['upstream_read_timeout']
+        for attempt in range(2):
+            try:
+                upstream_reader, upstream_writer, reused = await self.pool.acquire()
+            except asyncio.TimeoutError:
+                raise HttpError(504, f"Gateway Timeout: 连接后端超时 {BACKEND_URL}")
+            except OSError as e:
+                raise HttpError(502, f"Bad Gateway: {e}")
+
+            try:
+                upstream_writer.write(upstream_head)
+                await self.send_request_body(request, reader, upstream_writer, framing, length, body)
+                await upstream_writer.drain()
+                response_head = await asyncio.wait_for(upstream_reader.readuntil(b'\r\n\r\n'), read_timeout)
+                break
+            except asyncio.TimeoutError:
+                self.pool.release(upstream_reader, upstream_writer, False)
+                raise HttpError(504, "Gateway Timeout: 后端响应超时")
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+                self.pool.release(upstream_reader, upstream_writer, False)
+                if reused and replayable and attempt == 0:
+                    continue
+                raise HttpError(502, f"Bad Gateway: {e!r}")
+            except BaseException:
+                self.pool.release(upstream_reader, upstream_writer, False)
+                raise
+
+        reusable = False
+        try:
+            try:
+                status_line, upstream_headers = parse_head(response_head)
+                version, status = status_line.split(' ', 2)[:2]
+                status = int(status)
+                response_framing, response_length = body_framing(upstream_headers)
+            except ValueError as e:
+                raise HttpError(502, f"Bad Gateway: 后端响应无效 {e}")
+
+            upstream_keep_alive = (
+                version == 'HTTP/1.1' and 'close' not in (find_header(upstream_headers, 'Connection') or '').lower()
+            )
+            has_body = request.method != 'HEAD' and status >= 200 and status not in (204, 304)
+            if not has_body:
+                response_framing = 'none'
+
+            # 没有长度信息的响应（包括SSE和分块传输）对HTTP/1.1客户端以分块方式转发，
+            # HTTP/1.0客户端只能原样转发并在结束时断开
+            rechunk = has_body and response_framing != 'length' and request.version == 'HTTP/1.1'
+            client_keep_alive = request.keep_alive and (not has_body or response_framing == 'length' or rechunk)
+
+            lines = [f"{request.version} {status_line.split(' ', 1)[1]}"]
+            for name, value in upstream_headers:
+                if name.lower() in HOP_BY_HOP_HEADERS or name.lower() == 'content-length':
+                    continue
+                lines.append(f"{name}: {value}")
+            if response_framing == 'length':
+                lines.append(f"Content-Length: {response_length}")
+            elif not has_body and find_header(upstream_headers, 'Content-Length') is not None:
+                lines.append(f"Content-Length: {find_header(upstream_headers, 'Content-Length')}")
+            elif rechunk:
+                lines.append("Transfer-Encoding: chunked")
+            lines.append(f"Connection: {'keep-alive' if client_keep_alive else 'close'}")
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+            await writer.drain()
+
+            if has_body:
+                async for data in iter_body(upstream_reader, response_framing, response_length, read_timeout,
+                                            self.config['stream_chunk_size'], until_eof=True):
+                    if rechunk:
+                        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    else:
+                        writer.write(data)
+                    # 逐块刷新，SSE事件立即到达客户端
+                    await writer.drain()
+                if rechunk:
+                    writer.write(b'0\r\n\r\n')
+                    await writer.drain()
+
+            reusable = upstream_keep_alive and (not has_body or response_framing != 'none')
+            return status, client_keep_alive
+
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            # 响应头已发出，只能断开连接
+            print(f"转发后端响应中断: {request.method} {request.target}, {e!r}")
+            return status, False
+        finally:
+            self.pool.release(upstream_reader, upstream_writer, reusable)
+
+    # ------------------------------------------------------------------
+    # 静态文件
+    # ------------------------------------------------------------------
+
+    def resolve_path(self, path):
+        """URL路径转为前端目录内的文件路径，越出目录时返回None"""
+        decoded_path = urllib.parse.unquote(path)
+        file_path = os.path.realpath(os.path.join(self.frontend_dir, decoded_path.lstrip('/')))
+        if file_path != self.frontend_dir and not file_path.startswith(self.frontend_dir + os.sep):
+            return None
+        return file_path
+
+    @staticmethod
+    def select_encoding(accept_encoding, variants):
+        """按Accept-Encoding选择编码（优先brotli）"""
+        accepted = {}
+        for item in (accept_encoding or '').split(','):
+            name, _, params = item.strip().partition(';')
+            quality = 1.0
+            if params.strip().startswith('q='):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+        for encoding in ('br', 'gzip'):
+            if encoding in variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding
+        return 'identity'
+
+    @staticmethod
+    def not_modified(request, asset):
+        """条件请求是否命中（If-None-Match优先于If-Modified-Since）"""
+        if_none_match = request.header('If-None-Match')
+        if if_none_match is not None:
+            return asset.matches(if_none_match)
+        if_modified_since = request.header('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return asset.last_modified_seconds <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def send_asset(self, request, writer, asset, cache_control):
+        """发送缓存的静态文件（支持协商压缩和304）"""
+        encoding = self.select_encoding(request.header('Accept-Encoding'), asset.variants)
+        headers = [
+            ('Content-Type', asset.content_type),
+            ('Cache-Control', cache_control),
+            ('ETag', asset.variant_etag(encoding)),
+            ('Last-Modified', asset.last_modified)
+        ]
+        if len(asset.variants) > 1:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        if self.not_modified(request, asset):
+            await self.send_response(writer, request, 304, headers)
+            return 304, request.keep_alive
+
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        await self.send_response(writer, request, 200, headers, asset.variants[encoding])
+        return 200, request.keep_alive
+
+    async def serve_static_file(self, request, writer):
+        """提供静态文件"""
+        file_path = self.resolve_path(request.path)
+        asset = None
+        if file_path and os.path.isfile(file_path):
             _, ext = os.path.splitext(file_path)
-            
-            # 设置MIME类型
-            mime_types = {
-                '.html': 'text/html',
-                '.js': 'application/javascript',
-                '.css': 'text/css',
-                '.png': 'image/png',
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.gif': 'image/gif',
-                '.svg': 'image/svg+xml',
-                '.ico': 'image/x-icon',
-                '.json': 'application/json',
-                '.woff': 'font/woff',
-                '.woff2': 'font/woff2',
-                '.ttf': 'font/ttf',
-                '.eot': 'application/vnd.ms-fontobject'
-            }
-            
-            content_type = mime_types.get(ext, 'application/octet-stream')
-            
-            # 读取文件
-            with open(file_path, 'rb') as f:
-                content = f.read()
-            
-            # 发送响应
-            self.send_response(200)
-            self.send_header('Content-Type', content_type)
-            self.send_header('Content-Length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-            
-        except Exception as e:
-            print(f"静态文件服务错误: {e}")
-            self.send_error(500, f"Internal Server Error: {e}")
-    
-    def serve_spa_file(self, path):
+            content_type = MIME_TYPES.get(ext, 'application/octet-stream')
+            asset = await self.static_cache.get(file_path, content_type, self.executor)
+        if asset is None:
+            print(f"文件不存在: {file_path or request.path}")
+            await self.send_error(writer, request, 404, "File not found")
+            return 404, request.keep_alive
+
+        # /assets/下的文件名带内容哈希，内容变化时文件名随之变化，可永久缓存
+        cache_control = ASSET_CACHE_CONTROL if request.path.startswith('/assets/') else REVALIDATE_CACHE_CONTROL
+        return await self.send_asset(request, writer, asset, cache_control)
+
+    async def serve_spa_file(self, request, writer):
         """提供SPA文件（所有路由都返回index.html）"""
+        file_path = os.path.join(self.frontend_dir, 'index.html')
+        asset = await self.static_cache.get(file_path, 'text/html', self.executor)
+        if asset is None:
+            await self.send_error(writer, request, 404, "index.html not found")
+            return 404, request.keep_alive
+
+        # index.html引用的资源文件名随构建变化，每次都需验证
+        return await self.send_asset(request, writer, asset, REVALIDATE_CACHE_CONTROL)
+
+    # ------------------------------------------------------------------
+    # 响应
+    # ------------------------------------------------------------------
+
+    async def send_response(self, writer, request, status, headers, body=b'', keep_alive=None):
+        """发送完整响应"""
+        version = request.version if request else 'HTTP/1.1'
+        if keep_alive is None:
+            keep_alive = request.keep_alive if request else False
+        lines = [f"{version} {status} {HTTPStatus(status).phrase}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if status != 304:
+            lines.append(f"Content-Length: {len(body)}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body and (not request or request.method != 'HEAD'):
+            writer.write(body)
+        await writer.drain()
+
+    async def send_error(self, writer, request, status, message, keep_alive=None):
+        """发送错误响应（JSON格式）"""
+        body = json.dumps({'success': False, 'error': message}, ensure_ascii=False).encode('utf-8')
         try:
-            # 总是返回index.html
-            file_path = os.path.join(FRONTEND_DIR, 'index.html')
-            
-            if not os.path.exists(file_path):
-                self.send_error(404, "index.html not found")
-                return
-            
-            # 读取文件
-            with open(file_path, 'rb') as f:
-                content = f.read()
-            
-            # 发送响应
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html')
-            self.send_header('Content-Length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-            
-        except Exception as e:
-            print(f"SPA文件服务错误: {e}")
-            self.send_error(500, f"Internal Server Error: {e}")
-    
-    def log_message(self, format, *args):
-        """自定义日志格式"""
-        print(f"[{self.log_date_time_string()}] {format % args}")
+            await self.send_response(writer, request, status,
+                                     [('Content-Type', 'application/json; charset=utf-8')], body, keep_alive)
+        except ConnectionError:
+            pass
 
 def main():
     """主函数"""
-    port = 8081
-    
+    port = SERVER_CONFIG['port']
+
     # 检查前端目录是否存在
     if not os.path.exists(FRONTEND_DIR):
         print(f"错误: 前端目录不存在: {FRONTEND_DIR}")
         print("请先构建前端项目: cd frontend && npm run build")
         sys.exit(1)
-    
+
     # 检查后端是否运行
     try:
-        import urllib.request
         urllib.request.urlopen(f"{BACKEND_URL}/api/templates", timeout=5)
         print(f"✓ 后端服务正常: {BACKEND_URL}")
     except Exception as e:
         print(f"⚠ 后端服务可能未运行: {BACKEND_URL}")
         print(f"错误: {e}")
-    
+
     print(f"启动改进的前端服务器...")
     print(f"前端目录: {FRONTEND_DIR}")
     print(f"后端地址: {BACKEND_URL}")
     print(f"监听端口: {port}")
     print(f"访问地址: http://localhost:{port}")
-    print(f"支持SPA路由和API代理")
-    
+    print(f"支持SPA路由、API代理（连接池、流式转发）、静态文件缓存（{'gzip+brotli' if brotli else 'gzip'}）")
+    print(f"后端超时: 连接 {SERVER_CONFIG['upstream_connect_timeout']}秒, 读取 {SERVER_CONFIG['upstream_read_timeout']}秒")
+
     # 启动服务器
-    server = HTTPServer(('0.0.0.0', port), ImprovedHandler)
+    server = FrontendServer()
     print(f"服务器已启动，按 Ctrl+C 停止")
-    
+
     try:
-        server.serve_forever()
+        asyncio.run(server.serve_forever())
     except KeyboardInterrupt:
         print("\n服务器已停止")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前端服务器并发压测
+启动模拟后端（慢接口、快速接口、SSE流）和前端服务器，测量：
+1. 快速API和静态资源（原始、gzip、304验证）的并发吞吐量与延迟分位数
+2. 慢请求（模拟RAG生成）进行期间，其他请求的延迟是否受影响
+3. SSE首个事件到达时间（验证流式转发）
+
+用法:
+    python 前端服务器压测.py
+    python 前端服务器压测.py --concurrency 50 --requests 2000 --slow-seconds 5
+    python 前端服务器压测.py --target http://localhost:8081   # 压测已运行的前端服务器（需连接真实后端时慎用）
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '前端服务器.py')
+
+def free_port():
+    """获取空闲端口"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# ----------------------------------------------------------------------
+# 模拟后端
+# ----------------------------------------------------------------------
+
+async def mock_backend_handler(reader, writer):
+    """模拟后端：/api/fast、/api/slow?seconds=N、/api/stream（SSE，分块传输）"""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = lines[0].split(' ', 2)
+            headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(':') for l in lines[1:] if l)}
+            if int(headers.get('content-length', 0)):
+                await reader.readexactly(int(headers['content-length']))
+            path, _, query = target.partition('?')
+
+            if path == '/api/stream':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                             b'Transfer-Encoding: chunked\r\n\r\n')
+                for i in range(5):
+                    event = f"data: {json.dumps({'index': i})}\n\n".encode()
+                    writer.write(b'%x\r\n%s\r\n' % (len(event), event))
+                    await writer.drain()
+                    await asyncio.sleep(0.2)
+                writer.write(b'0\r\n\r\n')
+                await writer.drain()
+                continue
+
+            if path == '/api/slow':
+                params = dict(p.partition('=')[::2] for p in query.split('&') if p)
+                await asyncio.sleep(float(params.get('seconds', 3)))
+            body = json.dumps({'success': True, 'path': path}).encode()
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                         b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+            await writer.drain()
+    finally:
+        writer.close()
+
+def start_mock_backend(port):
+    """在后台线程中运行模拟后端"""
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(mock_backend_handler, '127.0.0.1', port))
+        ready.set()
+        loop.run_until_complete(server.serve_forever())
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait(5)
+
+def build_frontend_dir():
+    """构建测试用的前端目录"""
+    frontend_dir = tempfile.mkdtemp(prefix='frontend_bench_')
+    os.makedirs(os.path.join(frontend_dir, 'assets'))
+    with open(os.path.join(frontend_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html><html><head><title>党政机关公文生成智能体</title></head>'
+                '<body><div id="app"></div></body></html>')
+    with open(os.path.join(frontend_dir, 'assets', 'index-3f2a9c.js'), 'w', encoding='utf-8') as f:
+        f.write('console.log("bench");\n' * 5000)
+    return frontend_dir
+
+def start_frontend(port, backend_url, frontend_dir):
+    """以子进程启动前端服务器"""
+    env = dict(os.environ, FRONTEND_PORT=str(port), FRONTEND_HOST='127.0.0.1', BACKEND_URL=backend_url,
+               FRONTEND_DIR=frontend_dir, ACCESS_LOG='false')
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('前端服务器启动失败')
+
+# ----------------------------------------------------------------------
+# 压测
+# ----------------------------------------------------------------------
+
+def percentile(values, p):
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def summarize(name, latencies, errors, elapsed):
+    """汇总一个场景的结果"""
+    return {
+        'scenario': name,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else 0
+    }
+
+def run_load(target, path, concurrency, total, headers=None, expected_status=200):
+    """每个线程使用一个长连接循环发送请求"""
+    parsed = urlparse(target)
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        latencies, errors = [], 0
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                if response.status != expected_status:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+        conn.close()
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, per_worker))
+    elapsed = time.perf_counter() - start
+    latencies = [value for result in results for value in result[0]]
+    return latencies, sum(result[1] for result in results), elapsed
+
+def fetch_once(target, path, timeout=120):
+    """发送单个请求，返回耗时"""
+    parsed = urlparse(target)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    start = time.perf_counter()
+    conn.request('GET', path)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return time.perf_counter() - start, response.status
+
+def fetch_etag(target, path):
+    """获取资源的ETag"""
+    parsed = urlparse(target)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status, response.getheader('ETag')
+
+def measure_sse(target):
+    """测量SSE首个事件和全部事件的到达时间"""
+    parsed = urlparse(target)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    start = time.perf_counter()
+    conn.request('GET', '/api/stream', headers={'Accept': 'text/event-stream'})
+    response = conn.getresponse()
+    first_event, events = None, 0
+    for line in response:
+        if line.startswith(b'data:'):
+            events += 1
+            if first_event is None:
+                first_event = time.perf_counter() - start
+    conn.close()
+    return {
+        'scenario': 'sse_stream',
+        'events': events,
+        'first_event_ms': round((first_event or 0) * 1000, 1),
+        'total_ms': round((time.perf_counter() - start) * 1000, 1)
+    }
+
+def run_head_of_line(target, slow_requests, slow_seconds, concurrency, total):
+    """慢请求进行期间测量静态资源和快速API的延迟"""
+    with ThreadPoolExecutor(max_workers=slow_requests) as executor:
+        slow_futures = [
+            executor.submit(fetch_once, target, f'/api/slow?seconds={slow_seconds}')
+            for _ in range(slow_requests)
+        ]
+        time.sleep(0.2)
+        latencies, errors, elapsed = run_load(target, '/assets/index-3f2a9c.js', concurrency, total)
+        still_running = sum(1 for future in slow_futures if not future.done())
+        slow_results = [future.result() for future in slow_futures]
+
+    result = summarize('static_during_slow_api', latencies, errors, elapsed)
+    result['slow_requests'] = slow_requests
+    result['slow_running_during_measure'] = still_running
+    result['slow_max_ms'] = round(max(duration for duration, _ in slow_results) * 1000, 1)
+    return result
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='前端服务器并发压测')
+    parser.add_argument('--target', help='已运行的前端服务器地址（不指定时启动模拟后端和前端服务器）')
+    parser.add_argument('--concurrency', type=int, default=20, help='并发连接数')
+    parser.add_argument('--requests', type=int, default=1000, help='每个场景的请求总数')
+    parser.add_argument('--slow-requests', type=int, default=10, help='并发慢请求数')
+    parser.add_argument('--slow-seconds', type=float, default=3, help='慢请求耗时（秒）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    args = parser.parse_args()
+
+    process = None
+    target = args.target
+    if not target:
+        backend_port, frontend_port = free_port(), free_port()
+        start_mock_backend(backend_port)
+        process = start_frontend(frontend_port, f'http://127.0.0.1:{backend_port}', build_frontend_dir())
+        target = f'http://127.0.0.1:{frontend_port}'
+
+    try:
+        results = []
+        asset_path = '/assets/index-3f2a9c.js'
+        _, etag = fetch_etag(target, asset_path)
+        scenarios = (
+            ('fast_api', '/api/fast', None, 200),
+            ('static_asset', asset_path, None, 200),
+            ('static_asset_gzip', asset_path, {'Accept-Encoding': 'gzip, br'}, 200),
+            ('static_asset_304', asset_path, {'If-None-Match': etag or '"none"'}, 304),
+            ('spa_index', '/knowledge', None, 200)
+        )
+        for name, path, headers, expected_status in scenarios:
+            latencies, errors, elapsed = run_load(target, path, args.concurrency, args.requests,
+                                                  headers, expected_status)
+            results.append(summarize(name, latencies, errors, elapsed))
+        results.append(run_head_of_line(target, args.slow_requests, args.slow_seconds,
+                                        args.concurrency, args.requests))
+        results.append(measure_sse(target))
+    finally:
+        if process:
+            process.terminate()
+            process.wait(5)
+
+    if args.json:
+        print(json.dumps({'target': target, 'concurrency': args.concurrency, 'results': results},
+                         ensure_ascii=False, indent=2))
+        return
+
+    print(f"目标: {target}  并发: {args.concurrency}  每场景请求数: {args.requests}")
+    print(f"{'场景':<26}{'请求':>8}{'错误':>6}{'吞吐(req/s)':>14}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for result in results:
+        if 'throughput_rps' in result:
+            print(f"{result['scenario']:<26}{result['requests']:>8}{result['errors']:>6}"
+                  f"{result['throughput_rps']:>14}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}")
+    head_of_line = results[-2]
+    print(f"\n测量期间仍在进行的慢请求: {head_of_line['slow_running_during_measure']}/{head_of_line['slow_requests']}，"
+          f"慢请求最长耗时 {head_of_line['slow_max_ms']}ms")
+    sse = results[-1]
+    print(f"SSE: {sse['events']}个事件，首个事件 {sse['first_event_ms']}ms，全部 {sse['total_ms']}ms")
+
+if __name__ == '__main__':
+    main()